@@ -0,0 +1,140 @@
+"""
+Event dispatch benchmark
+
+Usage: python benchmarks/async_callback.py [--events N] [--burst N]
+
+Compares the previous `async_callback` (new event loop via `asyncio.run`
+on the calling thread for each event) with the current one (every event
+marshalled onto a single running loop) and with the coalescing refresh
+handler of the WinRT backend (`RefreshCallback`, events arriving while a
+refresh is pending are dropped). Events are fired from a foreign thread,
+like WinRT does.
+
+Reports:
+- throughput: events/s the source thread can fire, and handler runs per
+  second until all events are handled (fewer runs than events means
+  events were coalesced, not handled faster)
+- latency: time from firing an event to the handler starting, for
+  isolated (not coalesced) events
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+from time import perf_counter
+from typing import Any, Callable, Coroutine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media_session.utils import RefreshCallback, async_callback  # noqa: E402
+
+
+def async_callback_run(
+    callback: Callable[..., Coroutine[Any, Any, Any]]
+) -> Callable[..., Any]:
+    """Previous implementation"""
+
+    def f(*args: Any, **kwargs: Any) -> Any:
+        return asyncio.run(callback(*args, **kwargs))
+
+    return f
+
+
+class Handler:
+    """Async handler that re-reads state, like the WinRT handlers"""
+
+    def __init__(self) -> None:
+        self.runs = 0
+        self.started: list[float] = []
+
+    async def __call__(self, *_: Any) -> None:
+        self.started.append(perf_counter())
+        self.runs += 1
+        await asyncio.sleep(0)  # e.g. try_get_media_properties_async
+
+
+def _fire(callback: Callable[..., Any], events: int, burst: int) -> list[float]:
+    """Fire `events` in bursts of `burst` from a new thread"""
+
+    fired: list[float] = []
+
+    def source() -> None:
+        for _ in range(events // burst):
+            for _ in range(burst):
+                fired.append(perf_counter())
+                callback()
+
+    thread = threading.Thread(target=source)
+    thread.start()
+    thread.join()
+    return fired
+
+
+async def _settle(handler: Handler) -> None:
+    runs = -1
+    while runs != handler.runs:
+        runs = handler.runs
+        await asyncio.sleep(0.01)
+
+
+async def throughput(events: int, burst: int) -> None:
+    loop = asyncio.get_running_loop()
+
+    for name, wrap in (
+        ("asyncio.run:    ", async_callback_run),
+        ("persistent loop:", async_callback),
+        ("refresh:        ", RefreshCallback),
+    ):
+        handler = Handler()
+        t = perf_counter()
+        await loop.run_in_executor(None, _fire, wrap(handler), events, burst)
+        fired = perf_counter() - t
+        await _settle(handler)
+        handled = handler.started[-1] - t
+        print(
+            f"{name}  {events / fired:>10.0f} events/s fired,"
+            f" {handler.runs:>6} runs, {handler.runs / handled:>10.0f} runs/s"
+        )
+
+
+async def latency(events: int) -> None:
+    loop = asyncio.get_running_loop()
+
+    for name, wrap in (
+        ("asyncio.run:    ", async_callback_run),
+        ("persistent loop:", async_callback),
+        ("refresh:        ", RefreshCallback),
+    ):
+        handler = Handler()
+        callback = wrap(handler)
+        samples: list[float] = []
+        for i in range(events):
+            fired = (await loop.run_in_executor(None, _fire, callback, 1, 1))[0]
+            while len(handler.started) <= i:
+                await asyncio.sleep(0)
+            samples.append((handler.started[i] - fired) * 1e6)
+
+        samples.sort()
+        print(
+            f"{name}  median {statistics.median(samples):>8.1f} us,"
+            f" p99 {samples[int(len(samples) * 0.99) - 1]:>8.1f} us"
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=3000)
+    parser.add_argument("--burst", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"Throughput ({args.events} events in bursts of {args.burst})")
+    await throughput(args.events, args.burst)
+    print("\nLatency (isolated events)")
+    await latency(min(args.events, 200))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,144 @@
+"""
+D-Bus value decoding benchmark
+
+Usage: python benchmarks/dbus_decode.py [--lyrics BYTES] [--comments N]
+
+Decodes a `PropertiesChanged` payload with large `xesam:comment` and
+`xesam:lyrics` values with:
+
+- the former recursive `isinstance` chain (`dbus_to_py` before the
+  dispatch table), kept here as a reference
+- `dbus_to_py` with type dispatch, converting everything
+- `decode_properties`, converting only the Metadata keys `MediaInfo` needs
+
+The dbus-python cases need dbus-python. Schema decoding of plain values,
+as received by the asyncio backend, is measured in any case.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import timeit
+from typing import Any, Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+from media_session.mpris import decode_properties  # noqa: E402
+
+
+def _metadata(lyrics: int, comments: int) -> dict[str, Any]:
+    return {
+        "mpris:trackid": "/org/mpris/MediaPlayer2/Track/1",
+        "mpris:length": 215_000_000,
+        "mpris:artUrl": "file:///tmp/cover.png",
+        "xesam:title": "Title",
+        "xesam:album": "Album",
+        "xesam:artist": ["Artist 1", "Artist 2"],
+        "xesam:albumArtist": ["Artist 1"],
+        "xesam:genre": ["Rock", "Indie"],
+        "xesam:trackNumber": 7,
+        "xesam:url": "https://example.com/track/1",
+        "xesam:autoRating": 0.5,
+        "xesam:comment": ["comment " * 64] * comments,
+        "xesam:lyrics": "la " * (lyrics // 3),
+    }
+
+
+def _properties(metadata: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "Metadata": metadata,
+        "PlaybackStatus": "Playing",
+        "Position": 1_000_000,
+        "Rate": 1.0,
+    }
+
+
+def _to_dbus(value: Any) -> Any:
+    # pylint: disable-next=import-outside-toplevel
+    import dbus
+
+    if isinstance(value, bool):
+        return dbus.Boolean(value)
+    if isinstance(value, int):
+        return dbus.Int64(value)
+    if isinstance(value, float):
+        return dbus.Double(value)
+    if isinstance(value, str):
+        return dbus.String(value)
+    if isinstance(value, list):
+        return dbus.Array([_to_dbus(v) for v in value], signature="s")
+    return dbus.Dictionary(
+        {dbus.String(k): _to_dbus(v) for k, v in value.items()}, signature="sv"
+    )
+
+
+def _recursive_reference() -> Callable[[Any], Any]:
+    """`dbus_to_py` as it was before the dispatch table"""
+
+    # pylint: disable-next=import-outside-toplevel
+    import dbus
+
+    def dbus_to_py(dbus_obj: Any) -> object:
+        if isinstance(dbus_obj, dbus.Array):
+            return list(map(dbus_to_py, dbus_obj))
+        elif isinstance(dbus_obj, dbus.Dictionary):
+            return {dbus_to_py(k): dbus_to_py(v) for k, v in dbus_obj.items()}
+        elif isinstance(dbus_obj, dbus.String):
+            return str(dbus_obj)
+        elif isinstance(dbus_obj, (dbus.Int16, dbus.Int32, dbus.Int64)):
+            return int(dbus_obj)
+        elif isinstance(dbus_obj, dbus.ObjectPath):
+            return str(dbus_obj)
+        else:
+            return dbus_obj
+
+    return dbus_to_py
+
+
+def measure(func: Callable[[], Any], repeat: int = 5) -> float:
+    """Median time per call in microseconds"""
+
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return statistics.median(timer.repeat(repeat, number)) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--lyrics", type=int, default=8_000, help="bytes of lyrics")
+    parser.add_argument("--comments", type=int, default=16)
+    args = parser.parse_args()
+
+    plain = _properties(_metadata(args.lyrics, args.comments))
+    cases: dict[str, Callable[[], Any]] = {
+        "decode_properties(plain)": lambda: decode_properties(plain),
+    }
+
+    try:
+        # pylint: disable-next=import-outside-toplevel
+        from media_session.media_session_linux import dbus_to_py
+    except ImportError:
+        print("dbus-python cases skipped (dbus-python or PyGObject missing)")
+    else:
+        recursive = _recursive_reference()
+        payload = _to_dbus(plain)
+        cases = {
+            "recursive isinstance (before)": lambda: recursive(payload),
+            "dbus_to_py (dispatch table)": lambda: dbus_to_py(payload),
+            "decode_properties(dbus_to_py)": lambda: decode_properties(
+                payload, dbus_to_py
+            ),
+            **cases,
+        }
+
+    results = {name: measure(func) for name, func in cases.items()}
+    baseline = next(iter(results.values()))
+    for name, us in results.items():
+        print(f"{name:<36} {us:9.2f} us  {baseline / us:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
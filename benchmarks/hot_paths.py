@@ -0,0 +1,363 @@
+"""
+Hot path micro-benchmarks
+
+Usage: python benchmarks/hot_paths.py [-k SUBSTRING] [--save PATH]
+                                      [--compare PATH] [--tolerance X]
+
+Reports for every case the median wall time per call and, measured with
+tracemalloc on a separate call, peak memory allocated during the call and
+memory still held after it.
+
+Cases:
+- `MediaInfo` construction, `RawMediaInfo.snapshot` and `diff`
+- `MediaInfo.as_dict` in every cover mode
+- `MprisPlayer.apply` and `dbus_to_py` of large metadata (`dbus_to_py` is
+  skipped without dbus-python)
+- `b64encode` of realistic cover sizes
+- cover ingestion of an already cached 3 MB cover, streamed in chunks
+  (`CoverReader`) and from a file (`CoverCache.put_file`)
+- `json.dumps` of the `as_dict` payload, and `serialize` encoders
+- end-to-end latency from a backend event to a sync and an async
+  subscriber, using the replay backend as a fake backend
+
+`--save` writes results as JSON, `--compare` exits with code 1 if a case is
+slower or allocates more than `--tolerance` times the saved results.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from base64 import b64encode
+from time import perf_counter
+from typing import Any, Callable, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from media_session.changes import diff  # noqa: E402
+from media_session.cover_cache import CHUNK_SIZE, CoverCache  # noqa: E402
+from media_session.datastructures import MediaInfo, RawMediaInfo  # noqa: E402
+from media_session.media_session_replay import MediaSessionReplay  # noqa: E402
+from media_session.mpris import MprisPlayer  # noqa: E402
+from media_session.serialize import (  # noqa: E402
+    JSON_BACKEND,
+    encode_json,
+    encode_msgpack,
+)
+
+COVER_SIZES = {"30k": 30_000, "300k": 300_000, "3M": 3_000_000}
+
+Result = dict[str, float]
+
+
+def measure(func: Callable[[], Any], repeat: int = 5) -> Result:
+    """Time per call (us), peak and retained allocation (bytes) of a call"""
+
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    seconds = statistics.median(timer.repeat(repeat, number)) / number
+
+    func()  # warm up caches, so only steady-state allocations are counted
+    gc.collect()
+    tracemalloc.start()
+    overhead = _traced(lambda: None)  # of tracing itself
+    peak, retained = _traced(func)
+    tracemalloc.stop()
+
+    return {
+        "us": seconds * 1e6,
+        "peak_bytes": max(peak - overhead[0], 0),
+        "retained_bytes": max(retained - overhead[1], 0),
+    }
+
+
+def _traced(func: Callable[[], Any]) -> tuple[int, int]:
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    func()
+    after, peak = tracemalloc.get_traced_memory()
+    return peak - before, after - before
+
+
+#
+# Fixtures
+#
+
+
+def _metadata(tracks: int = 1, artists: int = 3) -> dict[str, Any]:
+    return {
+        "mpris:trackid": f"/org/mpris/MediaPlayer2/Track/{tracks}",
+        "mpris:length": 215_000_000,
+        "mpris:artUrl": "https://i.scdn.co/image/ab67616d0000b273" + "0" * 24,
+        "xesam:title": "Title " * 5,
+        "xesam:album": "Album " * 5,
+        "xesam:artist": [f"Artist {i}" for i in range(artists)],
+        "xesam:albumArtist": [f"Artist {i}" for i in range(artists)],
+        "xesam:genre": ["Rock", "Alternative", "Indie"],
+        "xesam:trackNumber": 7,
+        "xesam:discNumber": 1,
+        "xesam:url": "https://open.spotify.com/track/" + "x" * 22,
+        "xesam:autoRating": 0.5,
+        "xesam:comment": ["comment " * 20] * 4,
+        "xesam:lyrics": "la " * 1000,
+    }
+
+
+def _media_info(cover_cache: CoverCache, cover_size: int = 300_000) -> MediaInfo:
+    cover = cover_cache.put(b"\xff\xd8\xff" + os.urandom(cover_size))
+    return MediaInfo(
+        title="Title",
+        artist="Artist",
+        album_title="Album",
+        album_artist="Album Artist",
+        album_track_count=12,
+        track_number=7,
+        genres=("Rock", "Indie"),
+        cover=cover.ensure_file(),
+        cover_ref=cover,
+        position=42_000_000,
+        duration=215_000_000,
+        state="paused",
+    )
+
+
+def _dbus_metadata() -> Optional[Any]:
+    try:
+        import dbus  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+
+    metadata = _metadata(artists=50)
+    return dbus.Dictionary(
+        {
+            dbus.String(k): (
+                dbus.Array([dbus.String(x) for x in v], signature="s")
+                if isinstance(v, list)
+                else dbus.Int64(v)
+                if isinstance(v, int)
+                else dbus.String(v)
+                if isinstance(v, str)
+                else v
+            )
+            for k, v in metadata.items()
+        },
+        signature="sv",
+    )
+
+
+#
+# Cases
+#
+
+
+def cases(cover_cache: CoverCache) -> dict[str, Callable[[], Any]]:
+    info = _media_info(cover_cache)
+    other = MediaInfo(title="Other", position=1)
+
+    state = RawMediaInfo(provider="bench")
+    state.update(
+        "media_properties", {"title": "Title", "thumbnail_ref": info.cover_ref}
+    )
+
+    def snapshot() -> MediaInfo:
+        state.version += 1  # force rebuild
+        return state.snapshot()
+
+    player = MprisPlayer("org.mpris.MediaPlayer2.bench", ":1.1")
+    metadata = [_metadata(i) for i in range(2)]
+
+    def apply() -> None:
+        player.apply({"Metadata": metadata[player.state.version % 2]})
+
+    result: dict[str, Callable[[], Any]] = {
+        "MediaInfo()": lambda: MediaInfo(
+            title="Title", artist="Artist", position=1, duration=2, state="playing"
+        ),
+        "RawMediaInfo.snapshot": snapshot,
+        "diff": lambda: diff(info, other),
+        "as_dict(inline)": lambda: info.as_dict(),
+        "as_dict(hash)": lambda: info.as_dict(cover="hash"),
+        "as_dict(url)": lambda: info.as_dict(cover="url"),
+        "MprisPlayer.apply(Metadata)": apply,
+    }
+
+    if (dbus_metadata := _dbus_metadata()) is not None:
+        # pylint: disable-next=import-outside-toplevel
+        from media_session.media_session_linux import dbus_to_py
+
+        result["dbus_to_py(Metadata)"] = lambda: dbus_to_py(dbus_metadata)
+
+    for name, size in COVER_SIZES.items():
+        raw = os.urandom(size)
+        result[f"b64encode({name})"] = lambda raw=raw: b64encode(raw).decode("utf-8")
+
+    cover = cover_cache.put(raw)  # largest
+    cover_file = os.path.join(cover_cache.directory, "ingest.bin")
+    os.makedirs(cover_cache.directory, exist_ok=True)
+    with open(cover_file, "wb") as f:
+        f.write(raw)
+
+    def ingest_stream() -> Any:
+        reader = cover_cache.reader(cover.size, source="benchmark")
+        view = cover.memoryview()
+        for i in range(0, cover.size, CHUNK_SIZE):
+            if not reader.write(view[i : i + CHUNK_SIZE]):
+                break
+        return reader.finish()
+
+    result["CoverReader(3MB, cached)"] = ingest_stream
+    result["CoverCache.put_file(3MB, cached)"] = lambda: cover_cache.put_file(
+        cover_file
+    )
+
+    payload = info.as_dict()
+    result["json.dumps(inline, indent)"] = lambda: json.dumps(payload, indent="  ")
+    payload_hash = info.as_dict(cover="hash")
+    result["json.dumps(hash, indent)"] = lambda: json.dumps(payload_hash, indent="  ")
+
+    info.cover_ref.b64_json  # type: ignore  # cached like in a running session
+    result[f"encode_json(inline, indent) [{JSON_BACKEND}]"] = lambda: encode_json(
+        info, indent="  "
+    )
+    result[f"encode_json(hash) [{JSON_BACKEND}]"] = lambda: encode_json(info, "hash")
+    result["encode_msgpack(inline)"] = lambda: encode_msgpack(info)
+
+    return result
+
+
+#
+# End-to-end
+#
+
+
+def _events(tracks: int) -> list[tuple[str, list[Any]]]:
+    """Track changes and seeks of the active player, each one is delivered"""
+
+    events: list[tuple[str, list[Any]]] = []
+    for t in range(tracks):
+        events.append(("properties_changed", [":1.1", {"Metadata": _metadata(t)}, []]))
+        events.append(("seeked", [":1.1", t + 1]))
+    return events
+
+
+async def end_to_end(asynchronous: bool, tracks: int = 2000) -> Result:
+    """Latency from replaying an event to a subscriber of the session"""
+
+    loop = asyncio.get_running_loop()
+    latencies: list[float] = []
+    delivered = asyncio.Event()
+    sent = 0.0
+    timing = False
+
+    def callback(_: MediaInfo) -> None:
+        if timing:
+            latencies.append(perf_counter() - sent)
+        delivered.set()
+
+    session = MediaSessionReplay(os.devnull, speed=0)
+    session.bus.attach(loop)
+    session.replay("name_owner_changed", ["org.mpris.MediaPlayer2.bench", "", ":1.1"])
+    session.replay("properties_changed", [":1.1", {"PlaybackStatus": "Paused"}, []])
+    session.bus.subscribe(callback, asynchronous=asynchronous)
+    await asyncio.sleep(0)  # start async delivery
+
+    events = _events(tracks)
+
+    async def run() -> None:
+        for kind, args in events:
+            delivered.clear()
+            nonlocal sent
+            sent = perf_counter()
+            session.replay(kind, args)
+            await delivered.wait()
+
+    tracemalloc.start()
+    await run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Latencies measured under tracemalloc are inflated: measure separately
+    timing = True
+    await run()
+
+    return {
+        "us": statistics.median(latencies) * 1e6,
+        "p99_us": sorted(latencies)[int(len(latencies) * 0.99)] * 1e6,
+        "peak_bytes": peak,
+    }
+
+
+#
+# Report
+#
+
+
+def _format(name: str, result: Result) -> str:
+    line = (
+        f"{name:<38} {result['us']:>10.2f} us"
+        f" {result.get('peak_bytes', 0) / 1024:>10.1f} KiB peak"
+    )
+    if "retained_bytes" in result:
+        line += f" {result['retained_bytes']:>8} B retained"
+    if "p99_us" in result:
+        line += f"   p99 {result['p99_us']:.2f} us"
+    return line
+
+
+def _regressions(
+    results: dict[str, Result], baseline: dict[str, Result], tolerance: float
+) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        if (base := baseline.get(name)) is None:
+            continue
+        # Allocations differing by a few hundred bytes are noise
+        for key, slack in (("us", 0), ("peak_bytes", 512)):
+            old, new = base.get(key, 0), result.get(key, 0)
+            if new > max(old * tolerance, old + slack):
+                regressions.append(f"{name}: {key} {old:.1f} -> {new:.1f}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-k", dest="filter", default="", help="run matching cases")
+    parser.add_argument("--save", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    args = parser.parse_args()
+
+    results: dict[str, Result] = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, func in cases(CoverCache(directory)).items():
+            if args.filter in name:
+                results[name] = measure(func)
+                print(_format(name, results[name]))
+
+    for name, asynchronous in (("event -> sync", False), ("event -> async", True)):
+        if args.filter in name:
+            results[name] = asyncio.run(end_to_end(asynchronous))
+            print(_format(name, results[name]))
+
+    if args.save is not None:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if regressions := _regressions(results, baseline, args.tolerance):
+            print("Regressions:", *regressions, sep="\n  ")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+MPRIS cold start benchmark
+
+Usage: python benchmarks/mpris_cold_start.py [--players N] [--runs N]
+
+Starts a private dbus-daemon with `--players` idle fake players and measures
+how long `MediaSession.load` takes to fetch the state of all of them.
+With concurrent `GetAll` requests it should stay close to a single round
+trip as the number of players grows. Needs dbus-daemon, the backend is
+`MediaSessionLinux` if dbus-python and PyGObject are installed, otherwise
+`MediaSessionLinuxAsync`.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+from time import perf_counter, sleep
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+from media_session.dbus_daemon import DBusDaemon  # noqa: E402
+
+
+async def load(address: str) -> tuple[float, int]:
+    # pylint: disable-next=import-outside-toplevel
+    from media_session import MediaSession
+
+    session = MediaSession(bus_address=address)
+    start = perf_counter()
+    await session.load()
+    return perf_counter() - start, len(session.players)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--dbus-daemon", default="dbus-daemon")
+    args = parser.parse_args()
+
+    with DBusDaemon(args.dbus_daemon) as daemon:
+        assert daemon.address is not None
+        processes = [
+            subprocess.Popen(  # pylint: disable=consider-using-with
+                [
+                    sys.executable,
+                    "-m",
+                    "media_session.fake_player",
+                    f"--address={daemon.address}",
+                    f"--name=cold{p}",
+                ],
+                cwd=ROOT,
+            )
+            for p in range(args.players)
+        ]
+        try:
+            sleep(1)  # players registered their names
+            times = []
+            for _ in range(args.runs):
+                elapsed, found = asyncio.run(load(daemon.address))
+                times.append(elapsed)
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+    print(f"Players:    {found} of {args.players}")
+    print(
+        f"load():     median {statistics.median(times) * 1000:.2f} ms,"
+        f" min {min(times) * 1000:.2f} ms, max {max(times) * 1000:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+MPRIS load test
+
+Usage: python benchmarks/mpris_load.py [--rate N] [--count N] [--players N]
+
+Starts a private dbus-daemon, follows it with `MediaSession` and lets
+fake players (`media_session.fake_player`, each in its own process) change
+metadata `--count` times at `--rate` changes per second in total.
+
+Reports end-to-end latency from the player emitting `PropertiesChanged`
+to the session callback, and updates that never reached the callback
+(dropped or coalesced). Needs dbus-daemon. The session is
+`MediaSessionLinux` if dbus-python and PyGObject are installed, otherwise
+`MediaSessionLinuxAsync`.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+from time import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+from media_session.datastructures import MediaInfo  # noqa: E402
+from media_session.dbus_daemon import DBusDaemon  # noqa: E402
+
+
+async def run(address: str, rate: float, count: int, players: int) -> None:
+    # pylint: disable-next=import-outside-toplevel
+    from media_session import MediaSession
+
+    latencies: list[float] = []
+    received: set[tuple[str, int]] = set()
+    done = asyncio.Event()
+
+    def callback(data: MediaInfo) -> None:
+        sequence, _, sent = data.title.partition(" ")
+        if not sent or not sequence.isdigit():  # initial track
+            return
+        latencies.append(time() - float(sent))
+        received.add((data.artist, int(sequence)))
+        if len(received) >= count * players:
+            done.set()
+
+    session = MediaSession(callback=callback, bus_address=address)
+    task = asyncio.create_task(session.loop())
+    await asyncio.sleep(0.5)  # connected and subscribed
+
+    processes = [
+        subprocess.Popen(  # pylint: disable=consider-using-with
+            [
+                sys.executable,
+                "-m",
+                "media_session.fake_player",
+                f"--address={address}",
+                f"--name=load{p}",
+                f"--rate={rate / players}",
+                f"--count={count}",
+            ],
+            cwd=ROOT,
+        )
+        for p in range(players)
+    ]
+
+    try:
+        await asyncio.wait_for(done.wait(), count / rate * players + 10)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        for process in processes:
+            process.wait()
+        task.cancel()
+
+    # Only the active player is followed: expect updates of players that were
+    # active at some point (artist is the player name)
+    followed = {artist for artist, _ in received}
+    expected = count * len(followed)
+
+    latencies.sort()
+    print(f"Sent:       {count * players} updates by {players} player(s)")
+    print(f"Followed:   {len(followed)} player(s), {expected} updates")
+    print(f"Received:   {len(received)} ({expected - len(received)} dropped)")
+    if latencies:
+        print(
+            f"Latency:    median {statistics.median(latencies) * 1000:.2f} ms,"
+            f" p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms,"
+            f" max {latencies[-1] * 1000:.2f} ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rate", type=float, default=1000)
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--players", type=int, default=1)
+    parser.add_argument("--dbus-daemon", default="dbus-daemon")
+    args = parser.parse_args()
+
+    with DBusDaemon(args.dbus_daemon) as daemon:
+        assert daemon.address is not None
+        asyncio.run(run(daemon.address, args.rate, args.count, args.players))
+
+
+if __name__ == "__main__":
+    main()
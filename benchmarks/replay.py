@@ -0,0 +1,115 @@
+"""
+Replay throughput benchmark
+
+Usage: python benchmarks/replay.py [RECORDING] [--players N] [--tracks N]
+                                   [--runs N] [--max-us-per-event US]
+
+Replays a recording (made with `media_session --record PATH`) as fast as
+possible through the full state, diff and publish pipeline, with a full
+and a delta subscriber. Without RECORDING, a synthetic MPRIS event storm
+is generated: `--players` players (e.g. browser tabs) appearing, rapid
+skipping through `--tracks` tracks with seeks, and players taking turns
+playing.
+
+Exits with code 1 if median time per event exceeds `--max-us-per-event`.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+from time import perf_counter
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media_session.media_session_replay import MediaSessionReplay  # noqa: E402
+from media_session.recording import Recorder  # noqa: E402
+
+
+def generate(path: str, players: int, tracks: int) -> None:
+    """Write synthetic MPRIS event storm to `path`"""
+
+    with Recorder(path, backend="synthetic") as recorder:
+        for p in range(players):
+            name, owner = f"org.mpris.MediaPlayer2.player{p}", f":1.{p}"
+            recorder.record("name_owner_changed", name, "", owner)
+            recorder.record(
+                "properties_changed",
+                owner,
+                {"PlaybackStatus": "Paused", "Rate": 1.0, "Metadata": {}},
+                [],
+            )
+
+        for t in range(tracks):
+            owner = f":1.{t % players}"
+            metadata = {
+                "mpris:trackid": f"/track/{t}",
+                "mpris:length": 180_000_000 + t,
+                "xesam:title": f"Track {t}",
+                "xesam:artist": [f"Artist {t % 7}"],
+                "xesam:album": f"Album {t % 13}",
+                "xesam:genre": ["Rock"],
+                "mpris:artUrl": f"file:///tmp/cover{t % 13}.png",
+            }
+            recorder.record("properties_changed", owner, {"Metadata": metadata}, [])
+            recorder.record(
+                "properties_changed", owner, {"PlaybackStatus": "Playing"}, []
+            )
+            recorder.record("seeked", owner, t * 1000)
+            recorder.record(
+                "properties_changed", owner, {"PlaybackStatus": "Paused"}, []
+            )
+
+
+async def replay(path: str) -> tuple[int, float, int]:
+    """Returns (events, seconds, deliveries)"""
+
+    deliveries = 0
+
+    def callback(_: Any) -> None:
+        nonlocal deliveries
+        deliveries += 1
+
+    session = MediaSessionReplay(path, callback=callback, speed=0)
+    session.bus.subscribe(callback, mode="delta")
+    await session.load()
+
+    t = perf_counter()
+    await session.loop()
+    return session.replayed, perf_counter() - t, deliveries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("recording", nargs="?")
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument("--tracks", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-us-per-event", type=float)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.recording
+        if path is None:
+            path = os.path.join(directory, "storm.jsonl")
+            generate(path, args.players, args.tracks)
+
+        results = [asyncio.run(replay(path)) for _ in range(args.runs)]
+
+    events, _, deliveries = results[0]
+    us_per_event = statistics.median(s / events * 1e6 for _, s, _ in results)
+
+    print(f"Events:      {events} ({deliveries} deliveries per run)")
+    print(f"Per event:   {us_per_event:.1f} us (median of {args.runs} runs)")
+    print(f"Throughput:  {1e6 / us_per_event:.0f} events/s")
+
+    if args.max_us_per_event is not None and us_per_event > args.max_us_per_event:
+        print(f"Regression: {us_per_event:.1f} us > {args.max_us_per_event} us")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
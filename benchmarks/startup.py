@@ -0,0 +1,107 @@
+"""
+Import time and cold start benchmark
+
+Usage: python benchmarks/startup.py [--runs N] [--max-import-ms MS]
+
+Measures in fresh interpreters:
+- `import media_session` (wall time and `-X importtime` cumulative time)
+- time to first `MediaInfo` delivered by the platform backend
+  (skipped if the backend cannot be loaded)
+
+Exits with code 1 if median import time exceeds `--max-import-ms`.
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = """
+from time import perf_counter
+t = perf_counter()
+import media_session
+print((perf_counter() - t) * 1000)
+"""
+
+FIRST_INFO_SCRIPT = """
+import asyncio
+from time import perf_counter
+
+t = perf_counter()
+from media_session import MediaSession
+
+async def main():
+    first = asyncio.get_running_loop().create_future()
+    session = MediaSession(callback=lambda d: first.done() or first.set_result(d))
+    task = asyncio.create_task(session.loop())
+    await asyncio.wait_for(first, 10)
+    print((perf_counter() - t) * 1000)
+    task.cancel()
+
+asyncio.run(main())
+"""
+
+
+def _run(*args: str) -> subprocess.CompletedProcess[str]:
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+
+def import_time_ms() -> float:
+    return float(_run("-c", IMPORT_SCRIPT).stdout)
+
+
+def importtime_report() -> list[tuple[int, str]]:
+    """Cumulative import time (us) of package modules by `-X importtime`"""
+
+    result = _run("-X", "importtime", "-c", "import media_session")
+    modules = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s*\d+ \|\s*(\d+) \|(\s*)(\S+)", line)
+        if match and match.group(3).startswith("media_session"):
+            modules.append((int(match.group(1)), match.group(3)))
+    return sorted(modules, reverse=True)
+
+
+def first_info_ms() -> float | None:
+    result = _run("-c", FIRST_INFO_SCRIPT)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-import-ms", type=float)
+    args = parser.parse_args()
+
+    imports = [import_time_ms() for _ in range(args.runs)]
+    median = statistics.median(imports)
+    print(f"import media_session: median {median:.2f} ms, min {min(imports):.2f} ms")
+
+    print("-X importtime (cumulative):")
+    for us, module in importtime_report():
+        print(f"  {us / 1000:8.2f} ms  {module}")
+
+    if (first := first_info_ms()) is None:
+        print("time to first MediaInfo: skipped (backend unavailable)")
+    else:
+        print(f"time to first MediaInfo: {first:.2f} ms")
+
+    if args.max_import_ms is not None and median > args.max_import_ms:
+        print(f"FAIL: import time exceeds {args.max_import_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
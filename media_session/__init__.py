@@ -2,16 +2,47 @@
 MediaSessionAPI for client
 
 Made using 'winrt' python mapping
+
+Platform backend is imported on first access of `MediaSession`.
 """
 
+from __future__ import annotations
+
 __all__ = ["AbstractMediaSession", "MediaSession"]
 import sys
 
-from .media_session import AbstractMediaSession
+# Not imported from `typing` to keep package import fast
+TYPE_CHECKING = False
+
+if TYPE_CHECKING:
+    from .media_session import AbstractMediaSession
+
+    if sys.platform == "win32":
+        from .media_session_windows import MediaSessionWindows as MediaSession
+    else:
+        from .media_session_linux import MediaSessionLinux as MediaSession
+
+
+def __getattr__(name: str) -> object:
+    if name == "AbstractMediaSession":
+        from .media_session import AbstractMediaSession
+
+        return AbstractMediaSession
+
+    if name == "MediaSession":
+        if sys.platform == "win32":
+            from .media_session_windows import MediaSessionWindows as MediaSession
+        elif sys.platform == "linux":
+            try:
+                from .media_session_linux import MediaSessionLinux as MediaSession
+            except ImportError:  # no dbus-python or PyGObject
+                from .media_session_linux_async import (
+                    MediaSessionLinuxAsync as MediaSession,
+                )
+        else:
+            raise OSError("Unsupported platform")
+
+        globals()["MediaSession"] = MediaSession
+        return MediaSession
 
-if sys.platform == "win32":
-    from .media_session_windows import MediaSessionWindows as MediaSession
-elif sys.platform == "linux":
-    from .media_session_linux import MediaSessionLinux as MediaSession
-else:
-    raise OSError("Unsupported platform")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
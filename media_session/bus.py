@@ -0,0 +1,414 @@
+"""
+Publish/subscribe bus for session updates
+
+Subscribers choose which `MediaInfo` fields they need, a maximum delivery
+rate, sync or async delivery, periodic position updates while playing and
+optionally a downscaled cover variant.
+Publishers report which fields may have changed, and `MediaInfo` is only
+built if some subscriber needs them.
+"""
+
+__all__ = [
+    "UpdateBus",
+    "Subscription",
+    "ALL",
+    "METADATA",
+    "COVER",
+    "POSITION",
+    "PLAYBACK",
+    "SECTION_FIELDS",
+]
+
+import asyncio
+import inspect
+import logging
+from collections import deque
+from dataclasses import replace
+from time import monotonic
+from typing import AbstractSet, Any, Iterable, Optional
+
+from . import constants
+from .changes import FIELDS, diff
+from .cover_cache import CoverEntry
+from .cover_variants import CoverProcessor, CoverVariant
+from .datastructures import MediaInfo, RawMediaInfo
+from .typing import MediaSessionUpdateCallback, UpdateMode
+from .utils import Ticker
+
+logger = logging.getLogger(__name__)
+
+# Field masks
+ALL: frozenset[str] = frozenset(FIELDS)
+METADATA: frozenset[str] = frozenset(
+    (
+        "title",
+        "artist",
+        "album_title",
+        "album_artist",
+        "album_track_count",
+        "track_number",
+        "genres",
+        "duration",
+    )
+)
+COVER: frozenset[str] = frozenset(("cover", "cover_ref"))
+POSITION: frozenset[str] = frozenset(("position",))
+PLAYBACK: frozenset[str] = frozenset(("state", "position"))
+
+# `RawMediaInfo` section -> `MediaInfo` fields it affects
+SECTION_FIELDS: dict[str, frozenset[str]] = {
+    "provider": ALL,
+    "media_properties": METADATA | COVER,
+    "timeline_properties": frozenset(("position", "duration")),
+    "playback_info": PLAYBACK,
+}
+
+
+class Subscription:
+    """Subscriber of `UpdateBus`
+
+    Async subscribers get updates through a bounded queue that drops the
+    oldest update when full. Callback of async subscriber may be a
+    coroutine function. With `tick_rate` set, the position is offered that
+    many times per second while the published state is playing.
+    """
+
+    __slots__ = (
+        "callback",
+        "fields",
+        "order",
+        "mode",
+        "variant",
+        "interval",
+        "asynchronous",
+        "queue",
+        "dropped",
+        "tick_rate",
+        "last",
+        "last_time",
+        "_bus",
+        "_pending",
+        "_timer",
+        "_wakeup",
+        "_task",
+        "_ticker",
+    )
+
+    def __init__(
+        self,
+        bus: "UpdateBus",
+        callback: MediaSessionUpdateCallback,
+        fields: AbstractSet[str],
+        mode: UpdateMode,
+        max_rate: Optional[float],
+        asynchronous: bool,
+        queue_size: int,
+        variant: Optional[CoverVariant] = None,
+        tick_rate: Optional[float] = None,
+    ) -> None:
+        self.callback = callback
+        self.fields = fields
+        self.order = tuple(f for f in FIELDS if f in fields)
+        self.mode = mode
+        self.variant = variant
+        self.interval = 0.0 if max_rate is None else 1 / max_rate
+        self.asynchronous = asynchronous
+        self.queue: deque[Any] = deque(maxlen=queue_size)
+        self.dropped = 0  # updates dropped because of full queue
+        self.tick_rate = tick_rate
+        self.last: Optional[MediaInfo] = None
+        self.last_time = float("-inf")
+        self._bus = bus
+        self._pending: Optional[MediaInfo] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task[None]] = None
+        self._ticker: Optional[Ticker] = None
+
+    def offer(self, data: MediaInfo) -> None:
+        """Deliver `data` now, or later if rate limited"""
+
+        delay = self.last_time + self.interval - monotonic()
+
+        if delay <= 0:
+            # Supersedes a pending update, which must not be delivered after it
+            self._pending = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._deliver(data)
+            return
+
+        self._pending = data
+        if self._timer is None and (loop := self._bus.loop) is not None:
+            loop.call_soon_threadsafe(self._schedule, delay)
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is None and (loop := self._bus.loop) is not None:
+            self._timer = loop.call_later(delay, self._flush)
+
+    def _flush(self) -> None:
+        self._timer = None
+        data, self._pending = self._pending, None
+        if data is not None:
+            self._deliver(data)
+
+    def _deliver(self, data: MediaInfo) -> None:
+        delta = diff(self.last, data, self.order)
+
+        if not delta:
+            return
+
+        self.last = data
+        self.last_time = monotonic()
+        payload = delta if self.mode == "delta" else data
+
+        if not self.asynchronous:
+            self.callback(payload)
+        elif (loop := self._bus.loop) is None:
+            self._enqueue(payload)
+        else:
+            loop.call_soon_threadsafe(self._enqueue, payload)
+
+    def _enqueue(self, payload: Any) -> None:
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(payload)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        """Start delivery on the bus loop
+
+        Schedules an update offered before the loop was set, starts ticks
+        if playing and the delivery task of async subscribers.
+        """
+
+        if self._pending is not None:
+            self._schedule(self.last_time + self.interval - monotonic())
+
+        if self.tick_rate is not None and self._ticker is None:
+            assert self._bus.loop is not None
+            self._ticker = Ticker(
+                lambda: self._bus.tick(self), self.tick_rate, self._bus.loop
+            )
+            self._ticker.set_running(self._bus.playing)
+
+        if not self.asynchronous or self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        if self.queue:
+            self._wakeup.set()
+        assert self._bus.loop is not None
+        self._task = self._bus.loop.create_task(self._consume())
+
+    def set_ticking(self, playing: bool) -> None:
+        if self._ticker is not None:
+            self._ticker.set_running(playing)
+
+    def cancel(self) -> None:
+        if self._ticker is not None:
+            self._ticker.set_running(False)
+            self._ticker = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _consume(self) -> None:
+        assert self._wakeup is not None
+
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            while self.queue:
+                payload = self.queue.popleft()
+                try:
+                    result = self.callback(payload)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Subscriber failed")
+
+
+class UpdateBus:
+    """Delivers session updates to many subscribers
+
+    `loop` is needed for rate limiting, async delivery and cover variants,
+    backends set it when their loop starts. Cover variants are rendered by
+    `processor` (one for the shared cover cache if None).
+    """
+
+    def __init__(
+        self,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        processor: Optional[CoverProcessor] = None,
+    ) -> None:
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.processor = processor
+        self._subscriptions: list[Subscription] = []
+        self._last: Optional[MediaInfo] = None  # last built snapshot
+        self._state: Optional[RawMediaInfo] = None  # last published
+        self.playing = False  # last published state is playing, ticks run
+        self._tasks: set[asyncio.Task[CoverEntry]] = set()
+
+        if loop is not None:
+            self.attach(loop)
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Set loop and start subscribers. Call from the loop thread"""
+
+        self.loop = loop
+        for subscription in self._subscriptions:
+            subscription.start()
+
+    def subscribe(
+        self,
+        callback: MediaSessionUpdateCallback,
+        fields: Iterable[str] = ALL,
+        mode: UpdateMode = "full",
+        max_rate: Optional[float] = None,
+        asynchronous: bool = False,
+        queue_size: int = 16,
+        cover: Optional[CoverVariant] = None,
+        tick_rate: Optional[float] = None,
+    ) -> Subscription:
+        """Subscribe to updates of `fields` (e.g. `METADATA | COVER`)
+
+        mode="full" delivers whole `MediaInfo`, mode="delta" only changed
+        fields. `max_rate` limits deliveries per second, the latest update is
+        delivered when the interval passes. Sync subscribers are called on
+        the publishing thread, async ones on the bus loop.
+
+        With `cover` set, `cover_ref` is that variant of the cover. A new
+        cover is delivered without `cover_ref` until its variant is rendered,
+        then `cover_ref` is delivered as a change.
+
+        With `tick_rate` set, the extrapolated position is also offered that
+        many times per second while playing (`fields` must include it), so
+        progress bars move between backend events.
+        """
+
+        fields = frozenset(fields)
+
+        if unknown := fields - ALL:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        if mode not in ("full", "delta"):
+            raise ValueError(f"Unknown update mode: {mode!r}")
+        if max_rate is not None and max_rate <= 0:
+            raise ValueError(f"Rate must be positive, got {max_rate}")
+        if tick_rate is not None:
+            if tick_rate <= 0:
+                raise ValueError(f"Tick rate must be positive, got {tick_rate}")
+            if "position" not in fields:
+                raise ValueError("Ticks need the position field")
+
+        subscription = Subscription(
+            self,
+            callback,
+            fields,
+            mode,
+            max_rate,
+            asynchronous,
+            queue_size,
+            cover,
+            tick_rate,
+        )
+        self._subscriptions.append(subscription)
+
+        if self.loop is not None and (asynchronous or tick_rate is not None):
+            self.loop.call_soon_threadsafe(subscription.start)
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+            subscription.cancel()
+
+    def publish(self, state: RawMediaInfo, changed: AbstractSet[str] = ALL) -> None:
+        """Deliver `state` to subscribers of any of `changed` fields"""
+
+        self._state = state
+        if state.playing != self.playing:
+            self.playing = state.playing
+            for subscription in self._subscriptions:
+                subscription.set_ticking(self.playing)
+
+        targets = [s for s in self._subscriptions if not s.fields.isdisjoint(changed)]
+
+        if not targets:
+            return
+
+        data = self._last = state.snapshot()
+        variants: dict[Optional[CoverVariant], MediaInfo] = {}
+        for subscription in targets:
+            if (variant := subscription.variant) not in variants:
+                variants[variant] = self._with_variant(data, variant)
+            subscription.offer(variants[variant])
+
+    def tick(self, subscription: Subscription) -> None:
+        """Offer current position to ticking `subscription`"""
+
+        if (state := self._state) is None:
+            return
+
+        data = self._last = state.snapshot()
+        subscription.offer(self._with_variant(data, subscription.variant))
+
+    def _with_variant(
+        self, data: MediaInfo, variant: Optional[CoverVariant]
+    ) -> MediaInfo:
+        if variant is None or (cover := data.cover_ref) is None:
+            return data
+
+        if self.processor is None:
+            self.processor = CoverProcessor(constants.COVER_CACHE)
+
+        if (entry := self.processor.get(cover, variant)) is None:
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self._render, cover, variant)
+            return replace(data, cover_ref=None)
+        if entry is cover:
+            return data
+        return replace(data, cover_ref=entry)
+
+    def _render(self, cover: CoverEntry, variant: CoverVariant) -> None:
+        assert self.loop is not None and self.processor is not None
+
+        task = self.loop.create_task(self.processor.derive(cover, variant))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda t: self._rendered(t, cover, variant))
+
+    def _rendered(
+        self, task: asyncio.Task[CoverEntry], cover: CoverEntry, variant: CoverVariant
+    ) -> None:
+        """Deliver rendered variant if the cover is still current
+
+        The result is delivered as is, a variant evicted from the cache
+        meanwhile is not rendered again.
+        """
+
+        if task.cancelled():
+            return
+        if (e := task.exception()) is not None:
+            logger.error("Cannot derive %s of cover %s", variant, cover.key, exc_info=e)
+            return
+
+        entry = task.result()
+        if (data := self._last) is None or data.cover_ref != cover:
+            return
+
+        if entry is not cover:
+            data = replace(data, cover_ref=entry)
+        for subscription in self._subscriptions:
+            if subscription.variant != variant or subscription.fields.isdisjoint(COVER):
+                continue
+            subscription.offer(data)
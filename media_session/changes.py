@@ -0,0 +1,33 @@
+"""
+Change detection between MediaInfo snapshots
+"""
+
+__all__ = ["MediaInfoDelta", "FIELDS", "diff"]
+
+from dataclasses import fields
+from typing import Any, Iterable, Optional, TypeAlias
+
+from .datastructures import MediaInfo
+
+MediaInfoDelta: TypeAlias = dict[str, Any]
+
+FIELDS: tuple[str, ...] = tuple(f.name for f in fields(MediaInfo))
+
+
+def diff(
+    old: Optional[MediaInfo], new: MediaInfo, only: Iterable[str] = FIELDS
+) -> MediaInfoDelta:
+    """Get fields of `new` that differ from `old` (all fields if `old` is None)
+
+    Only fields in `only` are compared. Values are not copied.
+    """
+
+    if old is None:
+        return {f: getattr(new, f) for f in only}
+
+    delta: MediaInfoDelta = {}
+    for f in only:
+        value = getattr(new, f)
+        if value != getattr(old, f):  # same objects are compared by identity
+            delta[f] = value
+    return delta
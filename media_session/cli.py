@@ -1,24 +1,172 @@
+import argparse
 import asyncio
-import json
+import sys
+from typing import Optional
 
-from media_session.datastructures import MediaInfo
-
-from . import MediaSession
-from .utils import write_file
+from .control import ControlServer
+from .cover_variants import CoverVariant
+from .media_session import AbstractMediaSession
+from .media_session_replay import MediaSessionReplay
+from .push_server import PushServer
+from .recording import Recorder
+from .scheduler import CommandScheduler
+from .writer import JsonFileWriter
 
 # DIRNAME = __file__.replace("\\", "/").rsplit("/", 1)[0]  # this file path
 INFODIR = "info.json"  # cwd
 
 
-def _update(data: MediaInfo):
-    write_file(INFODIR, json.dumps(data.as_dict(), indent="  "))
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="media_session", description="Write current media info to a file"
+    )
+    parser.add_argument(
+        "-o", "--output", default=INFODIR, help="output file (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.25,
+        help="coalesce updates within this many seconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cover-file",
+        action="store_true",
+        help="write cover to a sibling file instead of inlining it as base64",
+    )
+    parser.add_argument(
+        "--cover-size",
+        type=int,
+        metavar="PX",
+        help="downscale cover to fit PX x PX pixels (needs Pillow)",
+    )
+    parser.add_argument(
+        "--cover-format",
+        choices=("webp", "jpeg", "png"),
+        default="webp",
+        help="format of downscaled cover (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--tick-rate",
+        type=float,
+        default=1.0,
+        help="position updates per second while playing, 0 to disable "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--serve",
+        metavar="[HOST:]PORT",
+        help="push updates to local clients over WebSocket (/ws) and SSE (/events)",
+    )
+    parser.add_argument(
+        "--allow-origin",
+        action="append",
+        default=[],
+        metavar="ORIGIN",
+        help="web origin allowed to use the push server (repeatable, none by default)",
+    )
+    parser.add_argument(
+        "--control",
+        metavar="PATH | [HOST:]PORT",
+        help="accept control commands on a Unix socket or local TCP port",
+    )
+    parser.add_argument(
+        "--control-token",
+        metavar="TOKEN",
+        help="require control clients to send 'auth TOKEN' first",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="PATH",
+        help="append raw backend events to a recording (gzip if PATH ends with .gz)",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="PATH",
+        help="replay a recording instead of following the platform backend",
+    )
+    return parser.parse_args()
+
+
+def _parse_address(address: str) -> tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def _control_server(
+    _ms: AbstractMediaSession, address: str, token: Optional[str]
+) -> ControlServer:
+    scheduler = CommandScheduler(_ms)
+    if address.rpartition(":")[2].isdigit():
+        host, port = _parse_address(address)
+        return ControlServer(
+            _ms, host=host, port=port, scheduler=scheduler, token=token
+        )
+    return ControlServer(_ms, path=address, scheduler=scheduler, token=token)
+
+
+async def _main(
+    _ms: AbstractMediaSession,
+    writer: JsonFileWriter,
+    server: Optional[PushServer],
+    control: Optional[ControlServer],
+) -> None:
+    writer.loop = asyncio.get_running_loop()
+
+    tasks = [_ms.loop()]
+    if server is not None:
+        await server.start()
+        server.publish(_ms.data)
+        tasks.append(server.serve_forever())
+    if control is not None:
+        tasks.append(control.serve_forever())
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        writer.flush()
 
 
 def main():
+    args = _parse_args()
+
+    writer = JsonFileWriter(
+        args.output, debounce=args.debounce, cover_file=args.cover_file
+    )
+    server: Optional[PushServer] = None
+    if args.serve is not None:
+        server = PushServer(
+            *_parse_address(args.serve), allowed_origins=args.allow_origin
+        )
+
+    cover: Optional[CoverVariant] = None
+    if args.cover_size is not None:
+        cover = CoverVariant(args.cover_size, args.cover_format)
+
+    recorder: Optional[Recorder] = None
+    _ms: AbstractMediaSession
+    if args.replay is not None:
+        _ms = MediaSessionReplay(args.replay)
+    else:
+        from . import MediaSession  # imports the platform backend
 
-    _ms = MediaSession(callback=_update)
+        if args.record is not None:
+            recorder = Recorder(args.record, backend=sys.platform)
+        _ms = MediaSession(recorder=recorder)
+    tick_rate = args.tick_rate or None
+    _ms.bus.subscribe(writer, cover=cover, tick_rate=tick_rate)
+    if server is not None:
+        _ms.bus.subscribe(
+            server.publish, asynchronous=True, cover=cover, tick_rate=tick_rate
+        )
+    control: Optional[ControlServer] = None
+    if args.control is not None:
+        control = _control_server(_ms, args.control, args.control_token)
 
     try:
-        asyncio.run(_ms.loop())
+        asyncio.run(_main(_ms, writer, server, control))
     except KeyboardInterrupt:
         pass
+    finally:
+        if recorder is not None:
+            recorder.close()
@@ -1,16 +1,32 @@
-import json
-from typing import Any
-from base64 import b64encode
+"""
+Constants and static assets
+
+Assets are read on first access.
+"""
 
+from functools import cache
+from typing import Any
 
-from .utils import read_file, read_file_bytes
+from .cover_cache import CoverCache, CoverEntry
+from .utils import read_file_bytes
 
 DIRNAME = __file__.replace("\\", "/").rsplit("/", 1)[0]
 
-MEDIA_DATA_TEMPLATE: dict[str, Any] = json.loads(
-    read_file(f"{DIRNAME}/static/template.json")
-)
-COVER_FILE: str = f"{DIRNAME}/static/media_thumb.png"
+COVER_DIR: str = f"{DIRNAME}/static/covers"
 COVER_PLACEHOLDER_FILE: str = f"{DIRNAME}/static/placeholder.png"
-COVER_PLACEHOLDER_RAW: bytes = read_file_bytes(COVER_PLACEHOLDER_FILE)
-COVER_PLACEHOLDER_B64: str = b64encode(COVER_PLACEHOLDER_RAW).decode("utf-8")
+
+COVER_CACHE = CoverCache(COVER_DIR)
+
+# Lazily loaded:
+COVER_PLACEHOLDER: CoverEntry
+
+
+@cache
+def _load_cover_placeholder() -> CoverEntry:
+    return COVER_CACHE.put(read_file_bytes(COVER_PLACEHOLDER_FILE), pinned=True)
+
+
+def __getattr__(name: str) -> Any:
+    if name == "COVER_PLACEHOLDER":
+        return _load_cover_placeholder()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,221 @@
+"""
+Local control endpoint
+
+Dispatches commands from other processes onto a running media session,
+over a Unix socket (or TCP on localhost where Unix sockets are missing).
+
+Protocol is line based. Each request line holds one or more commands
+separated by `;`, each response line holds one status per command, in the
+same order and separated by `;`: `ok` or `error: <message>`.
+Requests may be pipelined, responses are sent in request order. With a
+`CommandScheduler`, commands of pipelined requests are queued as they are
+read, so e.g. a burst of seeks is coalesced into one.
+
+    > play
+    < ok
+    > seek_percentage 50; next; foo
+    < ok;ok;error: unknown command 'foo'
+
+If the server has a token, the first line must be `auth <token>`. Lines that
+look like HTTP (e.g. a cross-protocol request from a web page) close the
+connection.
+"""
+
+__all__ = ["ControlServer", "COMMANDS"]
+
+import asyncio
+import hmac
+import logging
+import os
+import re
+import stat
+from typing import Any, Callable, Optional
+
+from .media_session import AbstractMediaSession
+from .scheduler import CommandScheduler
+
+logger = logging.getLogger(__name__)
+
+# command -> argument parsers
+COMMANDS: dict[str, tuple[Callable[[str], Any], ...]] = {
+    "play": (),
+    "pause": (),
+    "play_pause": (),
+    "next": (),
+    "prev": (),
+    "stop": (),
+    "seek_percentage": (float,),
+    # Backend specific
+    "set_position": (float,),
+    "set_repeat": (str,),
+    "set_shuffle": (lambda x: x.lower() in ("1", "true", "on"),),
+    "toggle_repeat": (),
+    "toggle_shuffle": (),
+    "rewind": (),
+}
+
+# HTTP request or header line
+_HTTP_LINE = re.compile(r"[A-Z]+ \S+ HTTP/\d(\.\d)?|[\w-]+:")
+
+
+class ControlServer:
+    """Serve control requests for `session`
+
+    Listens on Unix socket `path`, or on TCP `host`:`port` if `path` is None.
+    Commands go through `scheduler` if it is set. With `token` set, clients
+    authenticate with `auth <token>` first.
+    """
+
+    def __init__(
+        self,
+        session: AbstractMediaSession,
+        path: Optional[str] = None,
+        host: str = "127.0.0.1",
+        port: int = 8766,
+        scheduler: Optional[CommandScheduler] = None,
+        max_pipelined: int = 64,
+        token: Optional[str] = None,
+    ) -> None:
+        self.session = session
+        self.token = token
+        self.scheduler = scheduler
+        self.max_pipelined = max_pipelined  # requests in flight per client
+        self.path = path
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        if self.path is not None:
+            _remove_socket(self.path)  # stale socket of previous run
+            self._server = await asyncio.start_unix_server(self._handle, self.path)
+            logger.info("Control server listening on %s", self.path)
+        else:
+            self._server = await asyncio.start_server(
+                self._handle, self.host, self.port
+            )
+            logger.info("Control server listening on %s:%s", self.host, self.port)
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        assert self._server is not None
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        if self.path is not None:
+            try:
+                _remove_socket(self.path)
+            except FileExistsError as e:
+                logger.warning("Not removing %s", e)
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        responses: asyncio.Queue[Optional[asyncio.Future[list[str]]]]
+        responses = asyncio.Queue(self.max_pipelined)
+        sender = asyncio.create_task(self._respond(responses, writer))
+        authorized = self.token is None
+        try:
+            while line := await reader.readline():
+                request = line.decode("utf-8", "replace").strip()
+                if not request:
+                    continue
+                if _HTTP_LINE.match(request):
+                    logger.warning("Rejected HTTP request on control endpoint")
+                    break
+                if not authorized:
+                    authorized = self._authorize(request)
+                    await responses.put(
+                        _done(["ok" if authorized else "error: unauthorized"])
+                    )
+                    if not authorized:
+                        break
+                    continue
+
+                statuses = asyncio.ensure_future(self._request(request))
+                await responses.put(statuses)
+                if self.scheduler is None:
+                    await asyncio.wait((statuses,))  # one request at a time
+            await responses.put(None)
+            await sender
+        except ConnectionError:
+            pass
+        finally:
+            sender.cancel()
+            writer.close()
+
+    def _authorize(self, request: str) -> bool:
+        assert self.token is not None
+        command, _, token = request.partition(" ")
+        return command == "auth" and hmac.compare_digest(
+            token.strip().encode("utf-8"), self.token.encode("utf-8")
+        )
+
+    async def _request(self, request: str) -> list[str]:
+        commands = request.split(";")
+        if self.scheduler is None:
+            return [await self.execute(c) for c in commands]
+        # Tasks start in order, so commands are queued in request order
+        return await asyncio.gather(*map(self.execute, commands))
+
+    @staticmethod
+    async def _respond(
+        responses: "asyncio.Queue[Optional[asyncio.Future[list[str]]]]",
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        try:
+            while (statuses := await responses.get()) is not None:
+                writer.write((";".join(await statuses) + "\n").encode("utf-8"))
+                await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def execute(self, command: str) -> str:
+        """Execute a single command and return its status"""
+
+        if not (parts := command.split()):
+            return "error: empty command"
+
+        name, *args = parts
+
+        if (parsers := COMMANDS.get(name)) is None:
+            return f"error: unknown command '{name}'"
+        if (method := getattr(self.session, name, None)) is None:
+            return f"error: '{name}' is not supported"
+        if len(args) != len(parsers):
+            return f"error: '{name}' takes {len(parsers)} argument(s)"
+
+        try:
+            values = [parse(arg) for parse, arg in zip(parsers, args)]
+            if self.scheduler is not None:
+                await self.scheduler.submit(name, *values)
+            else:
+                await method(*values)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning("Command '%s' failed: %s", command, e)
+            return f"error: {e}".replace("\n", " ").replace(";", ",")
+
+        return "ok"
+
+
+def _done(statuses: list[str]) -> "asyncio.Future[list[str]]":
+    future: asyncio.Future[list[str]] = asyncio.get_running_loop().create_future()
+    future.set_result(statuses)
+    return future
+
+
+def _remove_socket(path: str) -> None:
+    """Remove socket at `path`, refuse to remove anything else"""
+
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{path} exists and is not a socket")
+    os.unlink(path)
@@ -0,0 +1,483 @@
+"""
+Content-addressed cover art cache
+
+Covers are keyed by hash of their contents, so repeated tracks and tracks
+of the same album reuse already encoded and saved images.
+
+Streams are ingested in chunks by `CoverReader` (reusable buffer, hashed as
+read), files are memory-mapped and hashed in place by `CoverCache.put_file`
+(in a worker thread with `put_file_async`). Either way a cover is copied
+only once, and not at all if it is already cached.
+"""
+
+__all__ = ["CoverCache", "CoverEntry", "CoverReader", "sniff_mime"]
+
+import asyncio
+import logging
+import mmap
+import os
+from base64 import b64encode
+from collections import OrderedDict
+from hashlib import blake2b
+from pathlib import Path
+from typing import Any, Container, Optional, Union
+from urllib.parse import unquote, urlparse
+
+from .utils import write_file
+
+logger = logging.getLogger(__name__)
+
+Bytes = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+CHUNK_SIZE = 64 * 1024
+
+# Larger files are hashed in a worker thread by `CoverCache.put_file_async`
+INLINE_FILE_BYTES = 256 * 1024
+
+# Known source of a cover: (path, size, mtime) of a file, or
+# (stream source, size, length and hash of the first chunks) of a stream
+Source = tuple[Any, ...]
+
+MIME_EXTENSIONS = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/gif": "gif",
+    "image/webp": "webp",
+    "image/bmp": "bmp",
+    "application/octet-stream": "bin",
+}
+
+
+def sniff_mime(data: Bytes) -> str:
+    """Guess image MIME type by its signature"""
+
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data.startswith(b"BM"):
+        return "image/bmp"
+    return "application/octet-stream"
+
+
+def content_hash(data: Bytes) -> str:
+    return blake2b(data, digest_size=16).hexdigest()
+
+
+# Buffers of finished readers, reused by the next ones
+_buffers: list[bytearray] = []
+_MAX_BUFFERS = 2
+_MAX_BUFFER_BYTES = 8 * 1024 * 1024
+
+
+class CoverEntry:
+    """Cached cover image
+
+    Also serves as a lightweight cover handle: entries are compared by
+    content hash, base64 form is created on first access and file on disk
+    by `ensure_file`.
+    """
+
+    __slots__ = (
+        "key",
+        "raw",
+        "mime",
+        "pinned",
+        "_b64",
+        "_b64_json",
+        "_path",
+        "_directory",
+    )
+
+    def __init__(
+        self, key: str, raw: bytes, directory: str, pinned: bool = False
+    ) -> None:
+        self.key = key
+        self.raw = raw
+        self.mime = sniff_mime(raw)
+        self.pinned = pinned
+        self._b64: Optional[str] = None
+        self._b64_json: Optional[bytes] = None
+        self._path: Optional[str] = None
+        self._directory = directory
+
+    def __repr__(self) -> str:
+        return f"CoverEntry({self.key!r}, {self.mime!r}, size={self.size})"
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, CoverEntry):
+            return NotImplemented
+        return self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    @property
+    def size(self) -> int:
+        return len(self.raw)
+
+    def memoryview(self) -> memoryview:
+        """Raw image without copying"""
+        return memoryview(self.raw)
+
+    @property
+    def b64(self) -> str:
+        if self._b64 is None:
+            self._b64 = b64encode(self.raw).decode("utf-8")
+        return self._b64
+
+    @property
+    def b64_json(self) -> bytes:
+        """Base64 as an encoded JSON string, to splice into JSON output"""
+        if self._b64_json is None:
+            self._b64_json = b'"' + b64encode(self.raw) + b'"'
+        return self._b64_json
+
+    @property
+    def path(self) -> Optional[str]:
+        """Path of the file on disk, None until `ensure_file` is called"""
+        return self._path
+
+    def ensure_file(self) -> str:
+        """Write the image to disk if not written yet, returns its path"""
+
+        if self._path is None:
+            path = f"{self._directory}/{self.key}.{MIME_EXTENSIONS[self.mime]}"
+            if not os.path.exists(path):
+                os.makedirs(self._directory, exist_ok=True)
+                write_file(path, self.raw)
+            self._path = path
+        return self._path
+
+    def file_url(self) -> str:
+        """`file://` URL of the file on disk, see `ensure_file`"""
+        return Path(self.ensure_file()).absolute().as_uri()
+
+    @property
+    def cost(self) -> int:
+        """Memory held by the entry in bytes"""
+        return (
+            len(self.raw)
+            + (len(self._b64) if self._b64 is not None else 0)
+            + (len(self._b64_json) if self._b64_json is not None else 0)
+        )
+
+    def remove_file(self) -> None:
+        if self._path is None:
+            return
+        try:
+            os.remove(self._path)
+        except OSError as e:
+            logger.warning("Cannot remove cached cover: %s", e)
+        self._path = None
+
+
+class CoverCache:
+    """LRU cache of covers bounded by total size and entry count
+
+    Pinned entries (e.g. placeholder) are never evicted. Covers larger than
+    `max_cover_bytes` are rejected.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 32 * 1024 * 1024,
+        max_entries: int = 64,
+        max_cover_bytes: int = 16 * 1024 * 1024,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_cover_bytes = max_cover_bytes
+        self._entries: OrderedDict[str, CoverEntry] = OrderedDict()
+        # Source -> key, to skip reading known files and streams
+        self._sources: OrderedDict[Source, str] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    @property
+    def size(self) -> int:
+        """Memory held by all entries in bytes"""
+        return sum(e.cost for e in self._entries.values())
+
+    def get(self, key: str) -> Optional[CoverEntry]:
+        if (entry := self._entries.get(key)) is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(
+        self, raw: Bytes, pinned: bool = False, key: Optional[str] = None
+    ) -> CoverEntry:
+        """Get entry for `raw` image, adding it if not cached yet
+
+        `raw` is copied only if it is not cached and not `bytes` already.
+        `key` is its content hash, if known.
+        """
+
+        if key is None:
+            key = content_hash(raw)
+
+        if (entry := self.get(key)) is not None:
+            entry.pinned |= pinned
+            return entry
+
+        entry = CoverEntry(key, bytes(raw), self.directory, pinned)
+        self._entries[key] = entry
+        self.evict()
+        return entry
+
+    def reader(self, size_hint: int = 0, source: Any = None) -> "CoverReader":
+        """Ingest a cover read in chunks, see `CoverReader`"""
+        return CoverReader(self, size_hint, source)
+
+    def put_file(self, path: str) -> Optional[CoverEntry]:
+        """Get entry for image file at `path` (or `file://` URL)
+
+        The file is memory-mapped and hashed in place, it is copied only if
+        not cached yet. Files seen before with the same size and
+        modification time are not read again. Returns None if the file
+        cannot be read or is too large.
+        """
+
+        path = _local_path(path)
+        if (entry := self.cached_file(path)) is not None:
+            return entry
+
+        try:
+            mapped = _map_file(path, self.max_cover_bytes, self._entries)
+        except (OSError, ValueError) as e:
+            _log_unreadable(path, e)
+            return None
+        return self._add_file(*mapped)
+
+    async def put_file_async(self, path: str) -> Optional[CoverEntry]:
+        """`put_file` for the event loop
+
+        Files larger than `INLINE_FILE_BYTES` are hashed and copied in a
+        worker thread.
+        """
+
+        path = _local_path(path)
+        try:
+            size = os.stat(path).st_size
+        except OSError as e:
+            _log_unreadable(path, e)
+            return None
+        if size <= INLINE_FILE_BYTES or self.cached_file(path) is not None:
+            return self.put_file(path)
+
+        try:
+            mapped = await asyncio.to_thread(
+                _map_file, path, self.max_cover_bytes, set(self._entries)
+            )
+        except (OSError, ValueError) as e:
+            _log_unreadable(path, e)
+            return None
+
+        if (entry := self._add_file(*mapped)) is None:
+            return self.put_file(path)  # evicted while it was read
+        return entry
+
+    def cached_file(self, path: str) -> Optional[CoverEntry]:
+        """Entry of file at `path` if it was added unchanged, without reading it"""
+
+        path = _local_path(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return self._source((path, stat.st_size, stat.st_mtime_ns))
+
+    def _add_file(
+        self, source: Source, key: str, raw: Optional[bytes]
+    ) -> Optional[CoverEntry]:
+        """Add file read by `_map_file`, None if it was cached but is gone"""
+
+        if raw is not None:
+            entry = self.put(raw, key=key)
+        elif (entry := self.get(key)) is None:
+            return None
+
+        self._add_source(source, key)
+        return entry
+
+    def _source(self, source: Source) -> Optional[CoverEntry]:
+        if (key := self._sources.get(source)) is None:
+            return None
+        return self.get(key)
+
+    def _add_source(self, source: Source, key: str) -> None:
+        self._sources[source] = key
+        if len(self._sources) > self.max_entries:
+            self._sources.popitem(last=False)
+
+    def evict(self) -> None:
+        """Drop least recently used entries until the cache fits its bounds"""
+
+        size = self.size
+        for key in list(self._entries):
+            if size <= self.max_bytes and len(self._entries) <= self.max_entries:
+                break
+
+            entry = self._entries[key]
+            if entry.pinned or key == next(reversed(self._entries)):
+                continue  # the newest entry is in use by the caller
+
+            del self._entries[key]
+            size -= entry.cost
+            entry.remove_file()
+            logger.debug("Evicted cover %s", key)
+
+
+class CoverReader:
+    """Ingests a cover read in chunks
+
+    Chunks (any bytes-like objects) are copied into a reusable buffer and
+    hashed as they arrive. Reading should stop as soon as `write` returns
+    False (`done` is set): the cover exceeds `max_cover_bytes` of the cache
+    (also checked against `size_hint` up front), or it is already cached.
+
+    Covers are identified by hash of their whole contents. Only if `source`
+    is set (hashable, e.g. URL or app and track the stream belongs to), a
+    cover of `size_hint` bytes is recognized as cached by its first
+    `CHUNK_SIZE` or more bytes: if a cover of the same size starting with
+    them was ingested from the same source in the same chunks before.
+    Different covers of a source must not have the same size and start.
+    `finish` returns the cached entry, creating it only if the cover is new,
+    and closes the reader.
+    """
+
+    __slots__ = (
+        "cache",
+        "size",
+        "size_hint",
+        "source",
+        "done",
+        "_cached",
+        "_prefix",
+        "_hash",
+        "_buffer",
+    )
+
+    def __init__(
+        self, cache: CoverCache, size_hint: int = 0, source: Any = None
+    ) -> None:
+        self.cache = cache
+        self.size = 0
+        self.size_hint = size_hint
+        self.source = source
+        self.done = False
+        self._cached: Optional[CoverEntry] = None
+        self._prefix: Optional[Source] = None  # source and start of the cover
+        self._hash = blake2b(digest_size=16)
+        self._buffer = _buffers.pop() if _buffers else bytearray()
+
+        if size_hint > cache.max_cover_bytes:
+            self._abort(size_hint)
+
+    @property
+    def aborted(self) -> bool:
+        """Reading stopped and the cover is not available"""
+        return self.done and self._cached is None
+
+    def _abort(self, size: int) -> None:
+        logger.warning("Cover too large (%d bytes), skipped", size)
+        self.done = True
+
+    def write(self, chunk: Bytes) -> bool:
+        """Append `chunk`, returns False if reading should stop"""
+
+        if self.done:
+            return False
+
+        with memoryview(chunk) as view:
+            end = self.size + view.nbytes
+            if end > self.cache.max_cover_bytes:
+                self._abort(end)
+                return False
+
+            # Overwrites the buffer in place, grows it past its end
+            self._buffer[self.size : end] = view.cast("B")
+            self._hash.update(view)
+        self.size = end
+
+        if (
+            self._prefix is None
+            and self.source is not None
+            and end >= CHUNK_SIZE
+            and self.size_hint > end
+        ):
+            prefix_hash = self._hash.copy().hexdigest()
+            self._prefix = (self.source, self.size_hint, end, prefix_hash)
+            if (entry := self.cache._source(self._prefix)) is not None:
+                self._cached = entry
+                self.done = True
+                return False
+        return True
+
+    def finish(self) -> Optional[CoverEntry]:
+        """Cached entry of the cover, None if empty or aborted"""
+
+        buffer = self._buffer
+        try:
+            if self._cached is not None:
+                return self._cached
+            if self.done or not self.size:
+                return None
+            with memoryview(buffer) as whole, whole[: self.size] as view:
+                entry = self.cache.put(view, key=self._hash.hexdigest())
+            if self._prefix is not None and self.size == self.size_hint:
+                self.cache._add_source(self._prefix, entry.key)
+            return entry
+        finally:
+            self.size = 0
+            self.done = True  # closed
+            self._cached = None
+            self._buffer = bytearray()
+            if len(_buffers) < _MAX_BUFFERS and 0 < len(buffer) <= _MAX_BUFFER_BYTES:
+                _buffers.append(buffer)
+
+
+def _local_path(path: str) -> str:
+    """Path of `file://` URL, other paths as is"""
+
+    if path.startswith("file://"):
+        return unquote(urlparse(path).path)
+    return path
+
+
+def _map_file(
+    path: str, max_bytes: int, cached: Container[str]
+) -> tuple[Source, str, Optional[bytes]]:
+    """Source and content hash of file at `path`, and its contents unless cached
+
+    The file is memory-mapped and hashed in place. Raises ValueError if it
+    is empty or larger than `max_bytes`.
+    """
+
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        if not 0 < stat.st_size <= max_bytes:
+            raise ValueError(f"empty or too large ({stat.st_size} bytes)")
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            key = content_hash(data)
+            raw = None if key in cached else bytes(data)
+
+    return (path, stat.st_size, stat.st_mtime_ns), key, raw
+
+
+def _log_unreadable(path: str, e: Exception) -> None:
+    if isinstance(e, ValueError):
+        logger.warning("Cover %s is %s", path, e)
+    else:
+        logger.debug("Cannot read cover: %s", e)
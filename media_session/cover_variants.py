@@ -0,0 +1,126 @@
+"""
+Downscaled cover variants
+
+Small consumers (overlays, widgets) need a 64-300 px image, not the full
+original art. `CoverProcessor` derives variants (size and format) with
+Pillow in worker threads and caches them in the cover cache by source hash
+plus variant. Without Pillow the original cover is used.
+"""
+
+__all__ = ["CoverVariant", "CoverProcessor", "HAS_PILLOW", "render"]
+
+import asyncio
+import logging
+from collections import OrderedDict
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from importlib.util import find_spec
+from io import BytesIO
+from typing import Literal, Optional
+
+from .cover_cache import CoverCache, CoverEntry
+
+logger = logging.getLogger(__name__)
+
+HAS_PILLOW = find_spec("PIL") is not None
+
+
+@dataclass(frozen=True, slots=True)
+class CoverVariant:
+    """Cover scaled down to fit `size` x `size` pixels, encoded as `format`"""
+
+    size: int = 128
+    format: Literal["webp", "jpeg", "png"] = "webp"
+    quality: int = 80  # webp and jpeg
+
+    def __post_init__(self) -> None:
+        if self.size <= 0:
+            raise ValueError(f"Size must be positive, got {self.size}")
+        if self.format not in ("webp", "jpeg", "png"):
+            raise ValueError(f"Unknown cover format: {self.format!r}")
+
+
+def render(raw: bytes, variant: CoverVariant) -> bytes:
+    """Encode `raw` image as `variant`. Blocking, run in a worker"""
+
+    # pylint: disable-next=import-outside-toplevel
+    from PIL import Image
+
+    size = (variant.size, variant.size)
+    with Image.open(BytesIO(raw)) as image:
+        image.draft("RGB", size)  # JPEG: decode at reduced scale
+        image.thumbnail(size)
+        if variant.format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        out = BytesIO()
+        image.save(out, format=variant.format.upper(), quality=variant.quality)
+        return out.getvalue()
+
+
+class CoverProcessor:
+    """Derives cover variants off the event loop
+
+    Work runs in `executor` (default executor of the loop if None). A
+    process pool can be used as well, `render` is picklable. Results are
+    cover cache entries, variants evicted from the cache are derived again.
+    """
+
+    def __init__(
+        self,
+        cache: CoverCache,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        self.cache = cache
+        self.executor = executor
+        # (source key, variant) -> variant key
+        self._variants: OrderedDict[tuple[str, CoverVariant], str] = OrderedDict()
+        self._pending: dict[tuple[str, CoverVariant], asyncio.Future[CoverEntry]] = {}
+
+    def get(self, cover: CoverEntry, variant: CoverVariant) -> Optional[CoverEntry]:
+        """Variant of `cover` if it is ready"""
+
+        if not HAS_PILLOW:
+            return cover
+        if (key := self._variants.get((cover.key, variant))) is None:
+            return None
+        if key == cover.key:
+            return cover  # original is used, even if evicted from the cache
+        return self.cache.get(key)
+
+    async def derive(self, cover: CoverEntry, variant: CoverVariant) -> CoverEntry:
+        """Variant of `cover`, rendered in a worker if not cached
+
+        Falls back to the original if it cannot be rendered or the variant
+        is not smaller.
+        """
+
+        if (entry := self.get(cover, variant)) is not None:
+            return entry
+
+        source = (cover.key, variant)
+        if (future := self._pending.get(source)) is not None:
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = self._pending[source] = loop.create_future()
+        try:
+            try:
+                raw = await loop.run_in_executor(
+                    self.executor, render, cover.raw, variant
+                )
+            except Exception as e:  # pylint: disable=broad-except
+                logger.warning("Cannot render cover %s: %s", cover.key, e)
+                entry = cover
+            else:
+                entry = cover if len(raw) >= cover.size else self.cache.put(raw)
+
+            self._variants[source] = entry.key
+            if len(self._variants) > self.cache.max_entries:
+                self._variants.popitem(last=False)
+            future.set_result(entry)
+            return entry
+        finally:
+            del self._pending[source]
+            if not future.done():
+                future.cancel()
@@ -1,48 +1,150 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, asdict, field
+from dataclasses import dataclass, field, fields
 from enum import IntEnum
-from typing import Any
+from time import time
+from typing import Any, Literal, Optional, TypeAlias
 
+from .cover_cache import CoverEntry
+from .utils import compute_position
+
+CoverMode: TypeAlias = Literal["inline", "hash", "url"]
 
-@dataclass
-class RawMediaInfo:
-    provider: str
-    playback_info: PlaybackInfo
-    timeline_properties: TimelineProperties
-    media_properties: MediaProperties
 
+@dataclass(slots=True)
+class PlaybackInfo:
+    auto_repeat_mode: Optional[str] = None  # "none", "track", "all"
+    controls: Any = None
+    is_shuffle_active: Optional[bool] = None
+    playback_rate: Optional[float] = None
+    playback_status: str = "stopped"
+    playback_type: Optional[int] = None
 
-@dataclass
-class PlaybackInfo: ...
 
+@dataclass(slots=True)
+class TimelineProperties:
+    # microseconds
+    end_time: int = 0
+    max_seek_time: int = 0
+    min_seek_time: int = 0
+    position: int = 0
+    start_time: int = 0
 
-@dataclass
-class TimelineProperties: ...
+    last_updated_time: float = 0  # timestamp of `position`
 
 
-@dataclass
+@dataclass(slots=True)
 class MediaProperties:
-    title: str
-    artist: str
+    title: str = ""
+    artist: str = ""
+
+    album_title: str = ""
+    album_artist: str = ""
+    album_track_count: int = 0
+
+    track_number: int = 0
+    subtitle: str = ""
+    genres: tuple[str, ...] = ()
 
-    album_title: str
-    album_artist: str
-    album_track_count: int
+    thumbnail: str = ""  # path
+    thumbnail_ref: Optional[CoverEntry] = None
 
-    track_number: int
-    subtitle: str
-    genres: list[str]
+    playback_type: Optional[int] = None
 
-    # We can store thumbnail in different ways:
-    # 1. WinRT StreamRef (original data)
-    # 2. Base64
-    # 3. File path       (needs saving => side effects)
-    # 4. Raw
-    thumbnail: str  # path
-    thumbnail_data: str  # base64
 
-    playback_type: str
+@dataclass(slots=True)
+class RawMediaInfo:
+    """Mutable state of a media session
+
+    Sections are updated in place, every change bumps `version`.
+    """
+
+    provider: str = ""
+    playback_info: PlaybackInfo = field(default_factory=PlaybackInfo)
+    timeline_properties: TimelineProperties = field(
+        default_factory=TimelineProperties
+    )
+    media_properties: MediaProperties = field(default_factory=MediaProperties)
+
+    version: int = 0
+    _snapshot: Optional[MediaInfo] = field(default=None, init=False, repr=False)
+    _snapshot_version: int = field(default=-1, init=False, repr=False)
+
+    def update(self, section: str, values: dict[str, Any]) -> bool:
+        """Set fields of `section` (e.g. "playback_info") in place
+
+        Returns True if anything changed.
+        """
+
+        target = getattr(self, section)
+        changed = False
+
+        for key, value in values.items():
+            if getattr(target, key) != value:
+                setattr(target, key, value)
+                changed = True
+
+        if changed:
+            self.version += 1
+        return changed
+
+    def set_provider(self, provider: str) -> bool:
+        if provider == self.provider:
+            return False
+        self.provider = provider
+        self.version += 1
+        return True
+
+    @property
+    def playing(self) -> bool:
+        return self.playback_info.playback_status == "playing"
+
+    def position(self, now: Optional[float] = None) -> int:
+        """Playback position in microseconds, extrapolated to `now`"""
+
+        timeline = self.timeline_properties
+
+        if not self.playing or timeline.last_updated_time < 0:
+            return timeline.position
+
+        return compute_position(
+            timeline.position,
+            timeline.last_updated_time,
+            self.playback_info.playback_rate or 1.0,
+            time() if now is None else now,
+            timeline.end_time,
+        )
+
+    def snapshot(self) -> MediaInfo:
+        """Immutable `MediaInfo` of current state
+
+        Reused until the state changes, unless playing (position moves).
+        """
+
+        if (
+            self._snapshot is not None
+            and self._snapshot_version == self.version
+            and not self.playing
+        ):
+            return self._snapshot
+
+        media = self.media_properties
+        self._snapshot = MediaInfo(
+            title=media.title,
+            artist=media.artist,
+            album_title=media.album_title,
+            album_artist=media.album_artist,
+            album_track_count=media.album_track_count,
+            track_number=media.track_number,
+            genres=media.genres,
+            cover=media.thumbnail,
+            cover_ref=media.thumbnail_ref,
+            position=self.position(),
+            duration=self.timeline_properties.end_time,
+            state=self.playback_info.playback_status,
+        )
+        self._snapshot_version = self.version
+        return self._snapshot
 
 
 class MediaRepeat(IntEnum):
@@ -62,15 +164,43 @@ class MediaInfo:
     album_track_count: int = 0
     track_number: int = 0
 
-    genres: list[str] = field(default_factory=list)
+    genres: tuple[str, ...] = ()
 
     cover: str = ""  # filepath
-    cover_data: str = ""  # base64 string
+    cover_ref: Optional[CoverEntry] = field(default=None, repr=False)
 
     position: int = 0  # microseconds
     duration: int = 0  # microseconds
 
     state: str = "stopped"  # Literal["stopped", "playing", "paused"]
 
-    def as_dict(self) -> dict[str, Any]:
-        return asdict(self)
+    @property
+    def cover_data(self) -> str:
+        """Base64 encoded cover, encoded on first access"""
+        return "" if self.cover_ref is None else self.cover_ref.b64
+
+    def as_dict(self, cover: CoverMode = "inline") -> dict[str, Any]:
+        """Convert to dict
+
+        cover="inline" includes base64 `cover_data`,
+        cover="hash" includes `cover_hash` to reference cover by content,
+        cover="url" includes `cover_url` of the cover file.
+        """
+
+        result = {f: getattr(self, f) for f in _MEDIA_INFO_FIELDS}
+        result["genres"] = list(self.genres)
+
+        if cover == "inline":
+            result["cover_data"] = self.cover_data
+        elif cover == "hash":
+            result["cover_hash"] = self.cover_ref and self.cover_ref.key
+        elif cover == "url":
+            cover_ref = self.cover_ref
+            result["cover_url"] = cover_ref.file_url() if cover_ref else self.cover
+        else:
+            raise ValueError(f"Unknown cover mode: {cover!r}")
+
+        return result
+
+
+_MEDIA_INFO_FIELDS = tuple(f.name for f in fields(MediaInfo) if f.name != "cover_ref")
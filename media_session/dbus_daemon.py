@@ -0,0 +1,100 @@
+"""
+Private D-Bus daemon
+
+Runs a session bus of its own, so MPRIS players and the Linux backend can
+be tested and load-tested without a desktop session.
+"""
+
+__all__ = ["DBusDaemon"]
+
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+CONFIG = """<!DOCTYPE busconfig PUBLIC
+ "-//freedesktop//DTD D-Bus Bus Configuration 1.0//EN"
+ "http://www.freedesktop.org/standards/dbus/1.0/busconfig.dtd">
+<busconfig>
+  <type>session</type>
+  <listen>unix:dir={directory}</listen>
+  <auth>EXTERNAL</auth>
+  <policy context="default">
+    <allow send_destination="*" eavesdrop="true"/>
+    <allow eavesdrop="true"/>
+    <allow own="*"/>
+  </policy>
+</busconfig>
+"""
+
+
+class DBusDaemon:
+    """`dbus-daemon` listening in a temporary directory
+
+    Use as a context manager, `address` is set while running:
+
+        with DBusDaemon() as daemon:
+            session = MediaSessionLinux(bus_address=daemon.address)
+    """
+
+    def __init__(self, executable: str = "dbus-daemon") -> None:
+        self.executable = executable
+        self.address: Optional[str] = None
+        self._process: Optional[subprocess.Popen[bytes]] = None
+        self._directory: Optional[str] = None
+
+    def __enter__(self) -> "DBusDaemon":
+        self.start()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.stop()
+
+    def start(self) -> str:
+        """Start the daemon and return its address"""
+
+        if (executable := shutil.which(self.executable)) is None:
+            raise FileNotFoundError(f"{self.executable} not found")
+
+        self._directory = tempfile.mkdtemp(prefix="media_session-dbus-")
+        config = os.path.join(self._directory, "session.conf")
+        with open(config, "w", encoding="utf-8") as f:
+            f.write(CONFIG.format(directory=self._directory))
+
+        self._process = subprocess.Popen(  # pylint: disable=consider-using-with
+            [executable, f"--config-file={config}", "--nofork", "--print-address"],
+            stdout=subprocess.PIPE,
+        )
+        assert self._process.stdout is not None
+
+        if not (address := self._process.stdout.readline().decode().strip()):
+            self.stop()
+            raise RuntimeError("dbus-daemon exited without printing its address")
+
+        self.address = address
+        logger.info("Private bus at %s", address)
+        return address
+
+    def stop(self) -> None:
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait()
+            if self._process.stdout is not None:
+                self._process.stdout.close()
+            self._process = None
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+        self.address = None
+
+    @property
+    def environ(self) -> dict[str, str]:
+        """Environment for child processes that should use this bus"""
+
+        if self.address is None:
+            raise RuntimeError("Daemon is not running")
+        return {**os.environ, "DBUS_SESSION_BUS_ADDRESS": self.address}
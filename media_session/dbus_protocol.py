@@ -0,0 +1,685 @@
+"""
+Minimal asyncio D-Bus client
+
+Implements the parts of the D-Bus wire protocol the Linux backend needs:
+EXTERNAL authentication over a Unix socket (or TCP), method calls,
+replies, errors and signals. Objects can be exported with method
+handlers, enough for a simple service such as the fake MPRIS player.
+Everything runs on the event loop, nothing blocks it. Values are plain
+Python objects: variants are unwrapped on receipt, object paths and
+signatures are `str`, structs are tuples.
+"""
+
+__all__ = [
+    "DBusConnection",
+    "DBusError",
+    "MethodHandler",
+    "Reply",
+    "CALL_TIMEOUT",
+    "Message",
+    "Variant",
+    "session_bus_address",
+    "marshal",
+    "unmarshal",
+]
+
+import asyncio
+import inspect
+import logging
+import os
+import struct
+from functools import lru_cache, partial
+from itertools import count
+from typing import Any, Awaitable, Callable, Optional, Sequence, TypeAlias, Union
+from urllib.parse import unquote
+
+logger = logging.getLogger(__name__)
+
+BUS_NAME = "org.freedesktop.DBus"
+BUS_PATH = "/org/freedesktop/DBus"
+BUS_INTERFACE = "org.freedesktop.DBus"
+
+# Message types
+METHOD_CALL = 1
+METHOD_RETURN = 2
+ERROR = 3
+SIGNAL = 4
+
+NO_REPLY_EXPECTED = 0x1
+
+# Header field codes -> (attribute of `Message`, signature)
+_HEADER_FIELDS: dict[int, tuple[str, str]] = {
+    1: ("path", "o"),
+    2: ("interface", "s"),
+    3: ("member", "s"),
+    4: ("error_name", "s"),
+    5: ("reply_serial", "u"),
+    6: ("destination", "s"),
+    7: ("sender", "s"),
+    8: ("signature", "g"),
+}
+
+_ALIGNMENT = {
+    "y": 1, "b": 4, "n": 2, "q": 2, "i": 4, "u": 4, "x": 8, "t": 8, "d": 8,
+    "h": 4, "s": 4, "o": 4, "g": 1, "a": 4, "(": 8, "{": 8, "v": 1,
+}  # fmt: skip
+
+_FIXED = {
+    "y": "B", "b": "I", "n": "h", "q": "H", "i": "i", "u": "I", "x": "q",
+    "t": "Q", "d": "d", "h": "I",
+}  # fmt: skip
+
+MAX_MESSAGE_SIZE = 128 * 1024 * 1024
+
+CALL_TIMEOUT = 25.0  # seconds, D-Bus default
+
+Reply: TypeAlias = tuple[str, Sequence[Any]]  # signature and body
+
+MethodHandler: TypeAlias = Callable[
+    ["Message"], Union[Optional[Reply], Awaitable[Reply]]
+]
+"""Handles a method call: returns signature and body of the reply, or None if
+the method is unknown. Raises `DBusError` to reply with an error. May return
+an awaitable of the reply instead, which runs as a task on the loop."""
+
+
+class DBusError(Exception):
+    """Error reply, or failure of the connection"""
+
+    def __init__(self, name: str, message: str = "") -> None:
+        super().__init__(f"{name}: {message}" if message else name)
+        self.name = name
+        self.message = message
+
+
+class Variant:
+    """Value with explicit signature, to send as `v`"""
+
+    __slots__ = ("signature", "value")
+
+    def __init__(self, signature: str, value: Any) -> None:
+        self.signature = signature
+        self.value = value
+
+    def __repr__(self) -> str:
+        return f"Variant({self.signature!r}, {self.value!r})"
+
+
+#
+# Signatures
+#
+
+
+@lru_cache(maxsize=256)
+def split_signature(signature: str) -> tuple[str, ...]:
+    """Split signature into single complete types"""
+
+    types = []
+    i = 0
+    while i < len(signature):
+        end = _type_end(signature, i)
+        types.append(signature[i:end])
+        i = end
+    return tuple(types)
+
+
+def _type_end(signature: str, i: int) -> int:
+    char = signature[i]
+    if char == "a":
+        return _type_end(signature, i + 1)
+    if char in "({":
+        close = ")" if char == "(" else "}"
+        depth = 0
+        for j in range(i, len(signature)):
+            if signature[j] == char:
+                depth += 1
+            elif signature[j] == close:
+                depth -= 1
+                if depth == 0:
+                    return j + 1
+        raise ValueError(f"Unbalanced signature: {signature!r}")
+    if char in _ALIGNMENT:
+        return i + 1
+    raise ValueError(f"Unknown type {char!r} in signature {signature!r}")
+
+
+#
+# Marshalling
+#
+
+
+def _pad(buffer: bytearray, alignment: int) -> None:
+    if remainder := len(buffer) % alignment:
+        buffer += bytes(alignment - remainder)
+
+
+def marshal(buffer: bytearray, signature: str, values: Sequence[Any]) -> None:
+    """Append `values` of `signature` to `buffer` (little endian)
+
+    Alignment is relative to the start of `buffer`.
+    """
+
+    types = split_signature(signature)
+    if len(types) != len(values):
+        raise ValueError(f"Signature {signature!r} needs {len(types)} values")
+    for t, value in zip(types, values):
+        _marshal(buffer, t, value)
+
+
+def _marshal(buffer: bytearray, t: str, value: Any) -> None:
+    char = t[0]
+    _pad(buffer, _ALIGNMENT[char])
+
+    if (fmt := _FIXED.get(char)) is not None:
+        buffer += struct.pack("<" + fmt, value)
+    elif char in "so":
+        data = value.encode("utf-8")
+        buffer += struct.pack("<I", len(data))
+        buffer += data
+        buffer.append(0)
+    elif char == "g":
+        data = value.encode("ascii")
+        buffer.append(len(data))
+        buffer += data
+        buffer.append(0)
+    elif char == "v":
+        if not isinstance(value, Variant):
+            value = Variant(_guess_signature(value), value)
+        _marshal(buffer, "g", value.signature)
+        _marshal(buffer, value.signature, value.value)
+    elif char == "a":
+        length_at = len(buffer)
+        buffer += bytes(4)
+        element = t[1:]
+        _pad(buffer, _ALIGNMENT[element[0]])  # even if empty
+        start = len(buffer)
+        if element[0] == "{":
+            key_type, value_type = split_signature(element[1:-1])
+            for k, v in value.items():
+                _pad(buffer, 8)
+                _marshal(buffer, key_type, k)
+                _marshal(buffer, value_type, v)
+        else:
+            for item in value:
+                _marshal(buffer, element, item)
+        struct.pack_into("<I", buffer, length_at, len(buffer) - start)
+    elif char == "(":
+        types = split_signature(t[1:-1])
+        for field_type, item in zip(types, value, strict=True):
+            _marshal(buffer, field_type, item)
+    else:
+        raise ValueError(f"Cannot marshal type {t!r}")
+
+
+def _guess_signature(value: Any) -> str:
+    if isinstance(value, bool):
+        return "b"
+    if isinstance(value, int):
+        return "x"
+    if isinstance(value, float):
+        return "d"
+    if isinstance(value, str):
+        return "s"
+    if isinstance(value, (list, tuple)) and all(isinstance(v, str) for v in value):
+        return "as"
+    if isinstance(value, dict):
+        return "a{sv}"
+    raise TypeError(f"Cannot guess signature of {type(value).__name__}, use Variant")
+
+
+class _Reader:
+    """Unmarshals values from `data`, aligned relative to its start"""
+
+    __slots__ = ("data", "pos", "endian")
+
+    def __init__(self, data: bytes, pos: int = 0, endian: str = "<") -> None:
+        self.data = data
+        self.pos = pos
+        self.endian = endian
+
+    def align(self, alignment: int) -> None:
+        if remainder := self.pos % alignment:
+            self.pos += alignment - remainder
+
+    def read(self, signature: str) -> list[Any]:
+        return [self.read_one(t) for t in split_signature(signature)]
+
+    def read_one(self, t: str) -> Any:
+        char = t[0]
+        self.align(_ALIGNMENT[char])
+
+        if (fmt := _FIXED.get(char)) is not None:
+            (value,) = struct.unpack_from(self.endian + fmt, self.data, self.pos)
+            self.pos += struct.calcsize(fmt)
+            return bool(value) if char == "b" else value
+        if char in "so":
+            (length,) = struct.unpack_from(self.endian + "I", self.data, self.pos)
+            start = self.pos + 4
+            self.pos = start + length + 1
+            return self.data[start : start + length].decode("utf-8")
+        if char == "g":
+            length = self.data[self.pos]
+            start = self.pos + 1
+            self.pos = start + length + 1
+            return self.data[start : start + length].decode("ascii")
+        if char == "v":
+            return self.read_one(self.read_one("g"))
+        if char == "a":
+            (length,) = struct.unpack_from(self.endian + "I", self.data, self.pos)
+            self.pos += 4
+            element = t[1:]
+            self.align(_ALIGNMENT[element[0]])
+            end = self.pos + length
+            if element[0] == "{":
+                key_type, value_type = split_signature(element[1:-1])
+                result = {}
+                while self.pos < end:
+                    self.align(8)
+                    key = self.read_one(key_type)
+                    result[key] = self.read_one(value_type)
+                return result
+            items = []
+            while self.pos < end:
+                items.append(self.read_one(element))
+            return items
+        if char == "(":
+            return tuple(self.read_one(field) for field in split_signature(t[1:-1]))
+        raise ValueError(f"Cannot unmarshal type {t!r}")
+
+
+def unmarshal(data: bytes, signature: str, endian: str = "<") -> list[Any]:
+    """Values of `signature` in `data`, inverse of `marshal`"""
+    return _Reader(data, endian=endian).read(signature)
+
+
+#
+# Messages
+#
+
+
+class Message:
+    """D-Bus message with header fields as attributes and unmarshalled body"""
+
+    __slots__ = (
+        "type",
+        "flags",
+        "serial",
+        "path",
+        "interface",
+        "member",
+        "error_name",
+        "reply_serial",
+        "destination",
+        "sender",
+        "signature",
+        "body",
+    )
+
+    def __init__(
+        self,
+        type_: int,
+        path: str = "",
+        interface: str = "",
+        member: str = "",
+        signature: str = "",
+        body: Sequence[Any] = (),
+        destination: str = "",
+        flags: int = 0,
+    ) -> None:
+        self.type = type_
+        self.flags = flags
+        self.serial = 0
+        self.path = path
+        self.interface = interface
+        self.member = member
+        self.error_name = ""
+        self.reply_serial = 0
+        self.destination = destination
+        self.sender = ""
+        self.signature = signature
+        self.body = list(body)
+
+    def __repr__(self) -> str:
+        return (
+            f"Message({self.type}, {self.path!r}, {self.interface!r},"
+            f" {self.member!r}, sender={self.sender!r})"
+        )
+
+    def encode(self) -> bytes:
+        body = bytearray()
+        if self.signature:
+            marshal(body, self.signature, self.body)
+
+        fields = []
+        for code, (name, signature) in _HEADER_FIELDS.items():
+            if value := getattr(self, name):
+                fields.append((code, Variant(signature, value)))
+
+        header = bytearray(b"l")
+        header += struct.pack(
+            "<BBBII", self.type, self.flags, 1, len(body), self.serial
+        )
+        marshal(header, "a(yv)", [fields])
+        _pad(header, 8)
+        return bytes(header + body)
+
+    @classmethod
+    def decode(cls, data: bytes) -> "Message":
+        endian = "<" if data[:1] == b"l" else ">"
+        type_, flags, _, body_length, serial = struct.unpack_from(
+            endian + "BBBII", data, 1
+        )
+
+        reader = _Reader(data, 12, endian)
+        message = cls(type_, flags=flags)
+        message.serial = serial
+        for code, value in reader.read_one("a(yv)"):
+            if (field := _HEADER_FIELDS.get(code)) is not None:
+                setattr(message, field[0], value)
+
+        # Body starts 8-aligned, so alignment relative to message start holds
+        reader.align(8)
+        if message.signature:
+            if reader.pos + body_length > len(data):
+                raise ValueError("Truncated message body")
+            message.body = reader.read(message.signature)
+        return message
+
+
+#
+# Connection
+#
+
+
+def session_bus_address() -> str:
+    if address := os.environ.get("DBUS_SESSION_BUS_ADDRESS"):
+        return address
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR", f"/run/user/{os.getuid()}")
+    return f"unix:path={runtime_dir}/bus"
+
+
+async def _open(address: str) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Connect to the first reachable of `;` separated addresses"""
+
+    error: Optional[Exception] = None
+    for entry in address.split(";"):
+        transport, _, params = entry.partition(":")
+        options = dict(p.split("=", 1) for p in params.split(",") if "=" in p)
+        options = {k: unquote(v) for k, v in options.items()}
+        try:
+            if transport == "unix" and "path" in options:
+                return await asyncio.open_unix_connection(options["path"])
+            if transport == "unix" and "abstract" in options:
+                return await asyncio.open_unix_connection("\0" + options["abstract"])
+            if transport == "tcp":
+                return await asyncio.open_connection(
+                    options.get("host", "localhost"), int(options["port"])
+                )
+        except OSError as e:
+            error = e
+            continue
+        error = error or DBusError("UnsupportedAddress", entry)
+    raise DBusError("NoServer", f"Cannot connect to {address}: {error}")
+
+
+class DBusConnection:
+    """Message bus connection on the running event loop
+
+    Calls are coroutines, signals are passed to handlers added with
+    `add_signal_handler` (after a match rule is added with `add_match`).
+    Calls to this connection are passed to the handler of their object
+    path, added with `add_method_handler`. Handlers run on the loop and
+    should not block.
+    """
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.unique_name = ""
+        self._reader = reader
+        self._writer = writer
+        self._serials = count(1)
+        self._replies: dict[int, asyncio.Future[Message]] = {}
+        self._signal_handlers: list[Callable[[Message], Any]] = []
+        self._method_handlers: dict[str, MethodHandler] = {}
+        self._calls: set[asyncio.Future[Reply]] = set()  # handled in tasks
+        self._task: Optional[asyncio.Task[None]] = None
+        self.closed: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+
+    @classmethod
+    async def connect(cls, address: Optional[str] = None) -> "DBusConnection":
+        """Connect, authenticate and register on the bus"""
+
+        reader, writer = await _open(address or session_bus_address())
+        connection = cls(reader, writer)
+        try:
+            await connection._authenticate()
+        except BaseException:
+            writer.close()
+            raise
+
+        connection._task = asyncio.create_task(connection._read_messages())
+        (connection.unique_name,) = await connection.call(
+            BUS_NAME, BUS_PATH, BUS_INTERFACE, "Hello"
+        )
+        return connection
+
+    async def _authenticate(self) -> None:
+        uid = str(os.getuid()).encode().hex()
+        self._writer.write(b"\0AUTH EXTERNAL " + uid.encode() + b"\r\n")
+        line = await self._reader.readline()
+        if not line.startswith(b"OK "):
+            raise DBusError("AuthFailed", line.decode(errors="replace").strip())
+        self._writer.write(b"BEGIN\r\n")
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._writer.close()
+        self._closed(DBusError("Disconnected", "Connection closed"))
+
+    def _closed(self, error: Exception) -> None:
+        for future in self._replies.values():
+            if not future.done():
+                future.set_exception(error)
+        self._replies.clear()
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+    def send(self, message: Message) -> int:
+        """Send `message`, returns its serial"""
+
+        message.serial = next(self._serials)
+        self._writer.write(message.encode())
+        return message.serial
+
+    async def call(
+        self,
+        destination: str,
+        path: str,
+        interface: str,
+        member: str,
+        signature: str = "",
+        body: Sequence[Any] = (),
+        timeout: float = CALL_TIMEOUT,
+    ) -> list[Any]:
+        """Call a method and return body of its reply
+
+        Raises `DBusError` on error reply, or if there is no reply in
+        `timeout` seconds.
+        """
+
+        if self.closed.done():
+            raise DBusError("Disconnected", "Connection closed")
+
+        message = Message(
+            METHOD_CALL, path, interface, member, signature, body, destination
+        )
+        future = asyncio.get_running_loop().create_future()
+        serial = self.send(message)
+        self._replies[serial] = future
+        try:
+            reply = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise DBusError(
+                "org.freedesktop.DBus.Error.NoReply",
+                f"No reply to {member} in {timeout} s",
+            ) from None
+        finally:
+            self._replies.pop(serial, None)
+
+        if reply.type == ERROR:
+            raise DBusError(reply.error_name, reply.body[0] if reply.body else "")
+        return reply.body
+
+    async def add_match(self, **rule: str) -> None:
+        """Receive signals matching `rule`, e.g. `add_match(member="Seeked")`"""
+
+        rule_string = ",".join(f"{k}='{v}'" for k, v in rule.items())
+        await self.call(
+            BUS_NAME, BUS_PATH, BUS_INTERFACE, "AddMatch", "s", [rule_string]
+        )
+
+    def add_signal_handler(self, handler: Callable[[Message], Any]) -> None:
+        self._signal_handlers.append(handler)
+
+    def remove_signal_handler(self, handler: Callable[[Message], Any]) -> None:
+        if handler in self._signal_handlers:
+            self._signal_handlers.remove(handler)
+
+    def add_method_handler(self, path: str, handler: MethodHandler) -> None:
+        """Handle method calls to object `path`"""
+        self._method_handlers[path] = handler
+
+    def remove_method_handler(self, path: str) -> None:
+        self._method_handlers.pop(path, None)
+
+    def emit(
+        self,
+        path: str,
+        interface: str,
+        member: str,
+        signature: str = "",
+        body: Sequence[Any] = (),
+    ) -> None:
+        """Broadcast a signal"""
+
+        if self.closed.done():
+            raise DBusError("Disconnected", "Connection closed")
+        self.send(Message(SIGNAL, path, interface, member, signature, body))
+
+    async def _read_messages(self) -> None:
+        error: Exception = DBusError("Disconnected", "Connection closed by the bus")
+        try:
+            while True:
+                self._dispatch(Message.decode(await self._read_message()))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            logger.info("D-Bus connection lost: %s", e)
+        except (DBusError, ValueError, struct.error) as e:
+            logger.error("Invalid D-Bus message: %s", e)
+            error = DBusError("InvalidMessage", str(e))
+        finally:
+            self._writer.close()
+            self._closed(error)
+
+    async def _read_message(self) -> bytes:
+        # Fixed header and length of the header fields array
+        start = await self._reader.readexactly(16)
+        endian = "<" if start[:1] == b"l" else ">"
+        body_length, _, fields_length = struct.unpack_from(endian + "III", start, 4)
+
+        header_length = 16 + fields_length
+        header_length += -header_length % 8
+        if header_length + body_length > MAX_MESSAGE_SIZE:
+            raise DBusError("LimitsExceeded", "Message too large")
+
+        return start + await self._reader.readexactly(
+            header_length - 16 + body_length
+        )
+
+    def _dispatch(self, message: Message) -> None:
+        if message.type in (METHOD_RETURN, ERROR):
+            future = self._replies.pop(message.reply_serial, None)
+            if future is not None and not future.done():
+                future.set_result(message)
+        elif message.type == SIGNAL:
+            for handler in tuple(self._signal_handlers):
+                try:
+                    handler(message)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Signal handler failed")
+        elif message.type == METHOD_CALL:
+            self._handle_call(message)
+
+    def _handle_call(self, call: Message) -> None:
+        """Answer calls to this connection, so callers do not wait"""
+
+        result: Any = None
+        error: Optional[DBusError] = None
+
+        if call.interface == "org.freedesktop.DBus.Peer" and call.member == "Ping":
+            result = ("", ())
+        elif (handler := self._method_handlers.get(call.path)) is not None:
+            try:
+                result = handler(call)
+            except DBusError as e:
+                error = e
+            except Exception as e:  # pylint: disable=broad-except
+                logger.exception("Method handler failed")
+                error = DBusError("org.freedesktop.DBus.Error.Failed", str(e))
+
+        if inspect.isawaitable(result):
+            future = asyncio.ensure_future(result)
+            self._calls.add(future)
+            future.add_done_callback(partial(self._call_done, call))
+            return
+
+        self._reply(call, result, error)
+
+    def _call_done(self, call: Message, future: asyncio.Future[Reply]) -> None:
+        """Reply to `call` handled in a task"""
+
+        self._calls.discard(future)
+        if self.closed.done():
+            return
+
+        result: Optional[Reply] = None
+        error: Optional[DBusError] = None
+        if future.cancelled():
+            error = DBusError("org.freedesktop.DBus.Error.Failed", "Cancelled")
+        elif isinstance(e := future.exception(), DBusError):
+            error = e
+        elif e is not None:
+            logger.error("Method handler failed", exc_info=e)
+            error = DBusError("org.freedesktop.DBus.Error.Failed", str(e))
+        else:
+            result = future.result()
+
+        self._reply(call, result, error)
+
+    def _reply(
+        self, call: Message, result: Optional[Reply], error: Optional[DBusError]
+    ) -> None:
+        if call.flags & NO_REPLY_EXPECTED:
+            return
+
+        if error is None and result is None:
+            error = DBusError(
+                "org.freedesktop.DBus.Error.UnknownMethod",
+                f"No method {call.member} on {call.path}",
+            )
+
+        if error is not None:
+            reply = Message(
+                ERROR, signature="s", body=[error.message], destination=call.sender
+            )
+            reply.error_name = error.name
+        else:
+            assert result is not None
+            signature, body = result
+            reply = Message(
+                METHOD_RETURN, signature=signature, body=body, destination=call.sender
+            )
+        reply.reply_serial = call.serial
+        self.send(reply)
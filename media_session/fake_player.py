@@ -0,0 +1,324 @@
+"""
+Scriptable fake MPRIS player
+
+Exports `org.mpris.MediaPlayer2` and `org.mpris.MediaPlayer2.Player` with
+Metadata, PlaybackStatus, Position, Rate, Shuffle and LoopStatus, emits
+`PropertiesChanged` and `Seeked`, and handles playback controls. Used with
+`dbus_daemon.DBusDaemon` to test and load-test both Linux backends. Runs on
+the pure asyncio D-Bus client, so it needs neither dbus-python nor GLib.
+
+Can also be run as a load generator:
+
+    python -m media_session.fake_player --address ADDRESS --rate 1000 --count 10000
+
+sets titles to `"<sequence number> <send time>"` and artist to the player
+name, so the receiver can measure latency and dropped updates.
+"""
+
+__all__ = ["FakePlayer", "make_metadata"]
+
+import argparse
+import asyncio
+import logging
+from time import time
+from typing import Any, Iterable, Optional, Sequence
+
+from .dbus_protocol import (
+    BUS_INTERFACE,
+    BUS_NAME,
+    BUS_PATH,
+    DBusConnection,
+    DBusError,
+    Message,
+    Variant,
+)
+from .mpris import MPRIS_PATH, MPRIS_PREFIX, PLAYER_INTERFACE, PROPERTIES_INTERFACE
+
+logger = logging.getLogger(__name__)
+
+ROOT_INTERFACE = "org.mpris.MediaPlayer2"
+
+# Property and metadata signatures that cannot be guessed from the value
+_SIGNATURES = {
+    "Metadata": "a{sv}",
+    "Position": "x",
+    "SupportedUriSchemes": "as",
+    "SupportedMimeTypes": "as",
+    "mpris:trackid": "o",
+    "mpris:length": "x",
+    "xesam:artist": "as",
+}
+
+_WRITABLE = frozenset(("LoopStatus", "Rate", "Shuffle"))
+
+
+def make_metadata(
+    track_id: str,
+    title: str = "",
+    artist: Iterable[str] = (),
+    album: str = "",
+    length: int = 0,
+    art_url: str = "",
+) -> dict[str, Any]:
+    """MPRIS Metadata"""
+
+    metadata: dict[str, Any] = {
+        "mpris:trackid": track_id,
+        "mpris:length": length,
+        "xesam:title": title,
+        "xesam:artist": list(artist),
+        "xesam:album": album,
+    }
+    if art_url:
+        metadata["mpris:artUrl"] = art_url
+    return metadata
+
+
+def _variants(values: dict[str, Any]) -> dict[str, Any]:
+    """Wrap `values` in variants with correct D-Bus types"""
+
+    result = {}
+    for key, value in values.items():
+        if key == "Metadata":
+            value = _variants(value)
+        if (signature := _SIGNATURES.get(key)) is not None:
+            value = Variant(signature, value)
+        result[key] = value
+    return result
+
+
+class FakePlayer:
+    """MPRIS player named `org.mpris.MediaPlayer2.<name>` on `connection`
+
+    Call `register` to own the name. Scripted through `update`, `seek_to`
+    and `tracks` (played by `Next`/`Previous`). Received control calls are
+    appended to `calls`.
+    """
+
+    def __init__(
+        self,
+        connection: DBusConnection,
+        name: str = "fake",
+        tracks: Optional[list[dict[str, Any]]] = None,
+    ) -> None:
+        self.connection = connection
+        self.name = name
+        self.bus_name = MPRIS_PREFIX + name
+        self.tracks = tracks or [make_metadata("/track/0", "Track 0")]
+        self.track = 0
+        self.calls: list[tuple[Any, ...]] = []
+
+        # Position is base + rate * elapsed, so it is never polled or updated
+        self._position = 0
+        self._position_time = time()
+
+        self._properties: dict[str, dict[str, Any]] = {
+            ROOT_INTERFACE: {
+                "CanQuit": False,
+                "CanRaise": False,
+                "HasTrackList": False,
+                "Identity": f"Fake player {name}",
+                "SupportedUriSchemes": [],
+                "SupportedMimeTypes": [],
+            },
+            PLAYER_INTERFACE: {
+                "PlaybackStatus": "Stopped",
+                "LoopStatus": "None",
+                "Rate": 1.0,
+                "Shuffle": False,
+                "Metadata": self.tracks[0],
+                "Volume": 1.0,
+                "MinimumRate": 0.1,
+                "MaximumRate": 4.0,
+                "CanGoNext": True,
+                "CanGoPrevious": True,
+                "CanPlay": True,
+                "CanPause": True,
+                "CanSeek": True,
+                "CanControl": True,
+            },
+        }
+
+    async def register(self) -> None:
+        """Export the player and own its bus name"""
+
+        self.connection.add_method_handler(MPRIS_PATH, self._handle)
+        (reply,) = await self.connection.call(
+            BUS_NAME, BUS_PATH, BUS_INTERFACE, "RequestName", "su", [self.bus_name, 4]
+        )
+        if reply != 1:  # primary owner
+            raise DBusError("NameTaken", f"{self.bus_name} is already owned")
+
+    async def unregister(self) -> None:
+        """Release the bus name, as when the player quits"""
+
+        await self.connection.call(
+            BUS_NAME, BUS_PATH, BUS_INTERFACE, "ReleaseName", "s", [self.bus_name]
+        )
+        self.connection.remove_method_handler(MPRIS_PATH)
+
+    #
+    # Scripting
+    #
+
+    @property
+    def position(self) -> int:
+        """Current position in microseconds"""
+
+        player = self._properties[PLAYER_INTERFACE]
+        if player["PlaybackStatus"] != "Playing":
+            return self._position
+        elapsed = time() - self._position_time
+        return self._position + int(elapsed * player["Rate"] * 1_000_000)
+
+    def update(self, **properties: Any) -> None:
+        """Set player properties, emitting one `PropertiesChanged` for changes"""
+
+        player = self._properties[PLAYER_INTERFACE]
+
+        if "PlaybackStatus" in properties or "Rate" in properties:
+            self._set_position(self.position)  # rebase before rate changes
+        if "Metadata" in properties:
+            self._set_position(0)
+
+        changed = {k: v for k, v in properties.items() if player.get(k) != v}
+        if not changed:
+            return
+
+        player.update(changed)
+        self.connection.emit(
+            MPRIS_PATH,
+            PROPERTIES_INTERFACE,
+            "PropertiesChanged",
+            "sa{sv}as",
+            [PLAYER_INTERFACE, _variants(changed), []],
+        )
+
+    def play_track(self, index: int) -> None:
+        self.track = index % len(self.tracks)
+        self.update(Metadata=self.tracks[self.track])
+
+    def seek_to(self, position: int) -> None:
+        """Jump to `position` (microseconds), emitting `Seeked`"""
+
+        self._set_position(position)
+        self.connection.emit(MPRIS_PATH, PLAYER_INTERFACE, "Seeked", "x", [position])
+
+    def _set_position(self, position: int) -> None:
+        self._position = max(position, 0)
+        self._position_time = time()
+
+    #
+    # Method calls
+    #
+
+    def _handle(self, call: Message) -> Optional[tuple[str, Sequence[Any]]]:
+        if call.interface == PROPERTIES_INTERFACE:
+            return self._handle_properties(call.member, *call.body)
+        if call.interface != PLAYER_INTERFACE:
+            return None
+
+        member, args = call.member, call.body
+        status = self._properties[PLAYER_INTERFACE]["PlaybackStatus"]
+
+        if member == "Play":
+            self.update(PlaybackStatus="Playing")
+        elif member == "Pause":
+            self.update(PlaybackStatus="Paused")
+        elif member == "PlayPause":
+            playing = status == "Playing"
+            self.update(PlaybackStatus="Paused" if playing else "Playing")
+        elif member == "Stop":
+            self.update(PlaybackStatus="Stopped")
+            self._set_position(0)
+        elif member == "Next":
+            self.play_track(self.track + 1)
+        elif member == "Previous":
+            self.play_track(self.track - 1)
+        elif member == "Seek":
+            self.seek_to(self.position + args[0])
+        elif member == "SetPosition":
+            track_id, position = args
+            if track_id == self.tracks[self.track]["mpris:trackid"]:
+                self.seek_to(position)
+        elif member != "OpenUri":
+            return None
+
+        self.calls.append((member, *args))
+        return "", ()
+
+    def _handle_properties(
+        self, member: str, interface: str, *args: Any
+    ) -> Optional[tuple[str, Sequence[Any]]]:
+        if interface not in self._properties:
+            raise DBusError(
+                "org.freedesktop.DBus.Error.UnknownInterface",
+                f"Unknown interface {interface}",
+            )
+
+        properties = dict(self._properties[interface])
+        if interface == PLAYER_INTERFACE:
+            properties["Position"] = self.position
+
+        if member == "GetAll":
+            return "a{sv}", [_variants(properties)]
+        if member == "Get":
+            (prop,) = args
+            return "v", list(_variants({prop: properties[prop]}).values())
+        if member == "Set":
+            prop, value = args
+            self.calls.append(("Set", prop, value))
+            if interface == PLAYER_INTERFACE and prop in _WRITABLE:
+                self.update(**{prop: value})
+            return "", ()
+        return None
+
+
+async def _drive(player: FakePlayer, rate: float, count: int) -> None:
+    """Change metadata `count` times at `rate` per second"""
+
+    interval = 0.01
+    burst = max(1, round(rate * interval))
+
+    player.update(PlaybackStatus="Playing")
+    for start in range(0, count, burst):
+        for n in range(start, min(start + burst, count)):
+            player.update(
+                Metadata=make_metadata(
+                    f"/track/{n}", f"{n} {time():.6f}", [player.name]
+                )
+            )
+        await asyncio.sleep(interval)
+    await asyncio.sleep(0.5)  # let the bus deliver the rest
+
+
+async def _main(address: Optional[str], name: str, rate: float, count: int) -> None:
+    connection = await DBusConnection.connect(address)
+    player = FakePlayer(connection, name)
+    await player.register()
+
+    try:
+        if count:
+            await _drive(player, rate, count)
+        else:
+            await connection.closed
+    finally:
+        connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake MPRIS player")
+    parser.add_argument("--address", help="bus address (default: session bus)")
+    parser.add_argument("--name", default="fake")
+    parser.add_argument("--rate", type=float, default=100, help="changes per second")
+    parser.add_argument("--count", type=int, default=0, help="changes, 0 to idle")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(_main(args.address, args.name, args.rate, args.count))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Multi-session manager
+
+Keeps state of every active session (player) by provider id and notifies
+subscribers of each one independently.
+"""
+
+__all__ = ["SessionManager"]
+
+import logging
+from typing import Callable, Optional
+
+from .datastructures import MediaInfo, RawMediaInfo
+from .typing import SessionUpdateCallback
+
+logger = logging.getLogger(__name__)
+
+
+class SessionManager:
+    """State of all sessions with per-session subscriptions
+
+    Backends call `publish` when a session changes and `remove` when it is
+    gone. An update of a session is only delivered to subscribers of all
+    sessions and of that session, so cost per update does not grow with
+    the session count.
+    """
+
+    def __init__(self) -> None:
+        self.sessions: dict[str, RawMediaInfo] = {}
+        self._subscribers: list[SessionUpdateCallback] = []
+        self._session_subscribers: dict[str, list[SessionUpdateCallback]] = {}
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def __contains__(self, provider: str) -> bool:
+        return provider in self.sessions
+
+    def get(self, provider: str) -> Optional[MediaInfo]:
+        if (state := self.sessions.get(provider)) is None:
+            return None
+        return state.snapshot()
+
+    @property
+    def data(self) -> dict[str, MediaInfo]:
+        """Snapshots of all sessions"""
+        return {p: s.snapshot() for p, s in self.sessions.items()}
+
+    def subscribe(
+        self, callback: SessionUpdateCallback, provider: Optional[str] = None
+    ) -> Callable[[], None]:
+        """Call `callback(provider, data)` on updates of `provider`
+
+        or of every session if `provider` is None. `data` is None when the
+        session is gone. Returns function that cancels the subscription.
+        """
+
+        if provider is None:
+            subscribers = self._subscribers
+        else:
+            subscribers = self._session_subscribers.setdefault(provider, [])
+
+        subscribers.append(callback)
+
+        def unsubscribe() -> None:
+            if callback in subscribers:
+                subscribers.remove(callback)
+
+        return unsubscribe
+
+    def publish(self, provider: str, state: RawMediaInfo) -> None:
+        """Store and deliver state of `provider`"""
+
+        if provider not in self.sessions:
+            logger.info("Session added: %s", provider)
+        self.sessions[provider] = state
+
+        self._notify(provider, state)
+
+    def remove(self, provider: str) -> None:
+        if self.sessions.pop(provider, None) is None:
+            return
+
+        logger.info("Session removed: %s", provider)
+        self._notify(provider, None)
+
+    def _notify(self, provider: str, state: Optional[RawMediaInfo]) -> None:
+        session_subscribers = self._session_subscribers.get(provider, ())
+
+        if not self._subscribers and not session_subscribers:
+            return
+
+        data = None if state is None else state.snapshot()
+
+        for callback in self._subscribers:
+            callback(provider, data)
+        for callback in session_subscribers:
+            callback(provider, data)
@@ -6,8 +6,10 @@ __all__ = ["AbstractMediaSession"]
 
 import abc
 
-from .datastructures import MediaInfo
-from .typing import MediaSessionUpdateCallback
+from .bus import UpdateBus
+from .datastructures import MediaInfo, RawMediaInfo
+from .manager import SessionManager
+from .typing import MediaSessionUpdateCallback, UpdateMode
 
 
 class MediaControlInterface(abc.ABC):
@@ -39,15 +41,25 @@ class MediaControlInterface(abc.ABC):
 
 
 class AbstractMediaSession(MediaControlInterface):
-    """Base controller"""
+    """Base controller
+
+    Follows one session and publishes its updates on `bus`, `sessions`
+    holds state of every active session.
+    """
+
+    bus: UpdateBus
+    sessions: SessionManager
 
     @abc.abstractmethod
     def __init__(
-        self, callback: MediaSessionUpdateCallback, initial_load: bool = True
+        self,
+        callback: MediaSessionUpdateCallback,
+        update_mode: UpdateMode = "full",
     ) -> None: ...
 
     @abc.abstractmethod
-    async def load(self) -> None: ...
+    async def load(self) -> None:
+        """Connect to the platform API. Constructor does no I/O"""
 
     @abc.abstractmethod
     async def update(self) -> None: ...
@@ -55,3 +67,8 @@ class AbstractMediaSession(MediaControlInterface):
     @property
     @abc.abstractmethod
     def data(self) -> MediaInfo: ...
+
+    @property
+    @abc.abstractmethod
+    def data_raw(self) -> RawMediaInfo:
+        """Mutable state of the followed session"""
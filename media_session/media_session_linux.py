@@ -1,16 +1,41 @@
 """
 Media controller using MPRIS
+
+Time variables is stored primarily in microseconds
 """
 
 __all__ = ["MediaSessionLinux"]
 
-from typing import Any, Optional, overload
+import asyncio
+import logging
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Optional, overload
 
 import dbus
+from dbus.bus import BusConnection
+from dbus.mainloop.glib import DBusGMainLoop
+from gi.repository import GLib  # type: ignore
+
+from .dbus_protocol import CALL_TIMEOUT
+from .mpris import (
+    MPRIS_PATH,
+    PLAYER_INTERFACE,
+    PROPERTIES_INTERFACE,
+    MprisPlayer,
+    PlayerSelectionPolicy,
+    most_recently_playing,
+)
+from .mpris_session import MprisMediaSession
+from .typing import MediaSessionUpdateCallback, UpdateMode
+
+if TYPE_CHECKING:
+    from .recording import Recorder
 
-from .datastructures import MediaInfo
-from .media_session import AbstractMediaSession
-from .typing import MediaSessionUpdateCallback
+logger = logging.getLogger(__name__)
+
+DBUS_NAME = "org.freedesktop.DBus"
+DBUS_PATH = "/org/freedesktop/DBus"
+DBUS_INTERFACE = "org.freedesktop.DBus"
 
 
 @overload
@@ -22,96 +47,236 @@ def dbus_to_py(dbus_obj: dbus.Array) -> list: ...
 
 
 def dbus_to_py(dbus_obj: Any) -> object:
-    if isinstance(dbus_obj, dbus.Array):
-        return list(map(dbus_to_py, dbus_obj))
-    elif isinstance(dbus_obj, dbus.Dictionary):
-        return {dbus_to_py(k): dbus_to_py(v) for k, v in dbus_obj.items()}
-    elif isinstance(dbus_obj, dbus.String):
-        return str(dbus_obj)
-    elif isinstance(dbus_obj, (dbus.Int16, dbus.Int32, dbus.Int64)):
-        return int(dbus_obj)
-    elif isinstance(dbus_obj, dbus.ObjectPath):
-        return str(dbus_obj)
-    else:
-        return dbus_obj
-
-
-class MediaSessionLinux(AbstractMediaSession):
-    def __init__(self, callback: Optional[MediaSessionUpdateCallback] = None) -> None:
-        self._update_callback = callback
-        self._bus = dbus.SessionBus()
-
-        names = self._bus.list_names()
-
-        if not names:
-            return
+    """Convert dbus-python value to plain Python types"""
 
-        players = tuple(
-            filter(lambda x: x.startswith("org.mpris.MediaPlayer2."), names)
+    if (convert := _CONVERTERS.get(type(dbus_obj))) is None:
+        return dbus_obj
+    return convert(dbus_obj)
+
+
+# Dispatch on exact type instead of a chain of `isinstance` checks
+_CONVERTERS: dict[type, Callable[[Any], Any]] = {
+    dbus.String: str,
+    dbus.ObjectPath: str,
+    dbus.Signature: str,
+    dbus.Boolean: bool,
+    dbus.Byte: int,
+    dbus.Int16: int,
+    dbus.Int32: int,
+    dbus.Int64: int,
+    dbus.UInt16: int,
+    dbus.UInt32: int,
+    dbus.UInt64: int,
+    dbus.Double: float,
+    dbus.ByteArray: bytes,
+    dbus.Array: lambda obj: [dbus_to_py(v) for v in obj],
+    dbus.Struct: lambda obj: tuple(dbus_to_py(v) for v in obj),
+    dbus.Dictionary: lambda obj: {
+        dbus_to_py(k): dbus_to_py(v) for k, v in obj.items()
+    },
+}
+
+
+class _PlayerProxy:
+    """Cached D-Bus interfaces of a player connection"""
+
+    __slots__ = ("properties", "player")
+
+    def __init__(self, bus: BusConnection, owner: str) -> None:
+        # Interfaces are known, skip the introspection round trip
+        proxy = bus.get_object(owner, MPRIS_PATH, introspect=False)
+        self.properties = dbus.Interface(proxy, PROPERTIES_INTERFACE)
+        self.player = dbus.Interface(proxy, PLAYER_INTERFACE)
+
+
+class MediaSessionLinux(MprisMediaSession):
+    """Media controller using MPRIS over dbus-python
+
+    Tracks every player on the bus and follows the one picked by `policy`.
+    Signals are received by the GLib main loop in a worker thread and
+    handled on the asyncio loop.
+    """
+
+    def __init__(
+        self,
+        callback: Optional[MediaSessionUpdateCallback] = None,
+        bus_address: Optional[str] = None,
+        policy: PlayerSelectionPolicy = most_recently_playing,
+        update_mode: UpdateMode = "full",
+        recorder: Optional["Recorder"] = None,
+    ) -> None:
+        super().__init__(callback, bus_address, policy, update_mode, recorder)
+        self._glib_loop: GLib.MainLoop | None = None
+        self._bus: BusConnection | None = None
+        self._bus_interface: dbus.Interface | None = None
+        self._proxies: dict[str, _PlayerProxy] = {}  # by owner
+
+    def _threadsafe(self, handler: Any) -> Any:
+        """Run signal handler on the asyncio loop instead of the GLib thread"""
+
+        def f(*args: Any, **kwargs: Any) -> None:
+            if self._loop is None:
+                handler(*args, **kwargs)
+            else:
+                self._loop.call_soon_threadsafe(partial(handler, *args, **kwargs))
+
+        return f
+
+    def _proxy(self, owner: str) -> _PlayerProxy:
+        assert self._bus is not None
+        if (proxy := self._proxies.get(owner)) is None:
+            proxy = self._proxies[owner] = _PlayerProxy(self._bus, owner)
+        return proxy
+
+    def _to_py(self, value: Any) -> Any:
+        return dbus_to_py(value)
+
+    async def _await(self, method: Callable[..., Any], *args: Any) -> Any:
+        """Call D-Bus `method` asynchronously and wait for its reply
+
+        The reply is handled by the GLib main loop. If it is not running
+        (e.g. controls used without `loop`), the call blocks a worker thread
+        instead. Raises `DBusException` if there is no reply in
+        `CALL_TIMEOUT` seconds.
+        """
+
+        if self._glib_loop is None or not self._glib_loop.is_running():
+            return await asyncio.to_thread(method, *args, timeout=CALL_TIMEOUT)
+
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[Any] = loop.create_future()
+
+        def resolve(result: Any, e: Exception | None) -> None:
+            if future.done():
+                return
+            if e is None:
+                future.set_result(result)
+            else:
+                future.set_exception(e)
+
+        def reply_handler(*result: Any) -> None:
+            loop.call_soon_threadsafe(resolve, result[0] if result else None, None)
+
+        def error_handler(e: Exception) -> None:
+            loop.call_soon_threadsafe(resolve, None, e)
+
+        method(
+            *args,
+            reply_handler=reply_handler,
+            error_handler=error_handler,
+            timeout=CALL_TIMEOUT,
+        )
+        try:
+            # Also if the GLib loop stops before the reply is dispatched
+            return await asyncio.wait_for(future, CALL_TIMEOUT + 1)
+        except asyncio.TimeoutError:
+            raise dbus.exceptions.DBusException(
+                "No reply", name="org.freedesktop.DBus.Error.NoReply"
+            ) from None
+
+    async def _get_name_owner(self, name: str) -> Optional[str]:
+        assert self._bus_interface is not None
+        try:
+            return str(await self._await(self._bus_interface.GetNameOwner, name))
+        except dbus.exceptions.DBusException:
+            return None
+
+    async def _get_all(self, player: MprisPlayer) -> Optional[dbus.Dictionary]:
+        try:
+            properties = await self._await(
+                self._proxy(player.owner).properties.GetAll, PLAYER_INTERFACE
+            )
+        except dbus.exceptions.DBusException as e:
+            logger.warning("Cannot get properties of %s: %s", player.name, e)
+            return None
+        return properties
+
+    def _on_name_owner_changed(self, name: str, old_owner: str, new_owner: str) -> None:
+        self._proxies.pop(str(old_owner), None)
+        self._name_owner_changed(str(name), str(old_owner), str(new_owner))
+
+    def _on_properties_changed(
+        self,
+        interface: str,
+        changed: dbus.Dictionary,
+        invalidated: dbus.Array,
+        sender: str = "",
+    ) -> None:
+        self._properties_changed(
+            str(sender), str(interface), changed, list(map(str, invalidated))
         )
 
-        if len(players) == 0:
-            print("No players found")
-            return
-
-        if len(players) == 1:
-            index = 0
-        else:
-            print("Found multiple players\n================")
-            print(*players, sep="\n")
-            index = int(input("Index: "))
+    def _on_seeked(self, position: dbus.Int64, sender: str = "") -> None:
+        self._seeked(str(sender), int(position))
 
-        selected = players[index]
+    async def load(self) -> None:
+        """Connect to the bus and fetch state of every player
 
-        print(selected)
+        Requests to all players are in flight at once, so it takes about
+        the same time for any number of players.
+        """
 
-        proxy = self._bus.get_object(str(selected), "/org/mpris/MediaPlayer2")
+        self._loop = asyncio.get_running_loop()
+        DBusGMainLoop(set_as_default=True)
+        self._glib_loop = GLib.MainLoop()
+        self._bus = bus = (
+            dbus.SessionBus()
+            if self._bus_address is None
+            else BusConnection(self._bus_address)
+        )
 
-        properties_manager = dbus.Interface(proxy, "org.freedesktop.DBus.Properties")
-        metadata: dbus.Dictionary = properties_manager.Get(
-            "org.mpris.MediaPlayer2.Player", "Metadata"
+        # Subscribe before listing names so no player is missed in between
+        bus.add_signal_receiver(
+            self._threadsafe(self._on_name_owner_changed),
+            signal_name="NameOwnerChanged",
+            dbus_interface=DBUS_INTERFACE,
+            bus_name=DBUS_NAME,
+            path=DBUS_PATH,
         )
-        self._data_raw: dict[str, Any] = dbus_to_py(metadata)
-
-    async def load(self) -> None: ...
-
-    @property
-    def data(self) -> MediaInfo:
-        return MediaInfo(
-            title=self._data_raw.get("xesam:title"),
-            artist=self._data_raw["xesam:artist"],
-            album_title=self._data_raw["xesam:album"],
-            album_artist=self._data_raw["xesam:albumArtist"],
-            track_number=self._data_raw["xesam:trackNumber"],
-            album_track_count=self._data_raw["xesam:discNumber"],
-            genres=self._data_raw["xesam:genre"],
-            cover=self._data_raw["mpris:artUrl"],
-            cover_data="",
+        bus.add_signal_receiver(
+            self._threadsafe(self._on_properties_changed),
+            signal_name="PropertiesChanged",
+            dbus_interface=PROPERTIES_INTERFACE,
+            path=MPRIS_PATH,
+            sender_keyword="sender",
+        )
+        bus.add_signal_receiver(
+            self._threadsafe(self._on_seeked),
+            signal_name="Seeked",
+            dbus_interface=PLAYER_INTERFACE,
+            path=MPRIS_PATH,
+            sender_keyword="sender",
         )
 
-    async def update(self) -> None:
-        pass
-
-    async def loop(self) -> None:
-        self._update_callback(self.data)
+        names = [str(n) for n in bus.list_names()]
+        self._bus_interface = dbus.Interface(
+            bus.get_object(DBUS_NAME, DBUS_PATH, introspect=False), DBUS_INTERFACE
+        )
 
-    async def play(self) -> None:
-        pass
+        # Replies are dispatched by the GLib main loop
+        glib = asyncio.create_task(asyncio.to_thread(self._glib_loop.run))
+        try:
+            await self._load_players(names)
+        finally:
+            GLib.idle_add(self._glib_loop.quit)  # also if it has not started yet
+            await glib
 
-    async def pause(self) -> None:
-        pass
+    async def _receive(self) -> None:
+        """Run GLib main loop in a worker thread to receive D-Bus signals"""
 
-    async def play_pause(self) -> None:
-        pass
+        assert self._glib_loop is not None
+        try:
+            await asyncio.to_thread(self._glib_loop.run)
+        finally:
+            self._glib_loop.quit()
 
-    async def next(self) -> None:
-        pass
+    async def _call(self, method: str, *args: Any) -> None:
+        """Call method of the active player without blocking the event loop"""
 
-    async def prev(self) -> None:
-        pass
+        if (player := self._registry.active) is None or self._bus is None:
+            return
 
-    async def stop(self) -> None:
-        pass
+        await self._await(getattr(self._proxy(player.owner).player, method), *args)
 
-    async def seek_percentage(self, percentage: float) -> None:
-        pass
+    async def _set_position(self, track_id: str, position: int) -> None:
+        await self._call("SetPosition", dbus.ObjectPath(track_id), dbus.Int64(position))
@@ -0,0 +1,156 @@
+"""
+Media controller using MPRIS over a pure asyncio D-Bus connection
+
+Same behavior as `MediaSessionLinux`, without dbus-python and GLib: every
+call and signal goes through `dbus_protocol.DBusConnection` on the event
+loop, so nothing blocks other coroutines.
+
+Time variables is stored primarily in microseconds
+"""
+
+__all__ = ["MediaSessionLinuxAsync"]
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Any, Optional
+
+from .dbus_protocol import (
+    BUS_INTERFACE,
+    BUS_NAME,
+    BUS_PATH,
+    DBusConnection,
+    DBusError,
+    Message,
+)
+from .mpris import (
+    MPRIS_PATH,
+    MPRIS_PREFIX,
+    PLAYER_INTERFACE,
+    PROPERTIES_INTERFACE,
+    MprisPlayer,
+    PlayerSelectionPolicy,
+    most_recently_playing,
+)
+from .mpris_session import MprisMediaSession
+from .typing import MediaSessionUpdateCallback, UpdateMode
+
+if TYPE_CHECKING:
+    from .recording import Recorder
+
+logger = logging.getLogger(__name__)
+
+
+class MediaSessionLinuxAsync(MprisMediaSession):
+    """Media controller using MPRIS, asyncio only
+
+    Tracks every player on the bus and follows the one picked by `policy`.
+    State of every player is fetched with one `GetAll` (concurrently for
+    all players) and then kept up to date by signals. Signals of players
+    are recorded to `recorder` if it is set.
+    """
+
+    def __init__(
+        self,
+        callback: Optional[MediaSessionUpdateCallback] = None,
+        bus_address: Optional[str] = None,
+        policy: PlayerSelectionPolicy = most_recently_playing,
+        update_mode: UpdateMode = "full",
+        recorder: Optional["Recorder"] = None,
+    ) -> None:
+        super().__init__(callback, bus_address, policy, update_mode, recorder)
+        self._connection: DBusConnection | None = None
+
+    def _signal(self, message: Message) -> None:
+        if message.interface == PROPERTIES_INTERFACE:
+            if message.member == "PropertiesChanged" and message.path == MPRIS_PATH:
+                self._properties_changed(message.sender, *message.body)
+        elif message.interface == PLAYER_INTERFACE:
+            if message.member == "Seeked" and message.path == MPRIS_PATH:
+                self._seeked(message.sender, *message.body)
+        elif message.interface == BUS_INTERFACE:
+            if message.member == "NameOwnerChanged":
+                self._name_owner_changed(*message.body)
+
+    async def _call_bus(self, member: str, signature: str = "", *args: Any) -> Any:
+        assert self._connection is not None
+        body = await self._connection.call(
+            BUS_NAME, BUS_PATH, BUS_INTERFACE, member, signature, args
+        )
+        return body[0] if body else None
+
+    async def _get_name_owner(self, name: str) -> Optional[str]:
+        try:
+            return await self._call_bus("GetNameOwner", "s", name)
+        except DBusError:
+            return None
+
+    async def _get_all(self, player: MprisPlayer) -> Optional[dict[str, Any]]:
+        assert self._connection is not None
+        try:
+            (properties,) = await self._connection.call(
+                player.owner,
+                MPRIS_PATH,
+                PROPERTIES_INTERFACE,
+                "GetAll",
+                "s",
+                [PLAYER_INTERFACE],
+            )
+        except DBusError as e:
+            logger.warning("Cannot get properties of %s: %s", player.name, e)
+            return None
+        return properties
+
+    async def load(self) -> None:
+        """Connect to the bus and fetch state of every player"""
+
+        self._loop = asyncio.get_running_loop()
+        self._connection = connection = await DBusConnection.connect(
+            self._bus_address
+        )
+        connection.add_signal_handler(self._signal)
+
+        # Subscribe before listing names so no player is missed in between
+        await asyncio.gather(
+            connection.add_match(
+                type="signal",
+                sender=BUS_NAME,
+                interface=BUS_INTERFACE,
+                member="NameOwnerChanged",
+                arg0namespace=MPRIS_PREFIX.rstrip("."),
+            ),
+            connection.add_match(
+                type="signal",
+                interface=PROPERTIES_INTERFACE,
+                member="PropertiesChanged",
+                path=MPRIS_PATH,
+                arg0=PLAYER_INTERFACE,
+            ),
+            connection.add_match(
+                type="signal",
+                interface=PLAYER_INTERFACE,
+                member="Seeked",
+                path=MPRIS_PATH,
+            ),
+        )
+
+        await self._load_players(await self._call_bus("ListNames"))
+
+    async def _receive(self) -> None:
+        assert self._connection is not None
+        try:
+            await self._connection.closed
+        finally:
+            self._connection.close()
+
+    async def _call(self, method: str, signature: str = "", *args: Any) -> None:
+        """Call method of the active player"""
+
+        if (player := self._registry.active) is None or self._connection is None:
+            return
+
+        await self._connection.call(
+            player.owner, MPRIS_PATH, PLAYER_INTERFACE, method, signature, args
+        )
+
+    async def _set_position(self, track_id: str, position: int) -> None:
+        await self._call("SetPosition", "ox", track_id, position)
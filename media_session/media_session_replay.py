@@ -0,0 +1,220 @@
+"""
+Media session replaying a recording
+
+Feeds recorded backend events (see `recording`) through the same state,
+player selection and publishing code as the platform backends, without
+the OS media stack. Useful for reproducing event storms and for
+benchmarks on any machine.
+"""
+
+__all__ = ["MediaSessionReplay"]
+
+import asyncio
+import logging
+from time import monotonic
+from typing import AbstractSet, Any, Optional
+
+from . import constants
+from .bus import ALL, POSITION, SECTION_FIELDS, UpdateBus
+from .datastructures import MediaInfo, RawMediaInfo
+from .manager import SessionManager
+from .media_session import AbstractMediaSession
+from .mpris import (
+    MprisPlayer,
+    PlayerRegistry,
+    PlayerSelectionPolicy,
+    decode_properties,
+    most_recently_playing,
+)
+from .recording import RecordedEvent, read_recording
+from .typing import MediaSessionUpdateCallback, UpdateMode
+
+logger = logging.getLogger(__name__)
+
+
+class MediaSessionReplay(AbstractMediaSession):
+    """Replay recorded events at recorded `speed`
+
+    `speed=0` replays as fast as possible. `loop` returns after the last
+    event. Controls are accepted and ignored.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        callback: Optional[MediaSessionUpdateCallback] = None,
+        update_mode: UpdateMode = "full",
+        speed: float = 1.0,
+        policy: PlayerSelectionPolicy = most_recently_playing,
+    ) -> None:
+        if speed < 0:
+            raise ValueError(f"Speed must not be negative, got {speed}")
+
+        self.bus = UpdateBus()
+        if callback is not None:
+            self.bus.subscribe(callback, mode=update_mode)
+        self.path = path
+        self.speed = speed
+        self.events: Optional[list[RecordedEvent]] = None
+        self.replayed = 0  # events replayed so far
+
+        self.sessions = SessionManager()
+        self._registry = PlayerRegistry(policy, self._active_changed)
+        self._states: dict[str, RawMediaInfo] = {}  # WinRT sessions
+        self._current: Optional[RawMediaInfo] = None
+
+        self._empty_state = RawMediaInfo()
+        self._empty_state.media_properties.thumbnail_ref = constants.COVER_PLACEHOLDER
+
+    @property
+    def _state(self) -> RawMediaInfo:
+        return self._empty_state if self._current is None else self._current
+
+    @property
+    def data(self) -> MediaInfo:
+        return self._state.snapshot()
+
+    @property
+    def data_raw(self) -> RawMediaInfo:
+        """Get media session state"""
+        return self._state
+
+    def _send_data(self, changed: AbstractSet[str] = ALL) -> None:
+        self.bus.publish(self._state, changed)
+
+    async def load(self) -> None:
+        """Read the recording"""
+
+        self.events = await asyncio.to_thread(lambda: list(read_recording(self.path)))
+        logger.info("Loaded %s events from %s", len(self.events), self.path)
+
+    async def update(self) -> None:
+        self._send_data()
+
+    async def loop(self) -> None:
+        """Replay all events, then return"""
+
+        self.bus.attach(asyncio.get_running_loop())
+
+        if self.events is None:
+            await self.load()
+        assert self.events is not None
+
+        # Backends pick a player once the initial state is loaded, replay
+        # does it before the first pause between events
+        selected = False
+        start = monotonic()
+        for t, kind, args in self.events:
+            if self.speed:
+                if (delay := t / self.speed - (monotonic() - start)) > 0:
+                    if not selected:
+                        self._registry.reselect()
+                        selected = True
+                    await asyncio.sleep(delay)
+            else:
+                await asyncio.sleep(0)  # let async subscribers run
+
+            self.replay(kind, args)
+
+        if not selected:
+            self._registry.reselect()
+
+    def replay(self, kind: str, args: list[Any]) -> None:
+        """Apply a single recorded event"""
+
+        if (handler := self._HANDLERS.get(kind)) is None:
+            return
+        handler(self, *args)
+        self.replayed += 1
+
+    #
+    # MPRIS
+    #
+
+    def _active_changed(self, player: Optional[MprisPlayer]) -> None:
+        self._current = None if player is None else player.state
+        self._send_data()
+
+    def _name_owner_changed(self, name: str, old_owner: str, new_owner: str) -> None:
+        self._registry.name_owner_changed(name, old_owner, new_owner)
+        if old_owner:
+            self.sessions.remove(name)
+
+    def _properties_changed(
+        self, owner: str, changed: dict[str, Any], invalidated: list[str]
+    ) -> None:
+        # Recorded as received, decoded like the backends do
+        changed = decode_properties(changed)
+        player = self._registry.properties_changed(owner, changed, invalidated)
+
+        if player is None:
+            return
+
+        if "Metadata" in changed and (art_url := player.pending_cover()):
+            if cover := constants.COVER_CACHE.put_file(art_url):
+                player.set_cover(art_url, cover)
+
+        self.sessions.publish(player.name, player.state)
+        if player is self._registry.active:
+            self._send_data()
+
+    def _seeked(self, owner: str, position: int) -> None:
+        if (player := self._registry.seeked(owner, position)) is None:
+            return
+
+        self.sessions.publish(player.name, player.state)
+        if player is self._registry.active:
+            self._send_data(POSITION)
+
+    #
+    # WinRT
+    #
+
+    def _winrt_state(self, provider: str) -> RawMediaInfo:
+        if (state := self._states.get(provider)) is None:
+            state = self._states[provider] = RawMediaInfo(provider=provider)
+            state.media_properties.thumbnail_ref = constants.COVER_PLACEHOLDER
+        return state
+
+    def _section(self, provider: str, section: str, values: dict[str, Any]) -> None:
+        state = self._winrt_state(provider)
+
+        if "genres" in values:
+            values["genres"] = tuple(values["genres"])
+
+        if not state.update(section, values):
+            return
+
+        self.sessions.publish(provider, state)
+        if state is self._current:
+            self._send_data(SECTION_FIELDS[section])
+
+    def _current_changed(self, provider: Optional[str]) -> None:
+        self._current = None if provider is None else self._winrt_state(provider)
+        self._send_data()
+
+    def _removed(self, provider: str) -> None:
+        if self._states.pop(provider, None) is self._current:
+            self._current = None
+        self.sessions.remove(provider)
+
+    _HANDLERS = {
+        "name_owner_changed": _name_owner_changed,
+        "properties_changed": _properties_changed,
+        "seeked": _seeked,
+        "section": _section,
+        "current": _current_changed,
+        "removed": _removed,
+    }
+
+    #
+    # Controls
+    #
+
+    async def play(self) -> None:
+        logger.debug("Ignoring control of replayed session")
+
+    pause = play_pause = next = prev = stop = play
+
+    async def seek_percentage(self, percentage: float) -> None:
+        logger.debug("Ignoring control of replayed session")
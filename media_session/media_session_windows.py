@@ -8,11 +8,9 @@ __all__ = ["MediaSessionWindows", "MediaRepeatMode"]
 
 import asyncio
 import logging
-from base64 import b64encode
 from datetime import timedelta
 from pprint import pformat
-from time import time
-from typing import Any, Optional, final
+from typing import TYPE_CHECKING, AbstractSet, Any, Callable, Optional, final
 
 # isort: off
 
@@ -34,211 +32,115 @@ from winrt.windows.storage.streams import (
 
 # isort: on
 
-from .constants import (
-    COVER_FILE,
-    COVER_PLACEHOLDER_B64,
-    COVER_PLACEHOLDER_RAW,
-    MEDIA_DATA_TEMPLATE,
-)
-from .datastructures import MediaInfo
+from . import constants
+from .bus import ALL, SECTION_FIELDS, UpdateBus
+from .cover_cache import CHUNK_SIZE, CoverEntry
+from .datastructures import MediaInfo, RawMediaInfo
+from .manager import SessionManager
 from .media_session import AbstractMediaSession
-from .typing import MediaSessionUpdateCallback
-from .utils import async_callback, write_file
+from .typing import MediaSessionUpdateCallback, UpdateMode
+from .utils import RefreshCallback
+
+if TYPE_CHECKING:
+    from .recording import Recorder
 
 logger = logging.getLogger(__name__)
 
 
-class MediaSessionWindows(AbstractMediaSession):
-    """Media controller using Windows.Media.Control"""
+class _SessionTracker:
+    """Follows events of a single WinRT session and keeps its state"""
 
     def __init__(
         self,
-        callback: Optional[MediaSessionUpdateCallback] = None,
-        initial_load: bool = True,
+        session: _MediaSession,
+        on_change: Callable[["_SessionTracker", str], Any],
+        recorder: Optional["Recorder"] = None,
     ) -> None:
-        self._update_callback: Optional[MediaSessionUpdateCallback] = callback
-        self._manager: _MediaManager | None = None
-        self._session: _MediaSession | None = None
-
-        self._data = MEDIA_DATA_TEMPLATE.copy()
-        self._data["media_properties"]["thumbnail_data"] = COVER_PLACEHOLDER_B64
-
-        if initial_load:
-            asyncio.run(self.load())
-
-    def _update_data(self, key: Any, value: Any) -> None:
-        self._data[key] = value
-        self._send_data()
-
-    @property
-    def data_v1(self) -> dict[str, Any]:
-        """Get media session data"""
-        return {
-            "provider": self._data["provider"],
-            "metadata": {
-                "title": self._data["media_properties"]["title"],
-                "album": self._data["media_properties"]["album_title"],
-                "album_artist": self._data["media_properties"]["album_artist"],
-                "artist": self._data["media_properties"]["artist"],
-                "cover": self._data["media_properties"]["thumbnail"],
-                "cover_data": self._data["media_properties"]["thumbnail_data"],
-                "duration": self._data["timeline_properties"]["end_time"],
-            },
-            "status": self._data["playback_info"]["playback_status"],
-            "shuffle": self._data["playback_info"]["is_shuffle_active"],
-            "position": self._data["timeline_properties"]["position_soft"],
-            "loop": self._data["playback_info"].get("auto_repeat_mode"),
-        }
-
-    @property
-    def data(self) -> MediaInfo:
-        return MediaInfo(
-            title=self._data["media_properties"]["title"],
-            artist=self._data["media_properties"]["artist"],
-            album_title=self._data["media_properties"]["album_title"],
-            album_artist=self._data["media_properties"]["album_artist"],
-            track_number=self._data["media_properties"]["track_number"],
-            album_track_count=self._data["media_properties"]["album_track_count"],
-            genres=self._data["media_properties"]["genres"],
-            cover=self._data["media_properties"]["thumbnail"],
-            cover_data=self._data["media_properties"]["thumbnail_data"],
-            position=self._data["timeline_properties"]["position_soft"],
-            duration=self._data["timeline_properties"]["end_time"],
-            state=self._data["playback_info"]["playback_status"],
-        )
-
-    @property
-    def data_raw(self) -> dict[str, Any]:
-        """Get media session data"""
-        return self._data
-
-    def _send_data(self) -> None:
-        if self._update_callback is None:
-            return
-
-        self._update_callback(self.data)
+        self.session = session
+        self.provider: str = session.source_app_user_model_id
+        self.state = RawMediaInfo(provider=self.provider)
+        self.state.media_properties.thumbnail_ref = constants.COVER_PLACEHOLDER
+        self._on_change = on_change  # (tracker, changed section)
+        self._tokens: list[Any] = []
+        self._recorder = recorder
 
     async def load(self) -> None:
-        """Load"""
-
-        self._manager = await _MediaManager.request_async()
-        self._manager.add_current_session_changed(async_callback(self._session_events))
-        self._manager.add_sessions_changed(async_callback(self._sessions_changed))
-
-        await self._session_events(self._manager)
-
-        self._send_data()
-
-    async def update(self) -> None:
-        """Update"""
-
-        self._update_time()
-
-    async def loop(self) -> None:
-        """Main loop"""
-
-        if self._manager is None:
-            await self.load()
-
-        while True:
-            await self.update()
-            await asyncio.sleep(0.1)
-
-    def _update_time(self) -> None:
-        if not self._session:
-            return
-        if self._data["playback_info"]["playback_status"] != "playing":
-            return
-        now = time()
-
-        position: int = self._data["timeline_properties"]["position"]
-        last_update: float = self._data["timeline_properties"]["last_updated_time"]
-        rate: float = self._data["playback_info"]["playback_rate"]
-
-        if last_update < 0:
-            return
-
-        delta_time = now - last_update
-        delta_time_mcs = delta_time * 1_000_000
-        delta_position = int(rate * delta_time_mcs)
-
-        position_now = position + delta_position
-
-        self._data["timeline_properties"]["position_soft"] = min(
-            position_now, self._data["timeline_properties"]["end_time"]
-        )
-
-        self._send_data()
-
-    async def _session_events(self, *_: Any) -> None:
-        logger.info("Session changed")
-
-        if self._manager is None:
-            return
-
-        self._session = self._manager.get_current_session()
-
-        if self._session is None:
-            return
-
-        self._update_data("provider", self._session.source_app_user_model_id)
+        """Load current state and subscribe to changes"""
 
         await self._playback_info_changed()
         await self._timeline_properties_changed()
         await self._media_properties_changed()
 
-        self._session.add_media_properties_changed(
-            async_callback(self._media_properties_changed)
-        )
-        self._session.add_playback_info_changed(
-            async_callback(self._playback_info_changed)
-        )
-        self._session.add_timeline_properties_changed(
-            async_callback(self._timeline_properties_changed)
-        )
+        self._tokens = [
+            self.session.add_media_properties_changed(
+                RefreshCallback(self._media_properties_changed)
+            ),
+            self.session.add_playback_info_changed(
+                RefreshCallback(self._playback_info_changed)
+            ),
+            self.session.add_timeline_properties_changed(
+                RefreshCallback(self._timeline_properties_changed)
+            ),
+        ]
 
-    async def _sessions_changed(self, *_: Any) -> None:
-        logger.info("Sessions changed")
+    def close(self) -> None:
+        """Unsubscribe from session events"""
 
-        if self._manager is None:
+        if not self._tokens:
             return
 
-        if (sessions := self._manager.get_sessions()) is None:
-            return
+        media_token, playback_token, timeline_token = self._tokens
+        self.session.remove_media_properties_changed(media_token)
+        self.session.remove_playback_info_changed(playback_token)
+        self.session.remove_timeline_properties_changed(timeline_token)
+        self._tokens = []
 
-        sessions = list(sessions)
-
-        logger.debug("Active sessions count: %s", len(sessions))
+    def _update_data(self, section: str, values: dict[str, Any]) -> None:
+        if self._recorder is not None:
+            self._recorder.record("section", self.provider, section, values)
+        if self.state.update(section, values):
+            self._on_change(self, section)
 
     async def _try_load_thumbnail(
-        self, stream_ref: _StreamReference | None
-    ) -> bytes | None:
+        self, stream_ref: _StreamReference | None, source: Any = None
+    ) -> CoverEntry | None:
+        """Read thumbnail in chunks into the cover cache
+
+        `source` identifies the thumbnail, see `CoverReader`.
+        """
+
         if stream_ref is None:
             logger.debug("Stream reference is None")
-            return
+            return None
 
         readable_stream: _Stream = await stream_ref.open_read_async()
-        thumb_buffer: _IBuffer = _Buffer(readable_stream.size)  # type: ignore
+        reader = constants.COVER_CACHE.reader(readable_stream.size, source)
+        chunk: _IBuffer = _Buffer(CHUNK_SIZE)  # type: ignore
 
         try:
-            await readable_stream.read_async(
-                thumb_buffer, thumb_buffer.capacity, _InputStreamOptions.READ_AHEAD
-            )
-
-            return bytes(thumb_buffer)
+            while not reader.done:
+                result: _IBuffer = await readable_stream.read_async(
+                    chunk, CHUNK_SIZE, _InputStreamOptions.READ_AHEAD
+                )
+                if not result.length:
+                    break
+                with memoryview(result) as view:  # type: ignore
+                    reader.write(view[: result.length])
 
         except OSError as e:
             logger.error("Failed to get thumbnail!\n%s", e)
+            return None
+        finally:
+            readable_stream.close()
 
-    async def _media_properties_changed(self, *_: Any) -> None:
-        logger.info("Media properties changed")
+        return reader.finish()
 
-        if self._session is None:
-            return
+    async def _media_properties_changed(self) -> None:
+        logger.info("Media properties changed")
 
         try:
             info: _MediaProperties = (
-                await self._session.try_get_media_properties_async()
+                await self.session.try_get_media_properties_async()
             )
         except PermissionError:
             return
@@ -262,43 +164,34 @@ class MediaSessionWindows(AbstractMediaSession):
             except AttributeError:
                 logger.warning("Cannot get attribute '%s'", field)
 
-        info_dict["genres"] = list(info.genres or [])
+        info_dict["genres"] = tuple(info.genres or ())
 
         thumb_stream_ref: _StreamReference | None = info.thumbnail
 
-        thumb_img: bytes
-
-        thumb = await self._try_load_thumbnail(thumb_stream_ref)
+        # Same app and track: the same thumbnail if size and start match
+        source = (
+            self.provider,
+            info_dict.get("title"),
+            info_dict.get("artist"),
+            info_dict.get("album_title"),
+        )
+        cover = await self._try_load_thumbnail(thumb_stream_ref, source)
 
-        if thumb:  # (thumb != None) & (thumb != b"")
-            thumb_img = thumb
-        else:
-            if thumb is None:
-                logger.warning("Thumbnail is None")
-            elif thumb == b"":
-                logger.warning("Thumbnail is empty")
-            thumb_img = COVER_PLACEHOLDER_RAW
+        if cover is None:
+            cover = constants.COVER_PLACEHOLDER
             logger.warning("No correct thumbnail info, using placeholder")
 
-        write_file(COVER_FILE, thumb_img)
-
-        thumbnail_data: str = b64encode(thumb_img).decode("utf-8")
+        info_dict["thumbnail_ref"] = cover
 
-        info_dict["thumbnail_data"] = thumbnail_data
-
-        info_dict["thumbnail"] = COVER_FILE
-        info_dict["thumbnail_url"] = "file:///" + COVER_FILE
+        info_dict["thumbnail"] = cover.ensure_file()
 
         logger.debug(pformat(info_dict))
         self._update_data("media_properties", info_dict)
 
-    async def _playback_info_changed(self, *_: Any) -> None:
+    async def _playback_info_changed(self) -> None:
         logger.info("Playback info changed")
 
-        if self._session is None:
-            return
-
-        info: _PlaybackInfo | None = self._session.get_playback_info()
+        info: _PlaybackInfo | None = self.session.get_playback_info()
 
         if info is None:
             return
@@ -337,13 +230,10 @@ class MediaSessionWindows(AbstractMediaSession):
         logger.debug(pformat(info_dict))
         self._update_data("playback_info", info_dict)
 
-    async def _timeline_properties_changed(self, *_: Any) -> None:
+    async def _timeline_properties_changed(self) -> None:
         logger.info("Timeline properties changed")
 
-        if not self._session:
-            return
-
-        info: _TimelineProperties | None = self._session.get_timeline_properties()
+        info: _TimelineProperties | None = self.session.get_timeline_properties()
 
         if info is None:
             return
@@ -376,10 +266,187 @@ class MediaSessionWindows(AbstractMediaSession):
             info_dict[f] = int(k.microseconds + k.seconds * 1e6)
 
         info_dict["last_updated_time"] = info.last_updated_time.timestamp()
-        info_dict["position_soft"] = info_dict["position"]
         logger.debug(pformat(info_dict))
         self._update_data("timeline_properties", info_dict)
 
+
+class MediaSessionWindows(AbstractMediaSession):
+    """Media controller using Windows.Media.Control
+
+    Follows the current session. State of every session is available via
+    `sessions` manager. Session events are recorded to `recorder` if it is
+    set.
+    """
+
+    def __init__(
+        self,
+        callback: Optional[MediaSessionUpdateCallback] = None,
+        update_mode: UpdateMode = "full",
+        recorder: Optional["Recorder"] = None,
+    ) -> None:
+        self.bus = UpdateBus()
+        if callback is not None:
+            self.bus.subscribe(callback, mode=update_mode)
+        self._manager: _MediaManager | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+        self.sessions = SessionManager()
+        self._trackers: dict[str, _SessionTracker] = {}
+        self._current: _SessionTracker | None = None
+        self._pending: set[str] = set()  # fields changed since last publish
+        self._recorder = recorder
+
+        self._empty_state = RawMediaInfo()
+        self._empty_state.media_properties.thumbnail_ref = constants.COVER_PLACEHOLDER
+
+    @property
+    def _session(self) -> _MediaSession | None:
+        return None if self._current is None else self._current.session
+
+    @property
+    def _state(self) -> RawMediaInfo:
+        return self._empty_state if self._current is None else self._current.state
+
+    @property
+    def data_v1(self) -> dict[str, Any]:
+        """Get media session data"""
+        media = self._state.media_properties
+        playback = self._state.playback_info
+        return {
+            "provider": self._state.provider,
+            "metadata": {
+                "title": media.title,
+                "album": media.album_title,
+                "album_artist": media.album_artist,
+                "artist": media.artist,
+                "cover": media.thumbnail,
+                "cover_data": media.thumbnail_ref and media.thumbnail_ref.b64,
+                "duration": self._state.timeline_properties.end_time,
+            },
+            "status": playback.playback_status,
+            "shuffle": playback.is_shuffle_active,
+            "position": self.position,
+            "loop": playback.auto_repeat_mode,
+        }
+
+    @property
+    def data(self) -> MediaInfo:
+        return self._state.snapshot()
+
+    @property
+    def data_raw(self) -> RawMediaInfo:
+        """Get media session state"""
+        return self._state
+
+    def _send_data(self, changed: AbstractSet[str] = ALL) -> None:
+        self.bus.publish(self._state, changed)
+
+    async def load(self) -> None:
+        """Connect to the session manager and load all sessions"""
+
+        self._manager = await _MediaManager.request_async()
+        self._manager.add_current_session_changed(
+            RefreshCallback(self._session_events)
+        )
+        self._manager.add_sessions_changed(RefreshCallback(self._sessions_changed))
+
+        await self._sessions_changed()
+        await self._session_events()
+
+        self._send_data()
+
+    async def update(self) -> None:
+        """Update"""
+
+        self._send_data()
+
+    async def loop(self) -> None:
+        """Main loop, updates are delivered by WinRT events"""
+
+        self._loop = asyncio.get_running_loop()
+        self.bus.attach(self._loop)
+
+        if self._manager is None:
+            await self.load()
+
+        await asyncio.Event().wait()
+
+    @property
+    def position(self) -> int:
+        """Playback position in microseconds, extrapolated to current time"""
+
+        if not self._session:
+            return self._state.timeline_properties.position
+        return self._state.position()
+
+    def _session_changed(self, tracker: _SessionTracker, section: str) -> None:
+        self.sessions.publish(tracker.provider, tracker.state)
+
+        if tracker is not self._current:
+            return
+
+        if self._loop is None:
+            self._send_data(SECTION_FIELDS[section])
+            return
+
+        # A track change fires several handlers back to back, publish once
+        if not self._pending:
+            self._loop.call_soon(self._flush)
+        self._pending |= SECTION_FIELDS[section]
+
+    def _flush(self) -> None:
+        changed, self._pending = self._pending, set()
+        self._send_data(changed)
+
+    async def _session_events(self) -> None:
+        logger.info("Session changed")
+
+        if self._manager is None:
+            return
+
+        session = self._manager.get_current_session()
+
+        if session is None:
+            self._current = None
+        elif (tracker := self._trackers.get(session.source_app_user_model_id)) is None:
+            self._current = await self._track(session)
+        else:
+            self._current = tracker
+
+        if self._recorder is not None:
+            self._recorder.record("current", self._state.provider or None)
+
+        self._send_data()
+
+    async def _sessions_changed(self) -> None:
+        logger.info("Sessions changed")
+
+        if self._manager is None:
+            return
+
+        if (sessions := self._manager.get_sessions()) is None:
+            return
+
+        sessions = {s.source_app_user_model_id: s for s in sessions}
+
+        logger.debug("Active sessions count: %s", len(sessions))
+
+        for provider in self._trackers.keys() - sessions.keys():
+            self._trackers.pop(provider).close()
+            self.sessions.remove(provider)
+            if self._recorder is not None:
+                self._recorder.record("removed", provider)
+
+        for provider in sessions.keys() - self._trackers.keys():
+            await self._track(sessions[provider])
+
+    async def _track(self, session: _MediaSession) -> _SessionTracker:
+        tracker = _SessionTracker(session, self._session_changed, self._recorder)
+        self._trackers[tracker.provider] = tracker
+        await tracker.load()
+        self.sessions.publish(tracker.provider, tracker.state)
+        return tracker
+
     #
     # PUBLIC METHODS
     #
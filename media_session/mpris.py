@@ -0,0 +1,373 @@
+"""
+MPRIS player tracking
+
+Keeps state of every `org.mpris.MediaPlayer2.*` player on the bus and picks
+the active one. Transport independent: it is fed with already converted
+signal payloads, so it does not depend on D-Bus bindings.
+"""
+
+__all__ = [
+    "MprisPlayer",
+    "PlayerRegistry",
+    "PlayerSelectionPolicy",
+    "Allowlist",
+    "Priority",
+    "most_recently_playing",
+    "decode_metadata",
+    "decode_properties",
+]
+
+import logging
+from time import time
+from typing import Any, Callable, Iterable, Mapping, Optional, Sequence, TypeAlias
+
+from . import constants
+from .cover_cache import CoverEntry
+from .datastructures import MediaInfo, PlaybackInfo, RawMediaInfo
+
+logger = logging.getLogger(__name__)
+
+MPRIS_PATH = "/org/mpris/MediaPlayer2"
+MPRIS_PREFIX = "org.mpris.MediaPlayer2."
+PLAYER_INTERFACE = "org.mpris.MediaPlayer2.Player"
+PROPERTIES_INTERFACE = "org.freedesktop.DBus.Properties"
+
+
+class MprisPlayer:
+    """Cached state of a single MPRIS player"""
+
+    __slots__ = ("name", "owner", "metadata", "state", "last_playing")
+
+    def __init__(self, name: str, owner: str) -> None:
+        self.name = name
+        self.owner = owner  # unique connection name, signals are sent from it
+        self.metadata: dict[str, Any] = {}
+        self.state = RawMediaInfo(provider=name)
+        self.last_playing: float = 0
+
+    def __repr__(self) -> str:
+        return f"MprisPlayer({self.name!r}, {self.owner!r})"
+
+    @property
+    def playing(self) -> bool:
+        return self.state.playing
+
+    def apply(self, changed: dict[str, Any]) -> bool:
+        """Apply `PropertiesChanged` delta of the player interface
+
+        Returns True if the state changed.
+        """
+
+        state = self.state
+        version = state.version
+
+        if "Metadata" in changed:
+            metadata: dict[str, Any] = changed["Metadata"]
+            if metadata.get("mpris:trackid") != self.metadata.get("mpris:trackid"):
+                self.set_position(0)
+            self.metadata = metadata
+            state.update("media_properties", _media_properties(metadata))
+            length = metadata.get("mpris:length", 0)
+            state.update(
+                "timeline_properties", {"end_time": length, "max_seek_time": length}
+            )
+
+        if "PlaybackStatus" in changed or "Rate" in changed:
+            # Fix extrapolated position before the rate of progress changes
+            self.set_position(state.position())
+
+        if "Position" in changed:
+            self.set_position(changed["Position"])
+
+        playback = {
+            field: convert(changed[key])
+            for key, (field, convert) in _PLAYBACK_PROPERTIES.items()
+            if key in changed
+        }
+        state.update("playback_info", playback)
+
+        if self.playing:
+            self.last_playing = time()
+
+        return state.version != version
+
+    def invalidate(self, names: Iterable[str]) -> None:
+        defaults = PlaybackInfo()
+        for name in names:
+            if (prop := _PLAYBACK_PROPERTIES.get(name)) is not None:
+                field = prop[0]
+                self.state.update("playback_info", {field: getattr(defaults, field)})
+
+    def set_position(self, position: int) -> None:
+        self.state.update(
+            "timeline_properties",
+            {"position": position, "last_updated_time": time()},
+        )
+
+    def pending_cover(self) -> Optional[str]:
+        """Local cover art URL of the track, if not in the cover cache yet
+
+        Backends add it with `CoverCache.put_file_async` and `set_cover`.
+        """
+
+        art_url: str = self.metadata.get("mpris:artUrl", "")
+        if not art_url.startswith("file://"):
+            return None
+        if self.state.media_properties.thumbnail_ref is not None:
+            return None
+        return art_url
+
+    def set_cover(self, art_url: str, cover: CoverEntry) -> bool:
+        """Set cover loaded from `art_url`, returns True if it is still current"""
+
+        if self.metadata.get("mpris:artUrl") != art_url:
+            return False
+        return self.state.update("media_properties", {"thumbnail_ref": cover})
+
+    @property
+    def position(self) -> int:
+        """Playback position in microseconds"""
+        return self.state.position()
+
+    @property
+    def data(self) -> MediaInfo:
+        return self.state.snapshot()
+
+
+def _media_properties(metadata: dict[str, Any]) -> dict[str, Any]:
+    """Convert MPRIS Metadata to `MediaProperties` fields
+
+    Local cover art (`file://` URL) is only looked up in the cover cache,
+    see `MprisPlayer.pending_cover`.
+    """
+
+    art_url: str = metadata.get("mpris:artUrl", "")
+    thumbnail_ref = (
+        constants.COVER_CACHE.cached_file(art_url)
+        if art_url.startswith("file://")
+        else None
+    )
+
+    return {
+        "title": metadata.get("xesam:title", ""),
+        "artist": ", ".join(metadata.get("xesam:artist", ())),
+        "album_title": metadata.get("xesam:album", ""),
+        "album_artist": ", ".join(metadata.get("xesam:albumArtist", ())),
+        "track_number": metadata.get("xesam:trackNumber", 0),
+        "album_track_count": metadata.get("xesam:discNumber", 0),
+        "genres": tuple(metadata.get("xesam:genre", ())),
+        "thumbnail": art_url,
+        "thumbnail_ref": thumbnail_ref,
+    }
+
+
+def _strings(value: Any) -> list[str]:
+    if isinstance(value, str):  # some players send a single string
+        return [str(value)]
+    return [str(v) for v in value]
+
+
+# Metadata keys used by `MprisPlayer` -> converter to plain Python types.
+# Converters accept dbus-python types as well, they subclass plain types.
+METADATA_SCHEMA: dict[str, Callable[[Any], Any]] = {
+    "mpris:trackid": str,
+    "mpris:length": int,  # microseconds, some players send a double
+    "mpris:artUrl": str,
+    "xesam:title": str,
+    "xesam:album": str,
+    "xesam:artist": _strings,
+    "xesam:albumArtist": _strings,
+    "xesam:genre": _strings,
+    "xesam:trackNumber": int,
+    "xesam:discNumber": int,
+}
+
+
+def decode_metadata(metadata: Mapping[str, Any]) -> dict[str, Any]:
+    """Plain `Metadata` with only the keys in `METADATA_SCHEMA`
+
+    Other keys (comments, lyrics, ...) are not converted at all. Missing keys
+    stay missing, values of a wrong type are dropped.
+    """
+
+    result = {}
+    for key, convert in METADATA_SCHEMA.items():
+        if (value := metadata.get(key)) is None:
+            continue
+        try:
+            result[key] = convert(value)
+        except (TypeError, ValueError):
+            logger.debug("Invalid %s: %r", key, value)
+    return result
+
+
+def decode_properties(
+    changed: Mapping[str, Any], convert: Callable[[Any], Any] = lambda x: x
+) -> dict[str, Any]:
+    """Player properties for `MprisPlayer.apply`
+
+    `Metadata` is decoded with `decode_metadata`, other values with
+    `convert` (e.g. from dbus-python types).
+    """
+
+    return {
+        str(key): decode_metadata(value) if key == "Metadata" else convert(value)
+        for key, value in changed.items()
+    }
+
+
+_LOOP_STATUS = {"None": "none", "Track": "track", "Playlist": "all"}
+
+# MPRIS property -> (`PlaybackInfo` field, converter)
+_PLAYBACK_PROPERTIES: dict[str, tuple[str, Callable[[Any], Any]]] = {
+    "PlaybackStatus": ("playback_status", str.lower),
+    "Rate": ("playback_rate", float),
+    "Shuffle": ("is_shuffle_active", bool),
+    "LoopStatus": ("auto_repeat_mode", lambda x: _LOOP_STATUS.get(x, "none")),
+}
+
+
+PlayerSelectionPolicy: TypeAlias = Callable[
+    [Sequence[MprisPlayer]], Optional[MprisPlayer]
+]
+"""Picks the active player from all known players (in order of appearance)"""
+
+
+def most_recently_playing(players: Sequence[MprisPlayer]) -> Optional[MprisPlayer]:
+    """Prefer playing players, then the one that played last"""
+
+    if not players:
+        return None
+    return max(players, key=lambda p: (p.playing, p.last_playing))
+
+
+class Allowlist:
+    """Only consider players whose name contains one of `names`
+
+    e.g. `Allowlist(["spotify", "vlc"])`
+    """
+
+    def __init__(
+        self,
+        names: Iterable[str],
+        policy: PlayerSelectionPolicy = most_recently_playing,
+    ) -> None:
+        self.names = tuple(names)
+        self.policy = policy
+
+    def __call__(self, players: Sequence[MprisPlayer]) -> Optional[MprisPlayer]:
+        allowed = [p for p in players if any(n in p.name for n in self.names)]
+        return self.policy(allowed)
+
+
+class Priority:
+    """Prefer players by position of matching name in `names`
+
+    Playing players win over paused ones, unmatched players come last.
+    """
+
+    def __init__(self, names: Iterable[str]) -> None:
+        self.names = tuple(names)
+
+    def _rank(self, player: MprisPlayer) -> int:
+        for i, name in enumerate(self.names):
+            if name in player.name:
+                return i
+        return len(self.names)
+
+    def __call__(self, players: Sequence[MprisPlayer]) -> Optional[MprisPlayer]:
+        if not players:
+            return None
+        return min(players, key=lambda p: (not p.playing, self._rank(p)))
+
+
+class PlayerRegistry:
+    """Tracks every MPRIS player on the bus
+
+    Updated incrementally from `NameOwnerChanged`, `PropertiesChanged` and
+    `Seeked` signals. `on_active_changed` is called when the policy picks
+    another player.
+    """
+
+    def __init__(
+        self,
+        policy: PlayerSelectionPolicy = most_recently_playing,
+        on_active_changed: Optional[Callable[[Optional[MprisPlayer]], Any]] = None,
+    ) -> None:
+        self.policy = policy
+        self.on_active_changed = on_active_changed
+        self.players: dict[str, MprisPlayer] = {}
+        self._owners: dict[str, MprisPlayer] = {}
+        self.active: Optional[MprisPlayer] = None
+
+    def __len__(self) -> int:
+        return len(self.players)
+
+    def by_owner(self, owner: str) -> Optional[MprisPlayer]:
+        return self._owners.get(owner)
+
+    def add(self, name: str, owner: str) -> MprisPlayer:
+        logger.info("Player added: %s", name)
+
+        self.remove(name, reselect=False)
+        player = MprisPlayer(name, owner)
+        self.players[name] = player
+        self._owners[owner] = player
+        return player
+
+    def remove(self, name: str, reselect: bool = True) -> None:
+        if (player := self.players.pop(name, None)) is None:
+            return
+
+        logger.info("Player removed: %s", name)
+        self._owners.pop(player.owner, None)
+
+        if reselect:
+            self.reselect()
+
+    def name_owner_changed(self, name: str, old_owner: str, new_owner: str) -> bool:
+        """Handle `NameOwnerChanged`. Returns True if a player appeared"""
+
+        if not name.startswith(MPRIS_PREFIX):
+            return False
+
+        if old_owner:
+            self.remove(name)
+        if new_owner:
+            self.add(name, new_owner)
+            return True
+        return False
+
+    def properties_changed(
+        self, owner: str, changed: dict[str, Any], invalidated: Iterable[str] = ()
+    ) -> Optional[MprisPlayer]:
+        """Handle `PropertiesChanged` of player interface sent by `owner`"""
+
+        if (player := self._owners.get(owner)) is None:
+            return None
+
+        player.apply(changed)
+        player.invalidate(invalidated)
+
+        if "PlaybackStatus" in changed:
+            self.reselect()
+        return player
+
+    def seeked(self, owner: str, position: int) -> Optional[MprisPlayer]:
+        if (player := self._owners.get(owner)) is None:
+            return None
+
+        player.set_position(position)
+        return player
+
+    def reselect(self) -> None:
+        active = self.policy(tuple(self.players.values()))
+
+        if active is self.active:
+            return
+
+        logger.info("Active player: %s", active and active.name)
+        self.active = active
+
+        if self.on_active_changed is not None:
+            self.on_active_changed(active)
@@ -0,0 +1,358 @@
+"""
+Player side API using MPRIS
+
+Exports a media session of this application as `org.mpris.MediaPlayer2.*`,
+so it shows up in system media controls. State is set from `MediaInfo`,
+controls are routed to a `MediaControlInterface`. Runs on the pure asyncio
+D-Bus client, so it needs neither dbus-python nor GLib.
+"""
+
+__all__ = ["MediaSessionServer"]
+
+import asyncio
+import logging
+import threading
+from time import time
+from typing import Any, Callable, Coroutine, Optional
+
+from .cover_cache import content_hash
+from .datastructures import MediaInfo
+from .dbus_protocol import (
+    BUS_INTERFACE,
+    BUS_NAME,
+    BUS_PATH,
+    DBusConnection,
+    DBusError,
+    Message,
+    Reply,
+    Variant,
+)
+from .media_session import MediaControlInterface
+from .mpris import MPRIS_PATH, MPRIS_PREFIX, PLAYER_INTERFACE, PROPERTIES_INTERFACE
+
+logger = logging.getLogger(__name__)
+
+ROOT_INTERFACE = "org.mpris.MediaPlayer2"
+TRACK_PATH = "/org/mpris/MediaPlayer2/Track/"
+
+# Position jumps larger than this (microseconds) are reported by `Seeked`
+SEEK_THRESHOLD = 500_000
+
+_PLAYBACK_STATUS = {"playing": "Playing", "paused": "Paused"}
+
+# Property and metadata signatures that cannot be guessed from the value
+_SIGNATURES = {
+    "Metadata": "a{sv}",
+    "Position": "x",
+    "SupportedUriSchemes": "as",
+    "SupportedMimeTypes": "as",
+    "mpris:trackid": "o",
+    "mpris:length": "x",
+    "xesam:artist": "as",
+    "xesam:albumArtist": "as",
+    "xesam:genre": "as",
+    "xesam:trackNumber": "i",
+}
+
+_ROOT_PROPERTIES = {
+    "CanQuit": False,
+    "CanRaise": False,
+    "HasTrackList": False,
+    "SupportedUriSchemes": [],
+    "SupportedMimeTypes": [],
+}
+
+_CONTROL_PROPERTIES = {
+    "CanGoNext": True,
+    "CanGoPrevious": True,
+    "CanPlay": True,
+    "CanPause": True,
+    "CanControl": True,
+}
+
+
+def _variants(values: dict[str, Any]) -> dict[str, Any]:
+    """Wrap `values` in variants with correct D-Bus types"""
+
+    result = {}
+    for key, value in values.items():
+        if key == "Metadata":
+            value = _variants(value)
+        if (signature := _SIGNATURES.get(key)) is not None:
+            value = Variant(signature, value)
+        result[key] = value
+    return result
+
+
+def _track_id(data: MediaInfo) -> str:
+    key = f"{data.title}\0{data.artist}\0{data.album_title}".encode("utf-8")
+    return TRACK_PATH + content_hash(key)
+
+
+def _metadata(data: MediaInfo) -> dict[str, Any]:
+    metadata: dict[str, Any] = {
+        "mpris:trackid": _track_id(data),
+        "mpris:length": data.duration,
+        "xesam:title": data.title,
+        "xesam:artist": [data.artist] if data.artist else [],
+        "xesam:album": data.album_title,
+        "xesam:albumArtist": [data.album_artist] if data.album_artist else [],
+        "xesam:genre": list(data.genres),
+        "xesam:trackNumber": data.track_number,
+    }
+    if art_url := data.cover_ref.file_url() if data.cover_ref else data.cover:
+        metadata["mpris:artUrl"] = art_url
+    return metadata
+
+
+def _player_properties(data: MediaInfo, rate: float) -> dict[str, Any]:
+    """Player interface properties except `Position`
+
+    Rate is read-only (`Set` is rejected), its limits only make sure the
+    rate reported by the backend is in range.
+    """
+
+    return {
+        "PlaybackStatus": _PLAYBACK_STATUS.get(data.state, "Stopped"),
+        "Rate": rate,
+        "MinimumRate": min(rate, 1.0),
+        "MaximumRate": max(rate, 1.0),
+        "Metadata": _metadata(data),
+        "CanSeek": data.duration > 0,
+    }
+
+
+class MediaSessionServer:
+    """Publish our media session as `org.mpris.MediaPlayer2.<name>`
+
+    Call `set_data` whenever the state changes (from any thread, also
+    usable as a session callback). Changes are batched into one
+    `PropertiesChanged` with only the modified properties. Position is
+    reported as base + rate * elapsed time, `Seeked` is only emitted when
+    it jumps.
+
+    Incoming Play, Pause, Next, Seek etc. are awaited on the event loop
+    `start` runs on, the caller gets its reply when they finish.
+    """
+
+    def __init__(
+        self,
+        controls: MediaControlInterface,
+        name: str = "media_session",
+        identity: Optional[str] = None,
+        bus_address: Optional[str] = None,
+    ) -> None:
+        self.controls = controls
+        self.bus_name = MPRIS_PREFIX + name
+        self.identity = identity or name
+        self.data = MediaInfo()
+
+        self._bus_address = bus_address
+        self._connection: Optional[DBusConnection] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None  # of controls
+
+        self._lock = threading.Lock()
+        self.properties = _player_properties(self.data, 1.0)
+        self._pending: dict[str, Any] = {}  # changed, not yet emitted
+        self._position = 0  # base
+        self._position_time = time()
+        self._rate = 0.0  # of position, 0 unless playing
+
+    @property
+    def position(self) -> int:
+        """Reported position in microseconds"""
+
+        with self._lock:
+            position = self._position + int(
+                (time() - self._position_time) * self._rate * 1_000_000
+            )
+        if self.data.duration:
+            return min(position, self.data.duration)
+        return position
+
+    def set_data(self, data: MediaInfo, rate: float = 1.0) -> None:
+        """Set state of the session, `rate` is playback speed"""
+
+        properties = _player_properties(data, rate)
+        expected = self.position
+        now = time()
+
+        with self._lock:
+            track_changed = properties["Metadata"] != self.properties["Metadata"]
+            changed = {
+                k: v for k, v in properties.items() if self.properties.get(k) != v
+            }
+            self.data = data
+            self.properties = properties
+            self._position = data.position
+            self._position_time = now
+            self._rate = rate if data.state == "playing" else 0.0
+
+            schedule = bool(changed) and not self._pending
+            self._pending.update(changed)
+
+        if (loop := self.loop) is None:
+            return  # not exported yet
+
+        if schedule:
+            loop.call_soon_threadsafe(self._emit_changes)
+
+        jumped = abs(data.position - expected) > SEEK_THRESHOLD
+        if jumped and not track_changed:
+            loop.call_soon_threadsafe(self._emit_seeked, data.position)
+
+    __call__ = set_data
+
+    def _emit_changes(self) -> None:
+        with self._lock:
+            changed, self._pending = self._pending, {}
+
+        if changed and self._connection is not None:
+            self._connection.emit(
+                MPRIS_PATH,
+                PROPERTIES_INTERFACE,
+                "PropertiesChanged",
+                "sa{sv}as",
+                [PLAYER_INTERFACE, _variants(changed), []],
+            )
+
+    def _emit_seeked(self, position: int) -> None:
+        if self._connection is not None:
+            self._connection.emit(
+                MPRIS_PATH, PLAYER_INTERFACE, "Seeked", "x", [position]
+            )
+
+    async def start(self) -> None:
+        """Connect to the bus and export the player"""
+
+        self.loop = asyncio.get_running_loop()
+        self._connection = connection = await DBusConnection.connect(
+            self._bus_address
+        )
+        connection.add_method_handler(MPRIS_PATH, self._handle)
+
+        with self._lock:
+            self._pending.clear()  # nobody knew the old values
+        (reply,) = await connection.call(
+            BUS_NAME, BUS_PATH, BUS_INTERFACE, "RequestName", "su", [self.bus_name, 4]
+        )
+        if reply != 1:  # primary owner
+            self.close()
+            raise DBusError("NameTaken", f"{self.bus_name} is already owned")
+        logger.info("Exported %s", self.bus_name)
+
+    async def serve_forever(self) -> None:
+        """Handle D-Bus calls until the connection is closed"""
+
+        if self._connection is None:
+            await self.start()
+        assert self._connection is not None
+
+        try:
+            await self._connection.closed
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Disconnect, which also releases the bus name"""
+
+        if self._connection is not None:
+            self._connection.remove_method_handler(MPRIS_PATH)
+            self._connection.close()
+            self._connection = None
+
+    #
+    # Method calls
+    #
+
+    def _handle(self, call: Message) -> Any:
+        if call.interface == PROPERTIES_INTERFACE:
+            return self._handle_properties(call.member, *call.body)
+        if call.interface == ROOT_INTERFACE and call.member in ("Raise", "Quit"):
+            return "", ()
+        if call.interface != PLAYER_INTERFACE:
+            return None
+
+        controls = self.controls
+        member, args = call.member, call.body
+
+        if member == "Play":
+            return self._control(controls.play)
+        if member == "Pause":
+            return self._control(controls.pause)
+        if member == "PlayPause":
+            return self._control(controls.play_pause)
+        if member == "Stop":
+            return self._control(controls.stop)
+        if member == "Next":
+            return self._control(controls.next)
+        if member == "Previous":
+            return self._control(controls.prev)
+        if member == "Seek":
+            return self._control(self._seek_to(self.position + args[0]))
+        if member == "SetPosition":
+            track_id, position = args
+            if track_id != self.properties["Metadata"]["mpris:trackid"]:
+                return "", ()  # stale request, ignored as the spec requires
+            return self._control(self._seek_to(position))
+        if member == "OpenUri":
+            raise DBusError(
+                "org.freedesktop.DBus.Error.NotSupported",
+                "Opening URIs is not supported",
+            )
+        return None
+
+    async def _control(self, method: Callable[[], Coroutine[Any, Any, Any]]) -> Reply:
+        """Await `method` and reply to the caller"""
+
+        try:
+            await method()
+        except DBusError:
+            raise
+        except Exception as e:
+            logger.warning("Control failed: %s", e)
+            raise DBusError("org.freedesktop.DBus.Error.Failed", str(e)) from e
+        return "", ()
+
+    def _seek_to(self, position: int) -> Callable[[], Coroutine[Any, Any, None]]:
+        """Coroutine function seeking to `position` (microseconds)"""
+
+        duration = self.data.duration
+        percentage = min(max(position / duration * 100, 0), 100) if duration else 0
+        return lambda: self.controls.seek_percentage(percentage)
+
+    def _handle_properties(self, member: str, interface: str, *args: Any) -> Reply:
+        if interface == ROOT_INTERFACE:
+            properties = {**_ROOT_PROPERTIES, "Identity": self.identity}
+        elif interface == PLAYER_INTERFACE:
+            properties = {
+                **self.properties,
+                **_CONTROL_PROPERTIES,
+                "Position": self.position,
+            }
+        else:
+            raise DBusError(
+                "org.freedesktop.DBus.Error.UnknownInterface",
+                f"Unknown interface {interface}",
+            )
+
+        if member == "GetAll":
+            return "a{sv}", [_variants(properties)]
+        if member == "Get":
+            (prop,) = args
+            if prop not in properties:
+                raise DBusError(
+                    "org.freedesktop.DBus.Error.UnknownProperty",
+                    f"Unknown property {prop}",
+                )
+            return "v", list(_variants({prop: properties[prop]}).values())
+        if member == "Set":
+            prop = args[0]
+            raise DBusError(
+                "org.freedesktop.DBus.Error.PropertyReadOnly",
+                f"Property {prop} is read-only",
+            )
+        raise DBusError(
+            "org.freedesktop.DBus.Error.UnknownMethod",
+            f"No method {member} on {PROPERTIES_INTERFACE}",
+        )
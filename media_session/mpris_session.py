@@ -0,0 +1,350 @@
+"""
+Media controller using MPRIS, independent of the D-Bus transport
+
+`MprisMediaSession` holds the player registry, applies signals of players,
+loads their covers, publishes updates and implements the controls. Linux
+backends subclass it and only connect to the bus, make calls and feed
+signals into `_name_owner_changed`, `_properties_changed` and `_seeked`.
+
+Time variables is stored primarily in microseconds
+"""
+
+__all__ = ["MprisMediaSession"]
+
+import abc
+import asyncio
+import logging
+from typing import (
+    TYPE_CHECKING,
+    AbstractSet,
+    Any,
+    Coroutine,
+    Iterable,
+    Mapping,
+    Optional,
+)
+
+from . import constants
+from .bus import ALL, COVER, POSITION, UpdateBus
+from .datastructures import MediaInfo, RawMediaInfo
+from .manager import SessionManager
+from .media_session import AbstractMediaSession
+from .mpris import (
+    MPRIS_PREFIX,
+    PLAYER_INTERFACE,
+    MprisPlayer,
+    PlayerRegistry,
+    PlayerSelectionPolicy,
+    decode_properties,
+    most_recently_playing,
+)
+from .typing import MediaSessionUpdateCallback, UpdateMode
+
+if TYPE_CHECKING:
+    from .recording import Recorder
+
+logger = logging.getLogger(__name__)
+
+
+class MprisMediaSession(AbstractMediaSession):
+    """Media controller using MPRIS
+
+    Tracks every player on the bus and follows the one picked by `policy`.
+    State of every player is available via `sessions` manager.
+    State is fetched once per player with a single `GetAll` (concurrently
+    for all players) and then kept up to date by `PropertiesChanged`,
+    `Seeked` and `NameOwnerChanged` signals.
+    Signals of players are recorded to `recorder` if it is set.
+    """
+
+    def __init__(
+        self,
+        callback: Optional[MediaSessionUpdateCallback] = None,
+        bus_address: Optional[str] = None,
+        policy: PlayerSelectionPolicy = most_recently_playing,
+        update_mode: UpdateMode = "full",
+        recorder: Optional["Recorder"] = None,
+    ) -> None:
+        self.bus = UpdateBus()
+        if callback is not None:
+            self.bus.subscribe(callback, mode=update_mode)
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+        self._bus_address = bus_address
+        self._loaded = False
+        self._registry = PlayerRegistry(policy, self._active_changed)
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._recorder = recorder
+
+        self.sessions = SessionManager()
+        self._empty_state = RawMediaInfo()
+
+    #
+    # Transport
+    #
+
+    @abc.abstractmethod
+    async def _get_name_owner(self, name: str) -> Optional[str]:
+        """Unique connection name owning `name`, None if it is gone"""
+
+    @abc.abstractmethod
+    async def _get_all(self, player: MprisPlayer) -> Optional[Mapping[str, Any]]:
+        """Player interface properties in one round trip, None on error"""
+
+    @abc.abstractmethod
+    async def _call(self, method: str) -> None:
+        """Call method of the active player"""
+
+    @abc.abstractmethod
+    async def _set_position(self, track_id: str, position: int) -> None:
+        """Call `SetPosition` of the active player"""
+
+    @abc.abstractmethod
+    async def _receive(self) -> None:
+        """Handle signals until the connection is closed"""
+
+    def _to_py(self, value: Any) -> Any:
+        """Convert received value to plain Python types"""
+        return value
+
+    #
+    # Players
+    #
+
+    @property
+    def players(self) -> dict[str, MprisPlayer]:
+        """All known players by bus name"""
+        return self._registry.players
+
+    @property
+    def player(self) -> Optional[MprisPlayer]:
+        """Active player"""
+        return self._registry.active
+
+    def _active_changed(self, _: Optional[MprisPlayer]) -> None:
+        self._send_data()
+
+    def _create_task(self, coro: Coroutine[Any, Any, None]) -> None:
+        assert self._loop is not None
+        task = self._loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _decode(
+        self, owner: str, changed: Mapping[str, Any], invalidated: list[str]
+    ) -> dict[str, Any]:
+        """Record `PropertiesChanged` payload as received, decode it"""
+
+        if self._recorder is not None:
+            self._recorder.record(
+                "properties_changed", owner, self._to_py(changed), invalidated
+            )
+        return decode_properties(changed, self._to_py)
+
+    def _name_owner_changed(self, name: str, old_owner: str, new_owner: str) -> None:
+        if self._recorder is not None and name.startswith(MPRIS_PREFIX):
+            self._recorder.record("name_owner_changed", name, old_owner, new_owner)
+        appeared = self._registry.name_owner_changed(name, old_owner, new_owner)
+
+        if old_owner:
+            self.sessions.remove(name)
+        if not appeared or self._loop is None:
+            return
+
+        # New player: fetch its state without blocking signal handling
+        self._create_task(self._player_appeared(name))
+
+    async def _player_appeared(self, name: str) -> None:
+        if (player := self._registry.players.get(name)) is None:
+            return  # gone before the task ran
+        if (properties := await self._get_all(player)) is None:
+            return
+        changed = self._decode(player.owner, properties, [])
+        if self._registry.players.get(name) is not player:
+            return  # replaced or gone meanwhile
+
+        self._apply(player, changed, [])
+
+    def _properties_changed(
+        self,
+        owner: str,
+        interface: str,
+        changed: Mapping[str, Any],
+        invalidated: list[str],
+    ) -> None:
+        if interface != PLAYER_INTERFACE:
+            return
+
+        logger.debug("Properties changed")
+        decoded = self._decode(owner, changed, invalidated)
+        if (player := self._registry.by_owner(owner)) is not None:
+            self._apply(player, decoded, invalidated)
+
+    def _apply(
+        self, player: MprisPlayer, changed: dict[str, Any], invalidated: list[str]
+    ) -> None:
+        self._registry.properties_changed(player.owner, changed, invalidated)
+
+        if "Metadata" in changed and (art_url := player.pending_cover()):
+            if self._loop is None:
+                if cover := constants.COVER_CACHE.put_file(art_url):
+                    player.set_cover(art_url, cover)
+            else:
+                self._create_task(self._load_cover(player, art_url))
+
+        self.sessions.publish(player.name, player.state)
+
+        if player is self._registry.active:
+            self._send_data()
+
+    async def _load_cover(self, player: MprisPlayer, art_url: str) -> None:
+        """Add cover file to the cache off the loop, publish it if still current"""
+
+        cover = await constants.COVER_CACHE.put_file_async(art_url)
+        if cover is None or not player.set_cover(art_url, cover):
+            return
+
+        self.sessions.publish(player.name, player.state)
+
+        if player is self._registry.active:
+            self._send_data(COVER)
+
+    def _seeked(self, owner: str, position: int) -> None:
+        logger.debug("Seeked")
+        if self._recorder is not None:
+            self._recorder.record("seeked", owner, position)
+        player = self._registry.seeked(owner, position)
+
+        if player is None:
+            return
+
+        self.sessions.publish(player.name, player.state)
+
+        if player is self._registry.active:
+            self._send_data(POSITION)
+
+    #
+    # State
+    #
+
+    @property
+    def position(self) -> int:
+        """Playback position in microseconds"""
+
+        if (player := self._registry.active) is None:
+            return 0
+        return player.position
+
+    @property
+    def _state(self) -> RawMediaInfo:
+        if (player := self._registry.active) is None:
+            return self._empty_state
+        return player.state
+
+    @property
+    def data(self) -> MediaInfo:
+        return self._state.snapshot()
+
+    @property
+    def data_raw(self) -> RawMediaInfo:
+        """Get media session state"""
+        return self._state
+
+    def _send_data(self, changed: AbstractSet[str] = ALL) -> None:
+        self.bus.publish(self._state, changed)
+
+    async def _load_players(self, names: Iterable[str]) -> None:
+        """Fetch state of players `names` (all in flight at once), pick one
+
+        Called by `load` of backends once signals are subscribed to.
+        """
+
+        await asyncio.gather(
+            *(self._load_player(n) for n in names if n.startswith(MPRIS_PREFIX))
+        )
+
+        if not len(self._registry):
+            logger.info("No players found")
+
+        self._loaded = True
+        self._registry.reselect()
+
+    async def _load_player(self, name: str) -> None:
+        if (owner := await self._get_name_owner(name)) is None:
+            return  # gone meanwhile
+
+        player = self._registry.players.get(name)
+        if player is not None and player.owner == owner:
+            return  # just appeared, fetched by `_player_appeared`
+
+        player = self._registry.add(name, owner)
+        if self._recorder is not None:
+            self._recorder.record("name_owner_changed", name, "", owner)
+
+        if (properties := await self._get_all(player)) is None:
+            return
+        changed = self._decode(owner, properties, [])
+        if self._registry.players.get(name) is not player:
+            return
+
+        player.apply(changed)
+        self.sessions.publish(player.name, player.state)
+
+    async def update(self) -> None:
+        self._send_data()
+
+    async def loop(self) -> None:
+        """Main loop, receives D-Bus signals until the connection is closed"""
+
+        self._loop = asyncio.get_running_loop()
+        self.bus.attach(self._loop)
+
+        if not self._loaded:
+            await self.load()
+
+        self._send_data()
+
+        await self._receive()
+
+    #
+    # Controls
+    #
+
+    async def play(self) -> None:
+        """Start playback"""
+        await self._call("Play")
+
+    async def pause(self) -> None:
+        """Pause playback"""
+        await self._call("Pause")
+
+    async def play_pause(self) -> None:
+        """Toggle play/pause"""
+        await self._call("PlayPause")
+
+    async def next(self) -> None:
+        """Select next track"""
+        await self._call("Next")
+
+    async def prev(self) -> None:
+        """Select previous track"""
+        await self._call("Previous")
+
+    async def stop(self) -> None:
+        """Stop playback"""
+        await self._call("Stop")
+
+    async def seek_percentage(self, percentage: float) -> None:
+        """Seek to percentage in range [0, 100]"""
+
+        if (player := self._registry.active) is None:
+            return
+
+        track_id = player.metadata.get("mpris:trackid")
+        duration = player.metadata.get("mpris:length")
+
+        if track_id is None or not duration:
+            return
+
+        position = int(duration * percentage / 100)
+        await self._set_position(track_id, position)
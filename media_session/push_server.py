@@ -0,0 +1,351 @@
+"""
+Local push server
+
+Streams `MediaInfo` to any number of clients over WebSocket (`/ws`) or
+Server-Sent Events (`/events`). Also serves current snapshot (`/`) and
+cover images (`/cover/<hash>`) with ETag.
+
+Browsers may only use the server from `allowed_origins`, requests with any
+other `Origin` are refused, so web pages cannot read what is playing.
+
+Each message is a JSON object `{"type": "snapshot" | "delta", "data": {...}}`,
+the cover is referenced by `cover_hash`. Slow clients get merged deltas:
+intermediate updates (e.g. position ticks) are dropped, but no field change
+is lost.
+"""
+
+__all__ = ["PushServer"]
+
+import asyncio
+import logging
+from base64 import b64encode
+from hashlib import sha1
+from typing import Any, Iterable, Optional
+
+from . import constants
+from .changes import MediaInfoDelta, diff
+from .datastructures import MediaInfo
+from .serialize import dumps, encode_json
+
+logger = logging.getLogger(__name__)
+
+WEBSOCKET_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+HTTP_STATUS = {
+    101: "Switching Protocols",
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+}
+
+
+def _encode_delta(delta: MediaInfoDelta) -> dict[str, Any]:
+    """Make delta JSON serializable, referencing cover by hash"""
+
+    result = dict(delta)
+    if "cover_ref" in result:
+        cover = result.pop("cover_ref")
+        result["cover_hash"] = cover and cover.key
+    if "genres" in result:
+        result["genres"] = list(result["genres"])
+    return result
+
+
+class _Client:
+    """Connected subscriber with its own pending changes
+
+    Pending delta is merged instead of queued, so memory per client is
+    bounded and a slow client only receives the latest values.
+    """
+
+    __slots__ = ("pending", "snapshot", "event")
+
+    def __init__(self) -> None:
+        self.pending: MediaInfoDelta = {}
+        self.snapshot = True  # next message is a full snapshot
+        self.event = asyncio.Event()
+
+    def push(self, delta: MediaInfoDelta) -> None:
+        self.pending.update(delta)
+        self.event.set()
+
+    async def next_message(self, data: MediaInfo) -> bytes:
+        await self.event.wait()
+        self.event.clear()
+
+        if self.snapshot:
+            self.snapshot = False
+            self.pending.clear()
+            return b'{"type":"snapshot","data":' + encode_json(data, "hash") + b"}"
+
+        message = {"type": "delta", "data": _encode_delta(self.pending)}
+        self.pending = {}
+        return dumps(message)
+
+
+class PushServer:
+    """Push `MediaInfo` updates to local clients
+
+    Use `publish` as a session callback (with `update_mode="full"`).
+    Must be called from the thread running the server's event loop, or via
+    `publish_threadsafe`.
+
+    `allowed_origins` are web origins (e.g. "http://localhost:3000") allowed
+    to connect from a browser, none by default. Frames from WebSocket
+    clients are limited to `max_frame_size` bytes.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        allowed_origins: Iterable[str] = (),
+        max_frame_size: int = 64 * 1024,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.allowed_origins = frozenset(allowed_origins)
+        self.max_frame_size = max_frame_size
+        self.data = MediaInfo()
+        self._clients: set[_Client] = set()
+        self._server: Optional[asyncio.Server] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port
+        )
+        logger.info("Push server listening on %s:%s", self.host, self.port)
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        assert self._server is not None
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def publish(self, data: MediaInfo) -> None:
+        delta = diff(self.data, data)
+        self.data = data
+
+        if not delta:
+            return
+
+        for client in self._clients:
+            client.push(delta)
+
+    def publish_threadsafe(self, data: MediaInfo) -> None:
+        if self._loop is None:
+            self.publish(data)
+        else:
+            self._loop.call_soon_threadsafe(self.publish, data)
+
+    #
+    # HTTP
+    #
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+
+        lines = request.decode("latin-1").split("\r\n")
+        method, target, *_ = lines[0].split(" ") + ["", ""]
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+
+        path = target.split("?", 1)[0]
+
+        # Requests without Origin are not made by a web page
+        origin = headers.get("origin")
+        cors = {} if origin is None else {"Access-Control-Allow-Origin": origin}
+
+        try:
+            if origin is not None and origin not in self.allowed_origins:
+                logger.warning("Refused request from origin %s", origin)
+                await self._respond(writer, 403)
+            elif method != "GET":
+                await self._respond(writer, 405)
+            elif path == "/":
+                body = encode_json(self.data, cover="hash")
+                await self._respond(writer, 200, body, "application/json", cors)
+            elif path.startswith("/cover/"):
+                await self._cover(writer, path[len("/cover/") :], headers, cors)
+            elif path == "/events":
+                await self._stream_sse(writer, cors)
+            elif path == "/ws":
+                await self._stream_websocket(reader, writer, headers)
+            else:
+                await self._respond(writer, 404)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        body: bytes = b"",
+        content_type: str = "text/plain",
+        headers: Optional[dict[str, str]] = None,
+    ) -> None:
+        head = [
+            f"HTTP/1.1 {status} {HTTP_STATUS[status]}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            "Connection: close",
+        ]
+        head += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        writer.write(body)
+        await writer.drain()
+
+    async def _cover(
+        self,
+        writer: asyncio.StreamWriter,
+        key: str,
+        headers: dict[str, str],
+        cors: dict[str, str],
+    ) -> None:
+        cover = self.data.cover_ref
+        if cover is None or cover.key != key:
+            cover = constants.COVER_CACHE.get(key)
+
+        if cover is None:
+            await self._respond(writer, 404)
+            return
+
+        # Content addressed: the resource never changes
+        cache_headers = {
+            "ETag": f'"{cover.key}"',
+            "Cache-Control": "public, max-age=31536000, immutable",
+            **cors,
+        }
+
+        if headers.get("if-none-match") == f'"{cover.key}"':
+            await self._respond(writer, 304, headers=cache_headers)
+            return
+
+        await self._respond(writer, 200, cover.raw, cover.mime, cache_headers)
+
+    #
+    # Streaming
+    #
+
+    async def _stream(self, writer: asyncio.StreamWriter, send: Any) -> None:
+        client = _Client()
+        client.event.set()  # send snapshot right away
+        self._clients.add(client)
+
+        try:
+            while True:
+                message = await client.next_message(self.data)
+                send(message)
+                await writer.drain()
+        finally:
+            self._clients.discard(client)
+
+    async def _stream_sse(
+        self, writer: asyncio.StreamWriter, cors: dict[str, str]
+    ) -> None:
+        head = [
+            "HTTP/1.1 200 OK",
+            "Content-Type: text/event-stream",
+            "Cache-Control: no-cache",
+        ]
+        head += [f"{k}: {v}" for k, v in cors.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+
+        await self._stream(writer, lambda m: writer.write(b"data: " + m + b"\n\n"))
+
+    async def _stream_websocket(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        headers: dict[str, str],
+    ) -> None:
+        key = headers.get("sec-websocket-key")
+
+        if key is None or "websocket" not in headers.get("upgrade", "").lower():
+            await self._respond(writer, 400)
+            return
+
+        accept = b64encode(sha1(key.encode("latin-1") + WEBSOCKET_GUID).digest())
+        head = (
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept.decode('latin-1')}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode("latin-1"))
+
+        stream = asyncio.create_task(
+            self._stream(writer, lambda m: writer.write(_websocket_frame(m)))
+        )
+        try:
+            await _websocket_read_until_close(reader, writer, self.max_frame_size)
+        finally:
+            stream.cancel()
+
+
+def _websocket_frame(payload: bytes, opcode: int = 0x1) -> bytes:
+    """Unmasked server frame"""
+
+    length = len(payload)
+    if length < 126:
+        header = bytes((0x80 | opcode, length))
+    elif length < 1 << 16:
+        header = bytes((0x80 | opcode, 126)) + length.to_bytes(2, "big")
+    else:
+        header = bytes((0x80 | opcode, 127)) + length.to_bytes(8, "big")
+    return header + payload
+
+
+async def _websocket_read_until_close(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, max_size: int
+) -> None:
+    """Handle control frames from client, ignore data frames
+
+    A frame longer than `max_size` closes the connection (1009, message too
+    big) before its payload is read.
+    """
+
+    while True:
+        b1, b2 = await reader.readexactly(2)
+        opcode = b1 & 0x0F
+        length = b2 & 0x7F
+        if length == 126:
+            length = int.from_bytes(await reader.readexactly(2), "big")
+        elif length == 127:
+            length = int.from_bytes(await reader.readexactly(8), "big")
+        if length > max_size:
+            writer.write(_websocket_frame((1009).to_bytes(2, "big"), 0x8))
+            await writer.drain()
+            return
+        mask = await reader.readexactly(4) if b2 & 0x80 else b""
+        payload = await reader.readexactly(length)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+        if opcode == 0x8:  # close
+            writer.write(_websocket_frame(payload[:2], 0x8))
+            return
+        if opcode == 0x9:  # ping
+            writer.write(_websocket_frame(payload, 0xA))
@@ -0,0 +1,141 @@
+"""
+Recording of raw backend events
+
+Recordings are append-only JSON Lines files (gzip compressed if the name
+ends with `.gz`), one event per line: `[time, kind, *args]`, where `time`
+is seconds since the recorder was opened.
+
+Event kinds:
+- `start`: `{"version": 1, "backend": ...}`, opens every recording run
+- MPRIS: `name_owner_changed` (name, old owner, new owner),
+  `properties_changed` (owner, changed, invalidated), `seeked` (owner,
+  position). `GetAll` replies are recorded as `properties_changed`.
+  Payloads are recorded as received (converted to plain types), before
+  `mpris.decode_properties`, which runs again on replay
+- WinRT: `section` (provider, section, values), `current` (provider or
+  null), `removed` (provider)
+- `cover` (key, base64 image), written once per cover before the first
+  event that references it as `{"$cover": key}`
+
+Use `media_session_replay.MediaSessionReplay` to play a recording back.
+"""
+
+__all__ = ["Recorder", "read_recording", "RecordedEvent"]
+
+import gzip
+import json
+import logging
+import threading
+from base64 import b64decode
+from time import monotonic
+from typing import IO, Any, Iterator
+
+from . import constants
+from .cover_cache import CoverEntry
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+RecordedEvent = tuple[float, str, list[Any]]
+"""Time in seconds, kind, arguments"""
+
+
+def _open(path: str, mode: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")  # type: ignore
+    return open(path, mode, encoding="utf-8")
+
+
+class Recorder:
+    """Append backend events to the recording at `path`
+
+    Can be used from any thread. Pass to a backend as `recorder`.
+    """
+
+    def __init__(self, path: str, backend: str = "") -> None:
+        self.path = path
+        self._file: IO[str] = _open(path, "a")
+        self._lock = threading.Lock()
+        self._covers: set[str] = set()
+        self._start = monotonic()
+        self._time = 0.0  # of the event being recorded
+        self.record("start", {"version": FORMAT_VERSION, "backend": backend})
+
+    def __enter__(self) -> "Recorder":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def record(self, kind: str, *args: Any) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            self._time = round(monotonic() - self._start, 6)
+            event = [self._time, kind, *args]
+            # Encoding may write cover events first
+            line = json.dumps(event, separators=(",", ":"), default=self._encode)
+            self._file.write(line + "\n")
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def _encode(self, obj: Any) -> Any:
+        if isinstance(obj, CoverEntry):
+            if obj.key not in self._covers:
+                self._covers.add(obj.key)
+                event = [self._time, "cover", obj.key, obj.b64]
+                self._file.write(json.dumps(event, separators=(",", ":")) + "\n")
+            return {"$cover": obj.key}
+        if isinstance(obj, (tuple, set, frozenset)):
+            return list(obj)
+        logger.debug("Recording %r as string", obj)
+        return str(obj)
+
+
+def read_recording(path: str) -> Iterator[RecordedEvent]:
+    """Read events of all runs in the recording at `path`
+
+    Times of later runs continue after the previous run. Covers are added to
+    the cover cache and referenced as `CoverEntry`.
+    """
+
+    covers: dict[str, CoverEntry] = {}
+
+    def decode(obj: dict[str, Any]) -> Any:
+        if (key := obj.get("$cover")) is None:
+            return obj
+        if (cover := covers.get(key)) is None:
+            logger.warning("Recording references unknown cover %s", key)
+            return constants.COVER_PLACEHOLDER
+        return cover
+
+    offset = 0.0
+    last = 0.0
+
+    with _open(path, "r") as f:
+        for number, line in enumerate(f, 1):
+            try:
+                t, kind, *args = json.loads(line, object_hook=decode)
+            except ValueError as e:
+                # Last line of an interrupted recording may be incomplete
+                logger.warning("%s:%s: skipping malformed event: %s", path, number, e)
+                continue
+
+            if kind == "start":
+                offset = last
+            t += offset
+            last = t
+
+            if kind == "cover":
+                key, data = args
+                covers[key] = constants.COVER_CACHE.put(b64decode(data))
+                continue
+
+            yield t, kind, args
@@ -0,0 +1,299 @@
+"""
+Control command scheduler
+
+Sits in front of a media session and collapses redundant commands before
+they reach the platform API, where each one is a full round trip:
+
+- consecutive seeks: only the last one is sent
+- a seek followed by `next`/`prev`: the seek is dropped
+- play, pause, stop and play_pause in a row: reduced to the net command,
+  `play_pause` twice cancels out
+- repeated `next` (or `prev`): sent back to back as one queued command
+
+Commands queue while one is in flight and are sent at most once per
+`window`. Their expected effect on playback status and position is
+published right away, on the same bus and session manager as backend
+updates, so subscribers see it immediately. The session state itself is
+not modified: the next backend update publishes the real state. If the
+backend stays silent for `reconcile_timeout` after the queue drains, or a
+command fails, the state without the unconfirmed effects is published.
+"""
+
+__all__ = ["CommandScheduler"]
+
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field, replace
+from time import time
+from typing import Any, Optional, TypeAlias
+
+from .bus import PLAYBACK
+from .datastructures import RawMediaInfo
+from .media_session import AbstractMediaSession, MediaControlInterface
+
+logger = logging.getLogger(__name__)
+
+Effects: TypeAlias = dict[str, dict[str, Any]]  # section -> field values
+
+_SEEK = "seek_percentage"
+_SKIP = frozenset(("next", "prev"))
+_PLAYBACK = frozenset(("play", "pause", "stop", "play_pause"))
+
+# previous command -> command equivalent to it followed by `play_pause`
+_TOGGLED: dict[str, Optional[str]] = {
+    "play_pause": None,
+    "play": "pause",
+    "pause": "play",
+    "stop": "play",
+}
+
+_STATUS = {"play": "playing", "pause": "paused", "stop": "stopped"}
+
+
+@dataclass(slots=True)
+class _Command:
+    name: str
+    args: tuple[Any, ...] = ()
+    count: int = 1
+    waiters: list[asyncio.Future[None]] = field(default_factory=list)
+    effects: Effects = field(default_factory=dict)  # expected state changes
+
+
+class CommandScheduler(MediaControlInterface):
+    """Coalesces control commands for `session`
+
+    Other session methods (e.g. `set_repeat`) can be queued with `submit`,
+    they keep their order relative to other commands but are not merged.
+    """
+
+    def __init__(
+        self,
+        session: AbstractMediaSession,
+        window: float = 0.1,
+        reconcile_timeout: float = 2.0,
+    ) -> None:
+        self.session = session
+        self.window = window  # minimum seconds between commands sent
+        self.reconcile_timeout = reconcile_timeout
+        self._queue: deque[_Command] = deque()
+        self._current: Optional[_Command] = None  # in flight
+        self._task: Optional[asyncio.Task[None]] = None
+        self._reconcile: Optional[asyncio.TimerHandle] = None
+
+        # Effects of sent commands not reported by the backend yet
+        self._unconfirmed: list[Effects] = []
+        # State the effects apply to, and its version when last published
+        self._state: Optional[RawMediaInfo] = None
+        self._version = -1
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    async def submit(self, name: str, *args: Any) -> None:
+        """Queue method `name` of the session, wait until it is sent
+
+        Returns without error if the command was merged into another one or
+        cancelled out.
+        """
+
+        if not callable(getattr(self.session, name, None)):
+            raise AttributeError(f"'{name}' is not supported")
+
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[None] = loop.create_future()
+
+        view = self._view()
+        overlay = self._overlay()
+        command = _Command(name, args, waiters=[future])
+        command.effects = _effects(name, args, view)
+        self._enqueue(command)
+        if self._overlay() != overlay:
+            self._publish()
+
+        if self._reconcile is not None:
+            self._reconcile.cancel()
+            self._reconcile = None
+        if self._task is None:
+            self._task = loop.create_task(self._run())
+        await future
+
+    def _enqueue(self, command: _Command) -> None:
+        queue = self._queue
+        name = command.name
+
+        if name == _SEEK:
+            if queue and queue[-1].name == _SEEK:
+                _absorb(command, queue.pop())
+        elif name in _SKIP:
+            while queue and queue[-1].name == _SEEK:
+                command.waiters += queue.pop().waiters  # effects dropped
+            if queue and queue[-1].name == name:
+                command.count += queue[-1].count
+                _absorb(command, queue.pop())
+        elif name in _PLAYBACK and queue and queue[-1].name in _PLAYBACK:
+            previous = queue.pop()
+            _absorb(command, previous)
+            if name == "play_pause":
+                if (toggled := _TOGGLED[previous.name]) is None:
+                    _resolve(command.waiters)  # toggled twice, nothing to do
+                    return
+                command.name = toggled
+
+        queue.append(command)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while self._queue:
+                command = self._current = self._queue.popleft()
+                started = loop.time()
+                try:
+                    method = getattr(self.session, command.name)
+                    for _ in range(command.count):
+                        await method(*command.args)
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.warning("Command '%s' failed: %s", command.name, e)
+                    self._current = None
+                    if command.effects:
+                        self._publish()  # without effects of this command
+                    for waiter in command.waiters:
+                        if not waiter.done():
+                            waiter.set_exception(e)
+                else:
+                    self._current = None
+                    if command.effects:
+                        self._unconfirmed.append(command.effects)
+                    _resolve(command.waiters)
+
+                if self._queue and (delay := started + self.window - loop.time()) > 0:
+                    await asyncio.sleep(delay)
+        finally:
+            self._current = None
+            self._task = None
+            if self._unconfirmed:
+                self._reconcile = loop.call_later(
+                    self.reconcile_timeout, self._reconcile_state
+                )
+
+    def _reconcile_state(self) -> None:
+        """Drop effects the backend did not report, publish its state if silent"""
+
+        self._reconcile = None
+        if self._task is not None or not self._unconfirmed:
+            return
+
+        state = self.session.data_raw
+        silent = state is self._state and state.version == self._version
+        self._unconfirmed.clear()
+        if silent:
+            logger.info("Backend did not confirm commands, publishing its state")
+            self._publish()
+
+    def _overlay(self) -> Effects:
+        """Expected changes of unconfirmed, in flight and queued commands"""
+
+        overlay: Effects = {}
+        pending = [*self._unconfirmed]
+        if self._current is not None:
+            pending.append(self._current.effects)
+        pending += (command.effects for command in self._queue)
+
+        for effects in pending:
+            for section, values in effects.items():
+                overlay.setdefault(section, {}).update(values)
+        return overlay
+
+    def _view(self) -> RawMediaInfo:
+        """Session state with expected effects of commands applied"""
+
+        state = self.session.data_raw
+        if state is not self._state or state.version != self._version:
+            # Backend reported since, its state replaces sent commands' effects
+            self._unconfirmed.clear()
+            self._state = state
+            self._version = state.version
+
+        if not (overlay := self._overlay()):
+            return state
+        return replace(
+            state,
+            **{
+                section: replace(getattr(state, section), **values)
+                for section, values in overlay.items()
+            },
+        )
+
+    def _publish(self) -> None:
+        """Publish expected state the way backends publish theirs"""
+
+        view = self._view()
+        if not (provider := view.provider):
+            return  # no session
+
+        self.session.bus.publish(view, PLAYBACK)
+        if provider in self.session.sessions:
+            self.session.sessions.publish(provider, view)
+
+    async def play(self) -> None:
+        await self.submit("play")
+
+    async def pause(self) -> None:
+        await self.submit("pause")
+
+    async def play_pause(self) -> None:
+        await self.submit("play_pause")
+
+    async def next(self) -> None:
+        await self.submit("next")
+
+    async def prev(self) -> None:
+        await self.submit("prev")
+
+    async def stop(self) -> None:
+        await self.submit("stop")
+
+    async def seek_percentage(self, percentage: float) -> None:
+        await self.submit(_SEEK, percentage)
+
+
+def _effects(name: str, args: tuple[Any, ...], state: RawMediaInfo) -> Effects:
+    """Expected changes of `state` by a command"""
+
+    if not state.provider:
+        return {}  # no session
+
+    now = time()
+    position = state.position(now)
+
+    if name == _SEEK:
+        duration = state.timeline_properties.end_time
+        position = int(duration * min(max(args[0], 0), 100) / 100)
+        effects: Effects = {}
+    elif name in _PLAYBACK:
+        if name == "play_pause":
+            name = "pause" if state.playing else "play"
+        if name == "stop":
+            position = 0
+        effects = {"playback_info": {"playback_status": _STATUS[name]}}
+    else:
+        return {}  # unknown outcome, wait for the backend
+
+    effects["timeline_properties"] = {"position": position, "last_updated_time": now}
+    return effects
+
+
+def _absorb(command: _Command, previous: _Command) -> None:
+    """Merge `previous` into `command`, which replaces it in the queue"""
+
+    command.waiters[:0] = previous.waiters
+    effects = {section: dict(values) for section, values in previous.effects.items()}
+    for section, values in command.effects.items():
+        effects.setdefault(section, {}).update(values)
+    command.effects = effects
+
+
+def _resolve(waiters: list[asyncio.Future[None]]) -> None:
+    for waiter in waiters:
+        if not waiter.done():
+            waiter.set_result(None)
@@ -0,0 +1,208 @@
+"""
+Serialization of MediaInfo to bytes
+
+JSON is encoded with `orjson` or `msgspec` if installed, else with the
+standard library. MessagePack (for IPC consumers) uses `msgpack` if
+installed, else a small built-in encoder.
+
+Fields are read in precomputed order without copying, and the inline cover
+is not passed through the encoder: its encoded form is cached on the
+`CoverEntry` and spliced into the output.
+"""
+
+__all__ = ["encode_json", "encode_msgpack", "dumps", "JSON_BACKEND"]
+
+import json
+import struct
+from typing import Any, Callable, Optional
+
+from .datastructures import CoverMode, MediaInfo, _MEDIA_INFO_FIELDS
+
+JSON_BACKEND: str
+"""Name of the JSON encoder in use: orjson, msgspec or json"""
+
+try:
+    import orjson
+
+    JSON_BACKEND = "orjson"
+
+    def _dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)  # pylint: disable=no-member
+
+    def _dumps_indent(obj: Any) -> bytes:
+        # pylint: disable-next=no-member
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+
+except ImportError:
+    try:
+        import msgspec
+
+        JSON_BACKEND = "msgspec"
+
+        def _dumps(obj: Any) -> bytes:
+            return msgspec.json.encode(obj)
+
+        def _dumps_indent(obj: Any) -> bytes:
+            return msgspec.json.format(msgspec.json.encode(obj), indent=2)
+
+    except ImportError:
+        JSON_BACKEND = "json"
+
+        def _dumps(obj: Any) -> bytes:
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+        def _dumps_indent(obj: Any) -> bytes:
+            return json.dumps(obj, ensure_ascii=False, indent=2).encode()
+
+
+def dumps(obj: Any, indent: Optional[str] = None) -> bytes:
+    """UTF-8 JSON of `obj` with the fastest available encoder
+
+    Compact unless `indent` is set. Indents other than two spaces use the
+    standard library encoder.
+    """
+
+    if indent is None:
+        return _dumps(obj)
+    if indent == "  ":
+        return _dumps_indent(obj)
+    return json.dumps(obj, ensure_ascii=False, indent=indent).encode()
+
+
+def _fields(info: MediaInfo, cover: CoverMode) -> tuple[dict[str, Any], bytes]:
+    """Fields except the inline cover, and the encoded inline cover"""
+
+    result = {f: getattr(info, f) for f in _MEDIA_INFO_FIELDS}
+
+    if cover == "inline":
+        if info.cover_ref is None:
+            return result, b'""'
+        return result, info.cover_ref.b64_json
+    if cover == "hash":
+        result["cover_hash"] = info.cover_ref and info.cover_ref.key
+    elif cover == "url":
+        cover_ref = info.cover_ref
+        result["cover_url"] = cover_ref.file_url() if cover_ref else info.cover
+    else:
+        raise ValueError(f"Unknown cover mode: {cover!r}")
+    return result, b""
+
+
+def encode_json(
+    info: MediaInfo, cover: CoverMode = "inline", indent: Optional[str] = None
+) -> bytes:
+    """UTF-8 JSON of `info`, same structure as `MediaInfo.as_dict(cover)`
+
+    Formatted like `dumps(..., indent)`.
+    """
+
+    fields, cover_data = _fields(info, cover)
+    encoded = dumps(fields, indent)
+
+    if not cover_data:
+        return encoded
+    if indent is None:
+        return b"".join((encoded[:-1], b',"cover_data":', cover_data, b"}"))
+    # Closing brace is preceded by a newline
+    item = f',\n{indent}"cover_data": '.encode()
+    return b"".join((encoded[:-2], item, cover_data, b"\n}"))
+
+
+#
+# MessagePack
+#
+
+_msgpack_packb: Optional[Callable[[Any], bytes]]
+
+try:
+    import msgpack
+
+    _msgpack_packb = msgpack.packb
+except ImportError:
+    _msgpack_packb = None
+
+
+def _pack_str(value: str) -> bytes:
+    data = value.encode("utf-8")
+    n = len(data)
+    if n < 32:
+        return bytes((0xA0 | n,)) + data
+    if n < 1 << 8:
+        return b"\xd9" + bytes((n,)) + data
+    if n < 1 << 16:
+        return b"\xda" + struct.pack(">H", n) + data
+    return b"\xdb" + struct.pack(">I", n) + data
+
+
+def _pack_bin_header(n: int) -> bytes:
+    if n < 1 << 8:
+        return b"\xc4" + bytes((n,))
+    if n < 1 << 16:
+        return b"\xc5" + struct.pack(">H", n)
+    return b"\xc6" + struct.pack(">I", n)
+
+
+def _pack_int(value: int) -> bytes:
+    if 0 <= value < 128:
+        return bytes((value,))
+    if -32 <= value < 0:
+        return struct.pack(">b", value)
+    if value < 0:
+        return b"\xd3" + struct.pack(">q", value)
+    return b"\xcf" + struct.pack(">Q", value)
+
+
+def _pack(value: Any) -> bytes:
+    """Encode the value types of `MediaInfo` fields"""
+
+    if value is None:
+        return b"\xc0"
+    if value is True:
+        return b"\xc3"
+    if value is False:
+        return b"\xc2"
+    if isinstance(value, int):
+        return _pack_int(value)
+    if isinstance(value, float):
+        return b"\xcb" + struct.pack(">d", value)
+    if isinstance(value, str):
+        return _pack_str(value)
+    if isinstance(value, (bytes, memoryview)):
+        return _pack_bin_header(len(value)) + bytes(value)
+    if isinstance(value, (list, tuple)):
+        n = len(value)
+        header = bytes((0x90 | n,)) if n < 16 else b"\xdc" + struct.pack(">H", n)
+        return header + b"".join(map(_pack, value))
+    if isinstance(value, dict):
+        n = len(value)
+        header = bytes((0x80 | n,)) if n < 16 else b"\xde" + struct.pack(">H", n)
+        return header + b"".join(_pack(k) + _pack(v) for k, v in value.items())
+    raise TypeError(f"Cannot encode {type(value).__name__} to MessagePack")
+
+
+_PACKED_KEYS = {f: _pack_str(f) for f in (*_MEDIA_INFO_FIELDS, "cover_data")}
+
+
+def encode_msgpack(info: MediaInfo, cover: CoverMode = "inline") -> bytes:
+    """MessagePack map of `info`, same keys as `MediaInfo.as_dict(cover)`
+
+    Inline cover is sent as raw image bytes (`bin`), not base64.
+    """
+
+    if cover == "inline":
+        fields = {f: getattr(info, f) for f in _MEDIA_INFO_FIELDS}
+        fields["cover_data"] = b"" if info.cover_ref is None else info.cover_ref.raw
+    else:
+        fields, _ = _fields(info, cover)
+
+    if _msgpack_packb is not None:
+        return _msgpack_packb(fields)
+
+    parts = [bytes((0x80 | len(fields),))]
+    for key, value in fields.items():
+        parts.append(_PACKED_KEYS.get(key) or _pack_str(key))
+        if isinstance(value, bytes):  # cover, appended without copying
+            parts += (_pack_bin_header(len(value)), value)
+        else:
+            parts.append(_pack(value))
+    return b"".join(parts)
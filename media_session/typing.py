@@ -1,9 +1,17 @@
 """Internal types"""
 
-__all__ = ["MediaSessionUpdateCallback"]
+__all__ = ["MediaSessionUpdateCallback", "SessionUpdateCallback", "UpdateMode"]
 
-from typing import Any, Callable, TypeAlias
+from typing import Any, Callable, Literal, Optional, TypeAlias
 
 from media_session.datastructures import MediaInfo
 
-MediaSessionUpdateCallback: TypeAlias = Callable[[MediaInfo], Any]
+MediaSessionUpdateCallback: TypeAlias = Callable[[MediaInfo], Any] | Callable[
+    [dict[str, Any]], Any
+]
+"""Receives `MediaInfo` or a dict of changed fields, depending on `UpdateMode`"""
+
+UpdateMode: TypeAlias = Literal["full", "delta"]
+
+SessionUpdateCallback: TypeAlias = Callable[[str, Optional[MediaInfo]], Any]
+"""Receives provider id and its `MediaInfo` (None when session is gone)"""
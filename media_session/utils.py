@@ -1,15 +1,34 @@
-__all__ = ["write_file", "read_file", "read_file_bytes", "async_callback"]
+from __future__ import annotations
 
-import asyncio
-from typing import Any, Callable, Coroutine, ParamSpec, TypeVar
+__all__ = [
+    "write_file",
+    "write_file_atomic",
+    "read_file",
+    "read_file_bytes",
+    "async_callback",
+    "RefreshCallback",
+    "compute_position",
+    "Ticker",
+]
 
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Coroutine, Optional, ParamSpec
 
-def write_file(filename: str, contents: str | bytes) -> None:
-    """Write contents to a file"""
+# asyncio and tempfile are imported where used to keep package import fast
+if TYPE_CHECKING:
+    import asyncio
+
+logger = logging.getLogger(__name__)
+
+
+def write_file(filename: str, contents: str | bytes | memoryview) -> None:
+    """Write contents to a file, bytes-like objects are written without copying"""
     if isinstance(contents, str):
         with open(filename, "w", encoding="utf-8") as f:
             f.write(contents)
-    elif isinstance(contents, bytes):  # type: ignore
+    elif isinstance(contents, (bytes, bytearray, memoryview)):  # type: ignore
         with open(filename, "wb") as f:
             f.write(contents)
     else:
@@ -18,6 +37,27 @@ def write_file(filename: str, contents: str | bytes) -> None:
         )
 
 
+def write_file_atomic(filename: str, contents: str | bytes | memoryview) -> None:
+    """Write contents to a temporary file and rename it over `filename`
+
+    Readers never see a partially written file.
+    """
+    import tempfile
+
+    if isinstance(contents, str):
+        contents = contents.encode("utf-8")
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(contents)
+        os.replace(tmp, filename)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
 def read_file(filename: str) -> str:
     """Read a file"""
     with open(filename, "r", encoding="utf-8") as f:
@@ -31,13 +71,152 @@ def read_file_bytes(filename: str) -> bytes:
 
 
 P = ParamSpec("P")
-RT = TypeVar("RT")
 
 
-def async_callback(callback: Callable[P, Coroutine[Any, Any, RT]]) -> Callable[P, RT]:
-    """Use async function as regular sync callback"""
+class RefreshCallback:
+    """Sync event handler that runs async `refresh` on `loop`
+
+    For handlers that re-read the whole state: event arguments are not
+    passed, so calls are coalesced. While a run is scheduled, further calls
+    are dropped, and calls made during a run schedule exactly one more run.
+    Safe to call from any thread.
+    """
+
+    __slots__ = ("refresh", "loop", "runs", "_lock", "_scheduled", "_task", "_again")
+
+    def __init__(
+        self,
+        refresh: Callable[[], Coroutine[Any, Any, Any]],
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> None:
+        import asyncio
+
+        self.refresh = refresh
+        self.loop = loop or asyncio.get_running_loop()
+        self.runs = 0
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self._task: Optional[asyncio.Task[Any]] = None
+        self._again = False
+
+    def __call__(self, *_event: Any) -> None:
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.loop.call_soon_threadsafe(self._start)
+
+    def _start(self) -> None:
+        with self._lock:
+            self._scheduled = False
+
+        if self._task is not None:
+            self._again = True
+            return
+
+        self.runs += 1
+        self._task = self.loop.create_task(self.refresh())
+        self._task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task[Any]) -> None:
+        self._task = None
+        _log_failure(task)
+
+        if self._again:
+            self._again = False
+            self._start()
+
+
+# Running tasks of `async_callback`, referenced until done
+_tasks: set[asyncio.Task[Any]] = set()
 
-    def f(*args: P.args, **kwargs: P.kwargs) -> RT:
-        return asyncio.run(callback(*args, **kwargs))
+
+def async_callback(
+    callback: Callable[P, Coroutine[Any, Any, Any]],
+    loop: Optional[asyncio.AbstractEventLoop] = None,
+) -> Callable[P, None]:
+    """Use async function as regular sync callback
+
+    Every call runs `callback` with its arguments on `loop` (running loop
+    by default) instead of a new event loop per call. Safe to call from any
+    thread.
+    """
+
+    import asyncio
+
+    loop = loop or asyncio.get_running_loop()
+
+    def start(coro: Coroutine[Any, Any, Any]) -> None:
+        task = loop.create_task(coro)
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+        task.add_done_callback(_log_failure)
+
+    def f(*args: P.args, **kwargs: P.kwargs) -> None:
+        loop.call_soon_threadsafe(start, callback(*args, **kwargs))
 
     return f
+
+
+def _log_failure(task: asyncio.Task[Any]) -> None:
+    if not task.cancelled() and (e := task.exception()) is not None:
+        logger.error("Callback %r failed", task.get_coro(), exc_info=e)
+
+
+def compute_position(
+    position: int,
+    last_updated_time: float,
+    playback_rate: float,
+    now: float,
+    duration: int = 0,
+) -> int:
+    """Extrapolate playback position (microseconds) to time `now` (seconds)
+
+    Clamped to `duration` if it is set.
+    """
+
+    position += int(playback_rate * (now - last_updated_time) * 1_000_000)
+
+    if duration:
+        return min(position, duration)
+    return position
+
+
+class Ticker:
+    """Call `callback` every 1 / `rate` seconds on `loop` while running
+
+    Schedules wakeups only when running, so a stopped ticker costs nothing.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[], Any],
+        rate: float,
+        loop: asyncio.AbstractEventLoop,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError(f"Tick rate must be positive, got {rate}")
+
+        self.callback = callback
+        self.interval = 1 / rate
+        self._loop = loop
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def running(self) -> bool:
+        return self._handle is not None
+
+    def set_running(self, running: bool) -> None:
+        """Start or stop ticking. Can be called from any thread"""
+        self._loop.call_soon_threadsafe(self._set_running, running)
+
+    def _set_running(self, running: bool) -> None:
+        if running and self._handle is None:
+            self._handle = self._loop.call_later(self.interval, self._tick)
+        elif not running and self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _tick(self) -> None:
+        self._handle = self._loop.call_later(self.interval, self._tick)
+        self.callback()
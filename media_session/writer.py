@@ -0,0 +1,108 @@
+"""
+Debounced writer of MediaInfo to a JSON file
+"""
+
+__all__ = ["JsonFileWriter"]
+
+import asyncio
+import logging
+import os
+import threading
+from typing import Optional
+
+from .cover_cache import MIME_EXTENSIONS
+from .datastructures import MediaInfo
+from .serialize import dumps, encode_json
+from .utils import write_file_atomic
+
+logger = logging.getLogger(__name__)
+
+
+class JsonFileWriter:
+    """Write `MediaInfo` updates to a JSON file
+
+    Updates within `debounce` seconds are coalesced into one write of the
+    latest data, unchanged payloads are not written, and files are replaced
+    atomically. With `cover_file=True` the cover is written to a sibling file
+    (`<name>.cover.<ext>`) instead of being inlined as base64.
+
+    Can be used as a session callback from any thread. Updates are written
+    immediately until `loop` used for scheduling is set.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        debounce: float = 0.25,
+        cover_file: bool = False,
+        indent: Optional[str] = "  ",
+    ) -> None:
+        self.path = path
+        self.debounce = debounce
+        self.cover_file = cover_file
+        self.indent = indent
+        self.loop = loop
+        self._lock = threading.Lock()
+        self._pending: Optional[MediaInfo] = None
+        self._scheduled = False
+        self._last_payload: Optional[bytes] = None
+        self._last_cover: Optional[str] = None
+
+    def __call__(self, data: MediaInfo) -> None:
+        with self._lock:
+            self._pending = data
+            if self._scheduled:
+                return
+            self._scheduled = True
+
+        if self.loop is None:
+            self.flush()
+        else:
+            self.loop.call_soon_threadsafe(
+                self.loop.call_later, self.debounce, self.flush
+            )
+
+    def flush(self) -> None:
+        """Write pending data now"""
+
+        with self._lock:
+            data = self._pending
+            self._pending = None
+            self._scheduled = False
+
+        if data is None:
+            return
+
+        try:
+            self._write(data)
+        except OSError as e:
+            logger.error("Cannot write %s: %s", self.path, e)
+
+    def _write(self, data: MediaInfo) -> None:
+        if self.cover_file:
+            info = data.as_dict(cover="hash")
+            info["cover_file"] = self._write_cover(data)
+            payload = dumps(info, self.indent)
+        else:
+            payload = encode_json(data, indent=self.indent)
+
+        if payload == self._last_payload:
+            return
+
+        write_file_atomic(self.path, payload)
+        self._last_payload = payload
+
+    def _write_cover(self, data: MediaInfo) -> str:
+        cover = data.cover_ref
+
+        if cover is None:
+            return ""
+
+        path = f"{os.path.splitext(self.path)[0]}.cover.{MIME_EXTENSIONS[cover.mime]}"
+
+        if cover.key != self._last_cover:
+            write_file_atomic(path, cover.memoryview())
+            self._last_cover = cover.key
+
+        return path
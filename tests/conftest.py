@@ -0,0 +1,23 @@
+import shutil
+from typing import Iterator
+
+import pytest
+
+from media_session.dbus_daemon import DBusDaemon
+
+
+@pytest.fixture
+def dbus_daemon() -> Iterator[DBusDaemon]:
+    """Private session bus, skips the test if dbus-daemon is missing"""
+
+    if shutil.which("dbus-daemon") is None:
+        pytest.skip("dbus-daemon not found")
+
+    with DBusDaemon() as daemon:
+        yield daemon
+
+
+@pytest.fixture
+def bus_address(dbus_daemon: DBusDaemon) -> str:
+    assert dbus_daemon.address is not None
+    return dbus_daemon.address
@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+
+from media_session.bus import METADATA, POSITION, UpdateBus
+from media_session.datastructures import MediaInfo, RawMediaInfo
+
+
+def _publish(bus: UpdateBus, state: RawMediaInfo, title: str) -> None:
+    state.update("media_properties", {"title": title})
+    bus.publish(state)
+
+
+def test_immediate_delivery_supersedes_pending() -> None:
+    async def main() -> list[str]:
+        got: list[str] = []
+        bus = UpdateBus(asyncio.get_running_loop())
+        bus.subscribe(lambda data: got.append(data.title), max_rate=10)
+        state = RawMediaInfo()
+
+        _publish(bus, state, "A")  # delivered
+        _publish(bus, state, "B")  # pending until the interval passes
+        await asyncio.sleep(0)  # timer scheduled
+        time.sleep(0.12)  # loop busy, timer not run yet
+        _publish(bus, state, "C")  # interval passed, delivered now
+        await asyncio.sleep(0.15)
+        return got
+
+    assert asyncio.run(main()) == ["A", "C"]
+
+
+def test_pending_before_attach_is_delivered() -> None:
+    async def main(bus: UpdateBus) -> None:
+        bus.attach(asyncio.get_running_loop())
+        await asyncio.sleep(0.15)
+
+    got: list[MediaInfo] = []
+    bus = UpdateBus()
+    bus.subscribe(got.append, max_rate=10)
+    state = RawMediaInfo()
+
+    _publish(bus, state, "A")
+    _publish(bus, state, "B")  # no loop to schedule it yet
+    asyncio.run(main(bus))
+
+    assert [data.title for data in got] == ["A", "B"]
+
+
+def test_ticks_are_per_subscription() -> None:
+    async def main() -> None:
+        ticking: list[int] = []
+        other: list[int] = []
+        bus = UpdateBus(asyncio.get_running_loop())
+        bus.subscribe(lambda data: ticking.append(data.position), tick_rate=50)
+        bus.subscribe(lambda data: other.append(data.position))
+        state = RawMediaInfo()
+        state.update("timeline_properties", {"last_updated_time": time.time()})
+
+        state.update("playback_info", {"playback_status": "playing"})
+        bus.publish(state)
+        await asyncio.sleep(0.12)
+        assert len(ticking) >= 4
+        assert ticking == sorted(ticking)  # extrapolated position moves
+        assert len(other) == 1
+
+        state.update("playback_info", {"playback_status": "paused"})
+        bus.publish(state)
+        await asyncio.sleep(0)
+        count = len(ticking)
+        await asyncio.sleep(0.06)
+        assert len(ticking) == count
+
+    asyncio.run(main())
+
+
+def test_ticks_of_subscription_added_while_playing() -> None:
+    async def main() -> None:
+        got: list[MediaInfo] = []
+        bus = UpdateBus(asyncio.get_running_loop())
+        state = RawMediaInfo()
+        state.update("playback_info", {"playback_status": "playing"})
+        bus.publish(state)
+
+        subscription = bus.subscribe(got.append, POSITION, tick_rate=50)
+        await asyncio.sleep(0.07)
+        assert got
+
+        bus.unsubscribe(subscription)
+        await asyncio.sleep(0)
+        count = len(got)
+        await asyncio.sleep(0.05)
+        assert len(got) == count
+
+    asyncio.run(main())
+
+
+def test_ticks_need_position() -> None:
+    bus = UpdateBus()
+    with pytest.raises(ValueError):
+        bus.subscribe(print, METADATA, tick_rate=1)
+    with pytest.raises(ValueError):
+        bus.subscribe(print, tick_rate=0)
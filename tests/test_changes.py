@@ -0,0 +1,52 @@
+from dataclasses import replace
+
+from media_session.bus import METADATA, UpdateBus
+from media_session.changes import FIELDS, diff
+from media_session.datastructures import MediaInfo, RawMediaInfo
+
+SONG = MediaInfo(title="Song", artist="Artist", genres=("Rock",), state="playing")
+
+
+def test_first_diff_has_all_fields() -> None:
+    assert diff(None, SONG) == {f: getattr(SONG, f) for f in FIELDS}
+    assert diff(None, SONG, ("title", "state")) == {
+        "title": "Song",
+        "state": "playing",
+    }
+
+
+def test_diff_has_only_changed_fields() -> None:
+    assert diff(SONG, SONG) == {}
+    assert diff(SONG, replace(SONG)) == {}
+
+    new = replace(SONG, title="Other", position=5, genres=("Rock", "Pop"))
+    assert diff(SONG, new) == {
+        "title": "Other",
+        "position": 5,
+        "genres": ("Rock", "Pop"),
+    }
+    assert diff(SONG, new, ("artist", "position")) == {"position": 5}
+    assert diff(SONG, new, ()) == {}
+
+
+def test_diff_does_not_copy_values() -> None:
+    new = replace(SONG, genres=("Rock", "Pop"))
+    assert diff(SONG, new)["genres"] is new.genres
+
+
+def test_delta_mode_delivers_changes() -> None:
+    got: list[dict[str, object]] = []
+    bus = UpdateBus()
+    bus.subscribe(got.append, METADATA, mode="delta")
+    state = RawMediaInfo()
+
+    state.update("media_properties", {"title": "Song", "artist": "Artist"})
+    bus.publish(state)
+    state.update("media_properties", {"title": "Other"})
+    bus.publish(state)
+    state.update("playback_info", {"playback_status": "paused"})
+    bus.publish(state)  # no subscribed field changed
+
+    assert got[0].keys() == METADATA
+    assert (got[0]["title"], got[0]["artist"]) == ("Song", "Artist")
+    assert got[1:] == [{"title": "Other"}]
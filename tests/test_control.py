@@ -0,0 +1,80 @@
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+from media_session.control import ControlServer
+
+
+class _Session:
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+
+    async def play(self) -> None:
+        self.calls.append("play")
+
+
+async def _talk(server: ControlServer, data: bytes) -> list[bytes]:
+    """Send `data` to `server` on a free port, read responses until EOF"""
+
+    server.port = 0
+    await server.start()
+    try:
+        assert server._server is not None
+        port = server._server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection(server.host, port)
+        writer.write(data)
+        lines = []
+        while len(lines) < data.count(b"\n") and (line := await reader.readline()):
+            lines.append(line)
+        writer.close()
+        return lines
+    finally:
+        await server.close()
+
+
+def test_refuses_to_remove_regular_file(tmp_path: Path) -> None:
+    path = tmp_path / "control"
+    path.write_text("data")
+
+    with pytest.raises(FileExistsError):
+        asyncio.run(ControlServer(_Session(), path=str(path)).start())
+    assert path.read_text() == "data"
+
+
+def test_removes_socket_on_close(tmp_path: Path) -> None:
+    path = str(tmp_path / "control.sock")
+
+    async def main() -> None:
+        server = ControlServer(_Session(), path=path)
+        await server.start()
+        assert os.path.exists(path)
+        await server.close()
+
+    asyncio.run(main())
+    assert not os.path.exists(path)
+
+
+def test_http_request_is_rejected() -> None:
+    session = _Session()
+    request = b"POST / HTTP/1.1\r\nHost: localhost\r\n\r\nplay\n"
+
+    assert asyncio.run(_talk(ControlServer(session), request)) == []
+    assert session.calls == []
+
+
+@pytest.mark.parametrize(
+    "request_, responses, calls",
+    [
+        (b"play\nplay\n", [b"error: unauthorized\n"], []),
+        (b"auth wrong\nplay\n", [b"error: unauthorized\n"], []),
+        (b"auth secret\nplay\n", [b"ok\n", b"ok\n"], ["play"]),
+    ],
+)
+def test_token(request_: bytes, responses: list[bytes], calls: list[str]) -> None:
+    session = _Session()
+    server = ControlServer(session, token="secret")
+
+    assert asyncio.run(_talk(server, request_)) == responses
+    assert session.calls == calls
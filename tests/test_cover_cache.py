@@ -0,0 +1,86 @@
+import asyncio
+import os
+from pathlib import Path
+
+from media_session.cover_cache import (
+    CHUNK_SIZE,
+    INLINE_FILE_BYTES,
+    CoverCache,
+    CoverReader,
+)
+
+PNG = b"\x89PNG\r\n\x1a\n"
+
+
+def _ingest(reader: CoverReader, data: bytes) -> int:
+    """Write `data` in chunks until the reader stops, returns chunks written"""
+
+    chunks = 0
+    for i in range(0, len(data), CHUNK_SIZE):
+        chunks += 1
+        if not reader.write(data[i : i + CHUNK_SIZE]):
+            break
+    return chunks
+
+
+def test_reader_stops_at_known_cover(tmp_path: Path) -> None:
+    cache = CoverCache(str(tmp_path))
+    data = PNG + os.urandom(4 * CHUNK_SIZE)
+
+    first = cache.reader(len(data), source="track")
+    assert _ingest(first, data) == 5
+    entry = first.finish()
+    assert entry is not None
+
+    second = cache.reader(len(data), source="track")
+    assert _ingest(second, data) == 1
+    assert second.done and not second.aborted
+    assert second.finish() is entry
+
+
+def test_reader_hashes_whole_cover_of_other_source(tmp_path: Path) -> None:
+    cache = CoverCache(str(tmp_path))
+    start = PNG + os.urandom(2 * CHUNK_SIZE)  # e.g. same encoder and metadata
+    covers = [start + os.urandom(CHUNK_SIZE) for _ in range(3)]
+
+    entries = []
+    for cover, source in zip(covers, ("a", "b", None)):
+        reader = cache.reader(len(cover), source)
+        assert _ingest(reader, cover) == 4
+        entries.append(reader.finish())
+
+    assert [entry and entry.raw for entry in entries] == covers
+
+
+def test_reader_aborts_too_large(tmp_path: Path) -> None:
+    cache = CoverCache(str(tmp_path), max_cover_bytes=CHUNK_SIZE)
+    reader = cache.reader()
+
+    assert _ingest(reader, os.urandom(2 * CHUNK_SIZE)) == 2
+    assert reader.aborted
+    assert reader.finish() is None
+
+
+def test_put_file_async(tmp_path: Path) -> None:
+    cache = CoverCache(str(tmp_path / "cache"))
+    path = tmp_path / "cover.png"
+    path.write_bytes(PNG + os.urandom(INLINE_FILE_BYTES))
+
+    entry = asyncio.run(cache.put_file_async(path.as_uri()))
+    assert entry is not None
+    assert entry.raw == path.read_bytes()
+    assert cache.cached_file(str(path)) is entry
+    assert cache.put_file(str(path)) is entry
+
+
+def test_file_is_written_on_request(tmp_path: Path) -> None:
+    cache = CoverCache(str(tmp_path))
+    entry = cache.put(PNG)
+
+    assert entry.path is None
+    assert not os.listdir(tmp_path)
+
+    path = entry.ensure_file()
+    assert entry.path == path
+    assert Path(path).read_bytes() == PNG
+    assert entry.file_url().startswith("file://")
@@ -0,0 +1,102 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable
+
+import pytest
+
+from media_session.bus import COVER, UpdateBus
+from media_session.cover_cache import CoverCache, CoverEntry
+from media_session.cover_variants import CoverProcessor, CoverVariant
+from media_session.datastructures import MediaInfo, RawMediaInfo
+
+Image = pytest.importorskip("PIL.Image")
+
+
+class _CountingExecutor(ThreadPoolExecutor):
+    def __init__(self) -> None:
+        super().__init__(max_workers=1)
+        self.submitted = 0
+
+    def submit(  # type: ignore[override]
+        self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any
+    ) -> Future[Any]:
+        self.submitted += 1
+        return super().submit(fn, *args, **kwargs)
+
+
+def _png(size: int) -> bytes:
+    image = Image.effect_noise((size, size), 64).convert("RGB")
+    out = BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+def test_variant_is_rendered(tmp_path: Path) -> None:
+    cache = CoverCache(str(tmp_path))
+    processor = CoverProcessor(cache)
+    cover = cache.put(_png(256))
+    variant = CoverVariant(64, "png")
+
+    assert processor.get(cover, variant) is None
+    entry = asyncio.run(processor.derive(cover, variant))
+
+    assert entry is not cover and entry.size < cover.size
+    with Image.open(BytesIO(entry.raw)) as image:
+        assert image.format == "PNG"
+        assert max(image.size) == 64
+    assert processor.get(cover, variant) is entry
+
+
+def test_original_is_used_if_not_renderable(tmp_path: Path) -> None:
+    cache = CoverCache(str(tmp_path), max_entries=1)
+    processor = CoverProcessor(cache)
+    cover = cache.put(b"not an image")
+    variant = CoverVariant(64)
+
+    assert asyncio.run(processor.derive(cover, variant)) is cover
+
+    cache.put(_png(8))  # evicts the original
+    assert cover.key not in cache
+    assert processor.get(cover, variant) is cover
+
+
+def test_concurrent_derive_renders_once(tmp_path: Path) -> None:
+    cache = CoverCache(str(tmp_path))
+    with _CountingExecutor() as executor:
+        processor = CoverProcessor(cache, executor)
+        cover = cache.put(_png(256))
+
+        async def main() -> list[CoverEntry]:
+            return await asyncio.gather(
+                *(processor.derive(cover, CoverVariant(64)) for _ in range(3))
+            )
+
+        first, *rest = asyncio.run(main())
+
+    assert executor.submitted == 1
+    assert all(entry is first for entry in rest)
+
+
+def test_bus_renders_evicted_original_once(tmp_path: Path) -> None:
+    cache = CoverCache(str(tmp_path), max_entries=1)
+    with _CountingExecutor() as executor:
+        processor = CoverProcessor(cache, executor)
+        cover = cache.put(b"not an image")
+        got: list[MediaInfo] = []
+
+        async def main() -> None:
+            bus = UpdateBus(asyncio.get_running_loop(), processor)
+            bus.subscribe(got.append, COVER, cover=CoverVariant(64))
+            state = RawMediaInfo(provider="player")
+            state.update("media_properties", {"thumbnail_ref": cover})
+
+            bus.publish(state)
+            cache.put(_png(8))  # evicts the original while it is rendered
+            await asyncio.sleep(0.2)
+
+        asyncio.run(main())
+
+    assert executor.submitted == 1
+    assert [data.cover_ref for data in got] == [None, cover]
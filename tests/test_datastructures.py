@@ -0,0 +1,45 @@
+from media_session.datastructures import RawMediaInfo
+
+
+def test_version_bumps_only_on_changes() -> None:
+    state = RawMediaInfo()
+
+    assert state.update("media_properties", {"title": "Song", "artist": "Artist"})
+    assert state.version == 1
+
+    assert not state.update("media_properties", {"title": "Song"})
+    assert not state.update("playback_info", {})
+    assert not state.set_provider("")
+    assert state.version == 1
+
+    assert state.update("media_properties", {"title": "Other", "artist": "Artist"})
+    assert state.set_provider("player")
+    assert state.version == 3
+
+
+def test_snapshot_is_reused_until_changed() -> None:
+    state = RawMediaInfo()
+    state.update("media_properties", {"title": "Song"})
+    state.update("playback_info", {"playback_status": "paused"})
+
+    first = state.snapshot()
+    assert state.snapshot() is first
+
+    state.update("media_properties", {"title": "Song"})  # no change
+    assert state.snapshot() is first
+
+    state.update("media_properties", {"title": "Other"})
+    second = state.snapshot()
+    assert second is not first
+    assert (first.title, second.title) == ("Song", "Other")
+    assert state.snapshot() is second
+
+
+def test_snapshot_of_playing_state_is_rebuilt() -> None:
+    state = RawMediaInfo()
+    state.update("playback_info", {"playback_status": "playing"})
+
+    assert state.snapshot() is not state.snapshot()
+
+    state.update("playback_info", {"playback_status": "paused"})
+    assert state.snapshot() is state.snapshot()
@@ -0,0 +1,65 @@
+from typing import Optional
+
+from media_session.datastructures import MediaInfo, RawMediaInfo
+from media_session.manager import SessionManager
+from media_session.typing import SessionUpdateCallback
+
+Update = tuple[str, Optional[str]]
+
+
+def _state(title: str) -> RawMediaInfo:
+    state = RawMediaInfo(provider=title)
+    state.update("media_properties", {"title": title})
+    return state
+
+
+def _recorder(updates: list[Update]) -> SessionUpdateCallback:
+    def callback(provider: str, data: Optional[MediaInfo]) -> None:
+        updates.append((provider, data and data.title))
+
+    return callback
+
+
+def test_sessions_are_listed() -> None:
+    manager = SessionManager()
+    manager.publish("a", _state("A"))
+    manager.publish("b", _state("B"))
+
+    assert len(manager) == 2
+    assert "a" in manager and "c" not in manager
+    assert {p: d.title for p, d in manager.data.items()} == {"a": "A", "b": "B"}
+    assert manager.get("b") == MediaInfo(title="B")
+    assert manager.get("c") is None
+
+    manager.remove("a")
+    manager.remove("c")  # unknown, ignored
+    assert list(manager.data) == ["b"]
+
+
+def test_updates_reach_their_subscribers() -> None:
+    manager = SessionManager()
+    everything: list[Update] = []
+    only_a: list[Update] = []
+    manager.subscribe(_recorder(everything))
+    manager.subscribe(_recorder(only_a), "a")
+
+    manager.publish("a", _state("A"))
+    manager.publish("b", _state("B"))
+    manager.remove("a")
+    manager.remove("a")  # already gone, not delivered
+
+    assert everything == [("a", "A"), ("b", "B"), ("a", None)]
+    assert only_a == [("a", "A"), ("a", None)]
+
+
+def test_unsubscribe() -> None:
+    manager = SessionManager()
+    updates: list[Update] = []
+    unsubscribe = manager.subscribe(_recorder(updates), "a")
+
+    manager.publish("a", _state("A"))
+    unsubscribe()
+    unsubscribe()  # no-op
+    manager.publish("a", _state("A2"))
+
+    assert updates == [("a", "A")]
@@ -0,0 +1,175 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable
+
+import pytest
+
+from media_session.dbus_protocol import DBusConnection, DBusError
+from media_session.fake_player import FakePlayer, make_metadata
+from media_session.media_session_linux_async import MediaSessionLinuxAsync
+from media_session.mpris import (
+    METADATA_SCHEMA,
+    MPRIS_PREFIX,
+    decode_metadata,
+    decode_properties,
+)
+
+
+async def _until(condition: Callable[[], bool], timeout: float = 2.0) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        if loop.time() > deadline:
+            raise AssertionError("Condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+async def _player(address: str, name: str, **properties: object) -> FakePlayer:
+    tracks = [
+        make_metadata(f"/track/{n}", f"{name} {n}", length=60_000_000) for n in (0, 1)
+    ]
+    player = FakePlayer(await DBusConnection.connect(address), name, tracks)
+    player.update(**properties)
+    await player.register()
+    return player
+
+
+def test_decode_metadata_converts_types() -> None:
+    decoded = decode_metadata(
+        {
+            "mpris:length": 60_000_000.0,  # double instead of int64
+            "xesam:artist": "Artist",  # string instead of a list
+            "xesam:genre": ("Rock", "Pop"),
+            "xesam:trackNumber": "3",
+        }
+    )
+
+    assert decoded == {
+        "mpris:length": 60_000_000,
+        "xesam:artist": ["Artist"],
+        "xesam:genre": ["Rock", "Pop"],
+        "xesam:trackNumber": 3,
+    }
+    assert type(decoded["mpris:length"]) is int
+
+
+def test_decode_metadata_drops_unknown_and_invalid_keys() -> None:
+    decoded = decode_metadata(
+        {
+            "xesam:title": "Title",
+            "xesam:comment": ["not decoded"],
+            "xesam:asText": "lyrics",
+            "xesam:trackNumber": "first",
+            "xesam:discNumber": None,
+        }
+    )
+
+    assert decoded == {"xesam:title": "Title"}
+    assert decoded.keys() <= METADATA_SCHEMA.keys()
+
+
+def test_decode_properties_decodes_only_metadata() -> None:
+    decoded = decode_properties(
+        {"Metadata": {"mpris:length": 1.0, "x": 1}, "Rate": 1}, float
+    )
+    assert decoded == {"Metadata": {"mpris:length": 1}, "Rate": 1.0}
+
+
+@asynccontextmanager
+async def _session(address: str) -> AsyncIterator[MediaSessionLinuxAsync]:
+    session = MediaSessionLinuxAsync(bus_address=address)
+    await session.load()
+    task = asyncio.create_task(session.loop())
+    try:
+        yield session
+    finally:
+        task.cancel()
+
+
+def test_playing_player_is_selected(bus_address: str) -> None:
+    async def main() -> None:
+        first = await _player(bus_address, "first")
+        second = await _player(bus_address, "second", PlaybackStatus="Playing")
+
+        async with _session(bus_address) as session:
+            names = {MPRIS_PREFIX + "first", MPRIS_PREFIX + "second"}
+            assert set(session.players) == names
+            assert session.player is not None
+            assert session.player.name == MPRIS_PREFIX + "second"
+            assert session.data.title == "second 0"
+
+            first.update(PlaybackStatus="Playing")  # most recently playing
+            await _until(lambda: session.data.title == "first 0")
+            assert session.player.name == MPRIS_PREFIX + "first"
+            assert second.calls == []
+
+    asyncio.run(main())
+
+
+def test_player_appears_and_disappears(bus_address: str) -> None:
+    async def main() -> None:
+        async with _session(bus_address) as session:
+            assert session.player is None
+
+            player = await _player(bus_address, "late", PlaybackStatus="Playing")
+            await _until(lambda: session.data.title == "late 0")
+            assert session.data.state == "playing"
+            assert MPRIS_PREFIX + "late" in session.sessions
+
+            await player.unregister()
+            await _until(lambda: session.player is None)
+            assert not session.players
+            assert session.data.title == ""
+
+    asyncio.run(main())
+
+
+def test_seeked(bus_address: str) -> None:
+    async def main() -> None:
+        player = await _player(bus_address, "seek")
+
+        async with _session(bus_address) as session:
+            player.seek_to(42_000_000)
+            await _until(lambda: session.position == 42_000_000)
+            assert session.data.position == 42_000_000
+
+    asyncio.run(main())
+
+
+def test_controls(bus_address: str) -> None:
+    async def main() -> None:
+        player = await _player(bus_address, "controls")
+
+        async with _session(bus_address) as session:
+            await session.play()
+            await _until(lambda: session.data.state == "playing")
+
+            await session.next()
+            await _until(lambda: session.data.title == "controls 1")
+
+            await session.seek_percentage(50)
+            await _until(lambda: abs(session.position - 30_000_000) < 1_000_000)
+
+            assert player.calls == [
+                ("Play",),
+                ("Next",),
+                ("SetPosition", "/track/1", 30_000_000),
+            ]
+
+    asyncio.run(main())
+
+
+def test_call_without_reply_times_out(bus_address: str) -> None:
+    async def main() -> None:
+        player = await _player(bus_address, "hung")
+        player.connection._handle_call = lambda _: None  # type: ignore[method-assign]
+        connection = await DBusConnection.connect(bus_address)
+
+        with pytest.raises(DBusError) as error:
+            await connection.call(
+                player.bus_name, "/", "org.freedesktop.DBus.Peer", "Ping", timeout=0.1
+            )
+        assert error.value.name == "org.freedesktop.DBus.Error.NoReply"
+        assert not connection._replies
+
+    asyncio.run(main())
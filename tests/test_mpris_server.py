@@ -0,0 +1,198 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from typing import Any, AsyncIterator, Callable
+
+import pytest
+
+from media_session.datastructures import MediaInfo
+from media_session.dbus_protocol import DBusConnection, DBusError, Message, Variant
+from media_session.media_session import MediaControlInterface
+from media_session.mpris import MPRIS_PATH, PLAYER_INTERFACE, PROPERTIES_INTERFACE
+from media_session.mpris_server import ROOT_INTERFACE, MediaSessionServer
+
+SONG = MediaInfo(title="Song", artist="Artist", duration=60_000_000, state="playing")
+
+
+class _Controls(MediaControlInterface):
+    """Records controls, `stop` is cancelled and `pause` fails"""
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[Any, ...]] = []
+
+    async def play(self) -> None:
+        self.calls.append(("play",))
+
+    async def pause(self) -> None:
+        raise RuntimeError("cannot pause")
+
+    async def play_pause(self) -> None:
+        self.calls.append(("play_pause",))
+
+    async def next(self) -> None:
+        self.calls.append(("next",))
+
+    async def prev(self) -> None:
+        self.calls.append(("prev",))
+
+    async def stop(self) -> None:
+        raise asyncio.CancelledError()
+
+    async def seek_percentage(self, percentage: float) -> None:
+        self.calls.append(("seek_percentage", percentage))
+
+
+class _Client:
+    """Calls the server and collects its signals"""
+
+    def __init__(self, connection: DBusConnection, server: MediaSessionServer) -> None:
+        self.connection = connection
+        self.server = server
+        self.signals: list[Message] = []
+        connection.add_signal_handler(self.signals.append)
+
+    async def call(
+        self, interface: str, member: str, signature: str = "", *args: Any
+    ) -> list[Any]:
+        return await self.connection.call(
+            self.server.bus_name, MPRIS_PATH, interface, member, signature, args
+        )
+
+    async def properties(self, interface: str = PLAYER_INTERFACE) -> dict[str, Any]:
+        (properties,) = await self.call(PROPERTIES_INTERFACE, "GetAll", "s", interface)
+        return properties
+
+
+@asynccontextmanager
+async def _serve(address: str, data: MediaInfo = SONG) -> AsyncIterator[_Client]:
+    server = MediaSessionServer(_Controls(), "test", bus_address=address)
+    server.set_data(data)
+    await server.start()
+    task = asyncio.create_task(server.serve_forever())
+
+    connection = await DBusConnection.connect(address)
+    await connection.add_match(type="signal", path=MPRIS_PATH)
+    try:
+        yield _Client(connection, server)
+    finally:
+        task.cancel()
+        connection.close()
+
+
+async def _until(condition: Callable[[], bool], timeout: float = 2.0) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        if loop.time() > deadline:
+            raise AssertionError("Condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+def test_properties(bus_address: str) -> None:
+    async def main() -> None:
+        async with _serve(bus_address) as client:
+            properties = await client.properties()
+            assert properties["PlaybackStatus"] == "Playing"
+            assert properties["Metadata"]["xesam:title"] == "Song"
+            assert properties["Metadata"]["xesam:artist"] == ["Artist"]
+            assert properties["Metadata"]["mpris:length"] == 60_000_000
+            assert properties["Metadata"]["mpris:trackid"].startswith(MPRIS_PATH)
+            assert properties["CanSeek"] and properties["CanControl"]
+            assert 0 <= properties["Position"] <= 1_000_000
+
+            root = await client.properties(ROOT_INTERFACE)
+            assert root["Identity"] == "test"
+
+            (status,) = await client.call(
+                PROPERTIES_INTERFACE, "Get", "ss", PLAYER_INTERFACE, "PlaybackStatus"
+            )
+            assert status == "Playing"
+
+            with pytest.raises(DBusError) as error:
+                await client.call(
+                    PROPERTIES_INTERFACE,
+                    "Set",
+                    "ssv",
+                    PLAYER_INTERFACE,
+                    "Rate",
+                    Variant("d", 2.0),
+                )
+            assert error.value.name == "org.freedesktop.DBus.Error.PropertyReadOnly"
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("rate, limits", [(2.0, (1.0, 2.0)), (0.5, (0.5, 1.0))])
+def test_rate_is_within_limits(
+    bus_address: str, rate: float, limits: tuple[float, float]
+) -> None:
+    async def main() -> None:
+        async with _serve(bus_address) as client:
+            client.server.set_data(SONG, rate)
+            properties = await client.properties()
+            assert properties["Rate"] == rate
+            assert (properties["MinimumRate"], properties["MaximumRate"]) == limits
+
+    asyncio.run(main())
+
+
+def test_controls(bus_address: str) -> None:
+    async def main() -> None:
+        async with _serve(bus_address) as client:
+            controls = client.server.controls
+            assert isinstance(controls, _Controls)
+            track_id = (await client.properties())["Metadata"]["mpris:trackid"]
+
+            await client.call(PLAYER_INTERFACE, "Play")
+            await client.call(PLAYER_INTERFACE, "Next")
+            for target in (track_id, "/stale"):
+                await client.call(
+                    PLAYER_INTERFACE, "SetPosition", "ox", target, 30_000_000
+                )
+
+            assert controls.calls == [("play",), ("next",), ("seek_percentage", 50)]
+
+    asyncio.run(main())
+
+
+def test_failed_and_cancelled_controls_are_answered(bus_address: str) -> None:
+    async def main() -> None:
+        async with _serve(bus_address) as client:
+            with pytest.raises(DBusError, match="cannot pause"):
+                await client.call(PLAYER_INTERFACE, "Pause")
+            with pytest.raises(DBusError, match="Cancelled"):
+                await client.call(PLAYER_INTERFACE, "Stop")
+
+            # Still serving
+            await client.call(PLAYER_INTERFACE, "Play")
+
+    asyncio.run(main())
+
+
+def test_changes_are_emitted(bus_address: str) -> None:
+    async def main() -> None:
+        async with _serve(bus_address) as client:
+            server = client.server
+
+            server.set_data(MediaInfo(title="Song", artist="Artist", state="paused"))
+            await _until(lambda: bool(client.signals))
+            changed = client.signals[-1]
+            assert changed.member == "PropertiesChanged"
+            interface, properties, _ = changed.body
+            assert interface == PLAYER_INTERFACE
+            assert properties.keys() == {"PlaybackStatus", "Metadata", "CanSeek"}
+            assert properties["PlaybackStatus"] == "Paused"
+
+            server.set_data(SONG)
+            server.set_data(SONG)  # nothing changed
+            await _until(lambda: len(client.signals) == 2)
+
+            server.set_data(replace(SONG, position=30_000_000))
+            await _until(lambda: len(client.signals) == 3)
+            seeked = client.signals[-1]
+            assert (seeked.member, seeked.body) == ("Seeked", [30_000_000])
+
+            await asyncio.sleep(0.05)
+            assert len(client.signals) == 3
+
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from media_session.push_server import PushServer
+
+
+async def _request(server: PushServer, data: bytes) -> bytes:
+    """Send `data` to `server` on a free port, read the response until EOF"""
+
+    server.port = 0
+    await server.start()
+    try:
+        assert server._server is not None
+        port = server._server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection(server.host, port)
+        writer.write(data)
+        response = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        return response
+    finally:
+        await server.close()
+
+
+def _get(path: str, *headers: str) -> bytes:
+    return "\r\n".join((f"GET {path} HTTP/1.1", *headers, "", "")).encode()
+
+
+WEBSOCKET = (
+    "Upgrade: websocket",
+    "Connection: Upgrade",
+    "Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==",
+)
+
+
+@pytest.mark.parametrize("path", ["/", "/events", "/ws", "/cover/x"])
+def test_foreign_origin_is_refused(path: str) -> None:
+    request = _get(path, "Origin: https://example.com", *WEBSOCKET)
+    response = asyncio.run(_request(PushServer(), request))
+
+    assert response.startswith(b"HTTP/1.1 403 ")
+
+
+def test_allowed_origin() -> None:
+    server = PushServer(allowed_origins=["http://localhost:3000"])
+    response = asyncio.run(_request(server, _get("/", "Origin: http://localhost:3000")))
+
+    assert response.startswith(b"HTTP/1.1 200 ")
+    assert b"Access-Control-Allow-Origin: http://localhost:3000\r\n" in response
+
+
+def test_no_origin() -> None:
+    response = asyncio.run(_request(PushServer(), _get("/")))
+
+    assert response.startswith(b"HTTP/1.1 200 ")
+    assert b"Access-Control-Allow-Origin" not in response
+
+
+def test_websocket_frame_too_big() -> None:
+    # Masked binary frame claiming a 2**40 byte payload
+    frame = bytes((0x82, 0x80 | 127)) + (1 << 40).to_bytes(8, "big") + b"mask"
+    response = asyncio.run(_request(PushServer(), _get("/ws", *WEBSOCKET) + frame))
+
+    assert response.startswith(b"HTTP/1.1 101 ")
+    close = bytes((0x88, 2)) + (1009).to_bytes(2, "big")
+    assert response.endswith(close)
@@ -0,0 +1,48 @@
+import asyncio
+from pathlib import Path
+
+from media_session.media_session_replay import MediaSessionReplay
+from media_session.recording import Recorder
+
+
+def test_replay_decodes_raw_payload(tmp_path: Path) -> None:
+    path = str(tmp_path / "events.jsonl")
+    metadata = {
+        "mpris:trackid": "/track/1",
+        "mpris:length": 60_000_000.0,  # some players send a double
+        "xesam:title": "Title",
+        "xesam:artist": "Artist",  # single string instead of a list
+        "xesam:comment": ["not decoded"],
+    }
+
+    with Recorder(path, "linux") as recorder:
+        recorder.record("name_owner_changed", "org.mpris.MediaPlayer2.a", "", ":1.1")
+        recorder.record(
+            "properties_changed",
+            ":1.1",
+            {"Metadata": metadata, "PlaybackStatus": "Playing"},
+            [],
+        )
+
+    session = MediaSessionReplay(path, speed=0)
+    asyncio.run(session.loop())
+
+    assert session.data.title == "Title"
+    assert session.data.artist == "Artist"
+    assert session.data.duration == 60_000_000
+    assert session.data.state == "playing"
+
+
+def test_replay_selects_player_without_status(tmp_path: Path) -> None:
+    path = str(tmp_path / "events.jsonl")
+
+    with Recorder(path, "linux") as recorder:
+        recorder.record("name_owner_changed", "org.mpris.MediaPlayer2.a", "", ":1.1")
+        recorder.record(
+            "properties_changed", ":1.1", {"Metadata": {"xesam:title": "Title"}}, []
+        )
+
+    session = MediaSessionReplay(path, speed=0)
+    asyncio.run(session.loop())
+
+    assert session.data.title == "Title"
@@ -0,0 +1,156 @@
+import asyncio
+from typing import Any, Optional
+
+import pytest
+
+from media_session.bus import UpdateBus
+from media_session.datastructures import MediaInfo, RawMediaInfo
+from media_session.manager import SessionManager
+from media_session.scheduler import CommandScheduler
+
+SECOND = 1_000_000
+
+
+class _Session:
+    """Records commands, changes no state unless told to"""
+
+    def __init__(self) -> None:
+        self.bus = UpdateBus()
+        self.sessions = SessionManager()
+        self.data_raw = RawMediaInfo(provider="player")
+        self.data_raw.timeline_properties.end_time = 100_000_000
+        self.sessions.publish("player", self.data_raw)
+
+        self.calls: list[tuple[Any, ...]] = []
+        self.fail: Optional[str] = None
+        self.seen: list[tuple[str, int]] = []  # bus deliveries
+        self.seen_sessions: list[str] = []  # session manager deliveries
+
+        self.bus.subscribe(lambda data: self.seen.append((data.state, data.position)))
+        self.sessions.subscribe(self._on_session, "player")
+
+    def _on_session(self, _: str, data: Optional[MediaInfo]) -> None:
+        assert data is not None
+        self.seen_sessions.append(data.state)
+
+    async def _call(self, name: str, *args: Any) -> None:
+        self.calls.append((name, *args))
+        await asyncio.sleep(0.01)
+        if self.fail == name:
+            raise RuntimeError(f"{name} failed")
+
+    async def play(self) -> None:
+        await self._call("play")
+
+    async def pause(self) -> None:
+        await self._call("pause")
+
+    async def play_pause(self) -> None:
+        await self._call("play_pause")
+
+    async def next(self) -> None:
+        await self._call("next")
+
+    async def stop(self) -> None:
+        await self._call("stop")
+
+    async def seek_percentage(self, percentage: float) -> None:
+        await self._call("seek_percentage", percentage)
+
+
+def test_commands_are_coalesced() -> None:
+    async def main() -> None:
+        session = _Session()
+        scheduler = CommandScheduler(session, window=0.01)  # type: ignore[arg-type]
+
+        await asyncio.gather(*(scheduler.seek_percentage(p) for p in range(10)))
+        await asyncio.gather(
+            scheduler.play(),
+            scheduler.play_pause(),
+            scheduler.play_pause(),
+            scheduler.seek_percentage(5),
+            scheduler.next(),
+            scheduler.next(),
+        )
+
+        assert session.calls == [
+            ("seek_percentage", 9),
+            ("play",),
+            ("next",),
+            ("next",),
+        ]
+
+    asyncio.run(main())
+
+
+def test_optimistic_state_is_published() -> None:
+    async def main() -> None:
+        session = _Session()
+        scheduler = CommandScheduler(session)  # type: ignore[arg-type]
+
+        await scheduler.seek_percentage(50)
+        await scheduler.play()
+
+        assert session.seen[-1] == ("playing", pytest.approx(50_000_000, abs=SECOND))
+        assert session.seen_sessions[-1] == "playing"
+        # Backend state is left to the backend
+        assert session.data_raw.playback_info.playback_status == "stopped"
+
+    asyncio.run(main())
+
+
+def test_failed_command_reverts_only_its_effects() -> None:
+    async def main() -> None:
+        session = _Session()
+        session.fail = "play"
+        scheduler = CommandScheduler(session)  # type: ignore[arg-type]
+
+        seek = scheduler.seek_percentage(50)
+        play = scheduler.play()
+        results = await asyncio.gather(seek, play, return_exceptions=True)
+
+        assert results[0] is None
+        assert isinstance(results[1], RuntimeError)
+        assert session.seen[-1] == ("stopped", 50_000_000)
+        assert session.seen_sessions[-1] == "stopped"
+
+    asyncio.run(main())
+
+
+def test_silent_backend_is_reconciled() -> None:
+    async def main() -> None:
+        session = _Session()
+        scheduler = CommandScheduler(
+            session, reconcile_timeout=0.05  # type: ignore[arg-type]
+        )
+
+        await scheduler.play()
+        assert session.seen[-1][0] == "playing"
+
+        await asyncio.sleep(0.1)
+        assert session.seen[-1][0] == "stopped"
+        assert session.seen_sessions[-1] == "stopped"
+        assert session.sessions.sessions["player"] is session.data_raw
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("status", ["playing", "paused"])
+def test_backend_update_replaces_effects(status: str) -> None:
+    async def main() -> None:
+        session = _Session()
+        scheduler = CommandScheduler(
+            session, reconcile_timeout=0.05  # type: ignore[arg-type]
+        )
+
+        await scheduler.play()
+        session.data_raw.update("playback_info", {"playback_status": status})
+        session.bus.publish(session.data_raw)
+        published = len(session.seen)
+
+        await asyncio.sleep(0.1)
+        assert len(session.seen) == published  # nothing to reconcile
+        await scheduler.seek_percentage(10)
+        assert session.seen[-1] == (status, pytest.approx(10_000_000, abs=SECOND))
+
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+import json
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from media_session import serialize
+from media_session.cover_cache import CoverCache
+from media_session.datastructures import CoverMode, MediaInfo
+from media_session.serialize import encode_json, encode_msgpack
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256))
+
+
+def _info(tmp_path: Path, with_cover: bool = True) -> MediaInfo:
+    cover_ref = CoverCache(str(tmp_path)).put(PNG) if with_cover else None
+    return MediaInfo(
+        title='Ünïcode "title"',
+        artist="Artist",
+        genres=("Rock", "Pop"),
+        duration=60_000_000,
+        position=1_000_000,
+        state="playing",
+        cover_ref=cover_ref,
+    )
+
+
+@pytest.mark.parametrize("cover", ["inline", "hash", "url"])
+@pytest.mark.parametrize("indent", [None, "  ", "\t"])
+@pytest.mark.parametrize("with_cover", [True, False])
+def test_json_matches_as_dict(
+    tmp_path: Path, cover: CoverMode, indent: Optional[str], with_cover: bool
+) -> None:
+    info = _info(tmp_path, with_cover)
+    encoded = encode_json(info, cover, indent)
+
+    assert json.loads(encoded) == json.loads(json.dumps(info.as_dict(cover)))
+    if indent is not None:
+        assert encoded.endswith(b"\n}")
+        assert f'\n{indent}"title": '.encode() in encoded
+
+
+def test_json_rejects_unknown_cover_mode(tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        encode_json(_info(tmp_path), "file")  # type: ignore[arg-type]
+
+
+@pytest.mark.parametrize("cover", ["inline", "hash", "url"])
+def test_msgpack_fallback(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, cover: CoverMode
+) -> None:
+    msgpack = pytest.importorskip("msgpack")
+    info = _info(tmp_path)
+
+    expected = json.loads(json.dumps(info.as_dict(cover)))
+    if cover == "inline":
+        assert info.cover_ref is not None
+        expected["cover_data"] = info.cover_ref.raw
+
+    with_library = encode_msgpack(info, cover)
+    monkeypatch.setattr(serialize, "_msgpack_packb", None)
+    fallback = encode_msgpack(info, cover)
+
+    for encoded in (with_library, fallback):
+        assert msgpack.unpackb(encoded) == expected
+
+
+def test_msgpack_fallback_encodes_wide_values(monkeypatch: pytest.MonkeyPatch) -> None:
+    msgpack = pytest.importorskip("msgpack")
+    monkeypatch.setattr(serialize, "_msgpack_packb", None)
+    info = MediaInfo(
+        title="t" * 300,
+        artist="a" * 70_000,
+        genres=tuple(str(i) for i in range(20)),
+        duration=2**40,
+        position=-1,
+    )
+
+    decoded = msgpack.unpackb(encode_msgpack(info, "hash"))
+    assert decoded == json.loads(json.dumps(info.as_dict("hash")))
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+
+import pytest
+
+from media_session.utils import RefreshCallback, Ticker, compute_position
+
+
+def test_refresh_callback_coalesces_calls() -> None:
+    async def main() -> None:
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def refresh() -> None:
+            started.set()
+            await release.wait()
+
+        callback = RefreshCallback(refresh)
+
+        # Calls before the run starts are dropped
+        for _ in range(5):
+            callback("event")
+        await started.wait()
+        assert callback.runs == 1
+
+        # Calls during a run (from any thread) schedule exactly one more
+        threads = [threading.Thread(target=callback) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        await asyncio.sleep(0.01)
+        assert callback.runs == 1
+
+        started.clear()
+        release.set()
+        await started.wait()
+        await asyncio.sleep(0.01)
+        assert callback.runs == 2
+
+    asyncio.run(main())
+
+
+def test_compute_position() -> None:
+    assert compute_position(1_000_000, 10.0, 1.0, 12.5) == 3_500_000
+    assert compute_position(1_000_000, 10.0, 2.0, 12.0) == 5_000_000
+    assert compute_position(1_000_000, 10.0, 0.0, 99.0) == 1_000_000
+    assert compute_position(0, 10.0, 1.0, 20.0, duration=4_000_000) == 4_000_000
+    assert compute_position(0, 10.0, 1.0, 20.0, duration=0) == 10_000_000
+
+
+def test_ticker_ticks_only_while_running() -> None:
+    async def main() -> list[float]:
+        loop = asyncio.get_running_loop()
+        ticks: list[float] = []
+        ticker = Ticker(lambda: ticks.append(loop.time()), 50, loop)
+
+        await asyncio.sleep(0.05)
+        assert not ticks and not ticker.running
+
+        ticker.set_running(True)
+        ticker.set_running(True)  # no second timer
+        await asyncio.sleep(0.11)
+        ticker.set_running(False)
+        await asyncio.sleep(0)
+        assert not ticker.running
+
+        count = len(ticks)
+        await asyncio.sleep(0.05)
+        assert len(ticks) == count
+        return ticks
+
+    ticks = asyncio.run(main())
+    assert 3 <= len(ticks) <= 6
+    assert all(b - a >= 0.015 for a, b in zip(ticks, ticks[1:]))
+
+
+def test_ticker_rejects_non_positive_rate() -> None:
+    async def main() -> None:
+        with pytest.raises(ValueError):
+            Ticker(lambda: None, 0, asyncio.get_running_loop())
+
+    asyncio.run(main())
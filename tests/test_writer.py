@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from media_session import writer
+from media_session.cover_cache import CoverCache
+from media_session.datastructures import MediaInfo
+from media_session.writer import JsonFileWriter
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256))
+
+
+@pytest.fixture
+def writes(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Paths written by writers, in order"""
+
+    written: list[str] = []
+    write_file_atomic = writer.write_file_atomic
+
+    def record(filename: str, contents: Any) -> None:
+        written.append(filename)
+        write_file_atomic(filename, contents)
+
+    monkeypatch.setattr(writer, "write_file_atomic", record)
+    return written
+
+
+def _read(path: Path) -> dict[str, Any]:
+    return json.loads(path.read_bytes())
+
+
+def test_file_is_replaced_atomically(tmp_path: Path) -> None:
+    path = tmp_path / "info.json"
+    path.write_text("old")
+    inode = path.stat().st_ino
+
+    JsonFileWriter(str(path))(MediaInfo(title="Song"))
+
+    assert _read(path)["title"] == "Song"
+    assert path.stat().st_ino != inode  # renamed over, not rewritten
+    assert os.listdir(tmp_path) == ["info.json"]  # no temporary files left
+
+
+def test_failed_write_keeps_old_file(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "info.json"
+    path.write_text("old")
+
+    def fail(*_: Any) -> None:
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail)
+    JsonFileWriter(str(path))(MediaInfo(title="Song"))
+
+    assert path.read_text() == "old"
+    assert os.listdir(tmp_path) == ["info.json"]
+
+
+def test_updates_are_debounced(tmp_path: Path, writes: list[str]) -> None:
+    path = tmp_path / "info.json"
+
+    async def main() -> None:
+        json_writer = JsonFileWriter(
+            str(path), asyncio.get_running_loop(), debounce=0.05
+        )
+        for title in ("a", "b", "c"):
+            json_writer(MediaInfo(title=title))
+        await asyncio.sleep(0.01)
+        assert not writes
+
+        await asyncio.sleep(0.1)
+        assert writes == [str(path)]
+
+        json_writer(MediaInfo(title="d"))
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+
+    assert writes == [str(path)] * 2
+    assert _read(path)["title"] == "d"
+
+
+def test_unchanged_data_is_not_written(tmp_path: Path, writes: list[str]) -> None:
+    json_writer = JsonFileWriter(str(tmp_path / "info.json"))
+
+    json_writer(MediaInfo(title="Song"))
+    json_writer(MediaInfo(title="Song"))
+    assert len(writes) == 1
+
+    json_writer(MediaInfo(title="Other"))
+    assert len(writes) == 2
+
+
+def test_cover_file(tmp_path: Path, writes: list[str]) -> None:
+    path = tmp_path / "info.json"
+    cover_path = str(tmp_path / "info.cover.png")
+    cover = CoverCache(str(tmp_path / "cache")).put(PNG)
+    json_writer = JsonFileWriter(str(path), cover_file=True)
+
+    json_writer(MediaInfo(title="Song", cover_ref=cover))
+    info = _read(path)
+    assert info["cover_file"] == cover_path
+    assert info["cover_hash"] == cover.key
+    assert "cover_data" not in info
+    assert Path(cover_path).read_bytes() == PNG
+
+    # Same cover is not written again
+    json_writer(MediaInfo(title="Next", cover_ref=cover))
+    assert writes == [cover_path, str(path), str(path)]
+
+    json_writer(MediaInfo(title="Next"))
+    assert _read(path)["cover_file"] == ""